@@ -0,0 +1,161 @@
+"""
+Alert versions, acknowledgement and unacknowledged-alert counters.
+
+Every change to a device's alerts (new alerts, acknowledgements) gets a new
+version number from a monotonic millisecond clock. Changed alerts are
+stamped with it and ``alert_state`` keeps the latest one per device. A
+poller that passes its last seen version gets back only the alerts that
+changed since. WebSocket clients get a short summary of each change from
+the in-memory change log.
+
+``alert_state`` also holds the number of unacknowledged alerts per
+severity. It is incremented when alerts are stored and decremented by
+exactly the number of documents each acknowledgement modified.
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+SEVERITIES = ("critical", "warning")
+CHANGE_LOG_SIZE = 256
+
+
+class AlertVersions:
+    """Per-device version clock plus a short log of recent changes."""
+
+    def __init__(self, log_size: int = CHANGE_LOG_SIZE):
+        self.current: Dict[str, int] = {}
+        self.changes: Dict[str, Deque[dict]] = {}
+        self.evicted: Dict[str, int] = {}  # newest version dropped from each log
+        self.log_size = log_size
+
+    def next_version(self, device_id: str) -> int:
+        # Millisecond clock, bumped past the last version if the clock hasn't moved
+        version = max(int(time.time() * 1000), self.current.get(device_id, 0) + 1)
+        self.current[device_id] = version
+        return version
+
+    def observe(self, device_id: str, version: int) -> None:
+        """Adopt a version seen in the database (e.g. written by another instance)."""
+        if version > self.current.get(device_id, 0):
+            self.current[device_id] = version
+
+    def publish(self, device_id: str, change: dict) -> None:
+        log = self.changes.setdefault(device_id, deque(maxlen=self.log_size))
+        if len(log) == self.log_size:
+            self.evicted[device_id] = log[0]["version"]
+        log.append(change)
+
+    def changes_since(self, device_id: str, version: int) -> Tuple[int, Optional[List[dict]]]:
+        """Current version and the changes after ``version``.
+
+        The list is None if the log no longer reaches back that far; the
+        client should then refetch in full.
+        """
+        if version < self.evicted.get(device_id, 0):
+            return self.current.get(device_id, 0), None
+        log = self.changes.get(device_id, ())
+        return self.current.get(device_id, 0), [c for c in log if c["version"] > version]
+
+
+versions = AlertVersions()
+
+
+def stamp_new_alerts(device_id: str, alerts: List[dict]) -> Tuple[dict, dict]:
+    """Stamp newly raised alerts with a version.
+
+    Returns the ``alert_state`` update that counts them, and the change to
+    publish once they're written.
+    """
+    version = versions.next_version(device_id)
+    counts: Dict[str, int] = {}
+    for alert in alerts:
+        alert["version"] = version
+        if alert["severity"] in SEVERITIES and not alert.get("acknowledged"):
+            counts[alert["severity"]] = counts.get(alert["severity"], 0) + 1
+    update = {"$max": {"version": version}}
+    if counts:
+        update["$inc"] = {f"unacknowledged.{severity}": n for severity, n in counts.items()}
+    change = {"version": version, "op": "new", "count": len(alerts), "severities": counts}
+    return update, change
+
+
+def ack_filter(device_id: str, ids: Optional[List[str]] = None, severity: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+    query = {"device_id": device_id, "acknowledged": False}
+    if ids is not None:
+        query["id"] = {"$in": ids}
+    if severity is not None:
+        query["severity"] = severity
+    if since is not None or until is not None:
+        query["timestamp"] = {}
+        if since is not None:
+            query["timestamp"]["$gte"] = since
+        if until is not None:
+            query["timestamp"]["$lt"] = until
+    return query
+
+
+async def acknowledge(db, device_id: str, ids: Optional[List[str]] = None, severity: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      acknowledged_by: Optional[str] = None) -> dict:
+    """Acknowledge every unacknowledged alert matching the filter.
+
+    One ``update_many`` per severity (run concurrently), so the counters can
+    be decremented by exactly what each one modified. Alerts that were
+    already acknowledged don't match, so repeated requests don't
+    double-count.
+    """
+    query = ack_filter(device_id, ids, severity, since, until)
+    version = versions.next_version(device_id)
+    update = {"$set": {
+        "acknowledged": True,
+        "acknowledged_at": datetime.now(timezone.utc),
+        "acknowledged_by": acknowledged_by,
+        "version": version,
+    }}
+    severities = [severity] if severity is not None else list(SEVERITIES)
+    results = await asyncio.gather(*(
+        db.alerts.update_many({**query, "severity": s}, update) for s in severities
+    ))
+    counts = {s: r.modified_count for s, r in zip(severities, results) if r.modified_count}
+
+    state_update = {"$max": {"version": version}}
+    if counts:
+        state_update["$inc"] = {f"unacknowledged.{s}": -n for s, n in counts.items()}
+    await db.alert_state.update_one({"device_id": device_id}, state_update, upsert=True)
+
+    change = {"version": version, "op": "ack", "count": sum(counts.values()), "severities": counts}
+    versions.publish(device_id, change)
+    return change
+
+
+async def get_state(db, device_id: str) -> dict:
+    """Current version and unacknowledged counts (a single indexed read)."""
+    state = await db.alert_state.find_one({"device_id": device_id}, {"_id": 0})
+    if state is None:
+        state = await rebuild_state(db, device_id)
+    versions.observe(device_id, state.get("version", 0))
+    unacknowledged = state.get("unacknowledged", {})
+    return {"version": state.get("version", 0),
+            "unacknowledged": {s: unacknowledged.get(s, 0) for s in SEVERITIES}}
+
+
+async def rebuild_state(db, device_id: str) -> dict:
+    """Recount unacknowledged alerts per severity from the alerts collection."""
+    counts = {s: 0 for s in SEVERITIES}
+    async for row in db.alerts.aggregate([
+        {"$match": {"device_id": device_id, "acknowledged": False}},
+        {"$group": {"_id": "$severity", "n": {"$sum": 1}}},
+    ]):
+        if row["_id"] in counts:
+            counts[row["_id"]] = row["n"]
+    state = {"device_id": device_id, "version": versions.current.get(device_id, 0), "unacknowledged": counts}
+    await db.alert_state.update_one(
+        {"device_id": device_id},
+        {"$set": {"unacknowledged": counts}, "$max": {"version": state["version"]}},
+        upsert=True,
+    )
+    return state
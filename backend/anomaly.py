@@ -0,0 +1,172 @@
+"""
+Streaming anomaly detection on sensor readings.
+
+Catches what the fixed thresholds in ``generate_alerts`` can't see:
+
+- ``zscore``: a reading far from the metric's exponentially weighted mean,
+  measured in EW standard deviations. This catches a failing compressor
+  pulling the temperature off its usual level while it is still inside the
+  fixed thresholds.
+- ``flatline``: the same value reported for ``flatline_readings`` readings
+  in a row, i.e. a stuck sensor.
+- ``rate``: a change faster than the metric's physical limit per hour.
+
+State is a handful of floats per device and metric, held in arrays with one
+row per device. ``update`` processes one reading for any number of devices
+in a single vectorized step. Memory and cost per reading are O(1).
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("temperature", "humidity", "battery")
+UNITS = {"temperature": "°C", "humidity": "%", "battery": "%"}
+
+# Fastest plausible change per hour; anything quicker is flagged
+MAX_RATE_PER_HOUR = {"temperature": 6.0, "humidity": 30.0, "battery": 25.0}
+# Rates are measured over at least this long, so fast polling doesn't inflate them
+MIN_RATE_WINDOW_HOURS = 5 / 60
+# Noise floor for the z-score (roughly the sensor resolution), so a metric that
+# has been steady for a while isn't flagged for moving by one step
+MIN_STD = {"temperature": 0.2, "humidity": 1.0, "battery": 1.0}
+# A full battery legitimately sits at the same value, so it isn't checked for flatlines
+FLATLINE_METRICS = ("temperature", "humidity")
+
+ANOMALIES = metrics.registry.register(metrics.Counter(
+    "khetbox_anomalies_total", "Anomalies flagged by the streaming detector", ["metric", "kind"]))
+
+
+class FleetAnomalyDetector:
+    """EWMA/EW-variance, flatline and rate-of-change checks for a fleet of devices."""
+
+    def __init__(self, metric_names: Sequence[str] = METRICS, alpha: float = 0.05, z_threshold: float = 4.0,
+                 warmup: int = 30, flatline_readings: int = 30, capacity: int = 16):
+        self.metric_names = tuple(metric_names)
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.flatline_readings = flatline_readings
+        self.max_rate = np.array([MAX_RATE_PER_HOUR.get(m, np.inf) for m in self.metric_names])
+        self.min_std = np.array([MIN_STD.get(m, 0.0) for m in self.metric_names])
+        self.check_flatline = np.array([m in FLATLINE_METRICS for m in self.metric_names])
+
+        self.rows: Dict[str, int] = {}
+        shape = (capacity, len(self.metric_names))
+        self.mean = np.zeros(shape)
+        self.var = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.last = np.full(shape, np.nan)
+        self.flat = np.zeros(shape, dtype=np.int64)
+        self.last_hours = np.full(capacity, np.nan)
+
+    def _row(self, device_id: str) -> int:
+        row = self.rows.get(device_id)
+        if row is None:
+            row = len(self.rows)
+            if row == len(self.last_hours):
+                self._grow()
+            self.rows[device_id] = row
+        return row
+
+    def _grow(self) -> None:
+        def double(a, fill):
+            extra = np.full((len(a),) + a.shape[1:], fill, dtype=a.dtype)
+            return np.concatenate([a, extra])
+        self.mean = double(self.mean, 0)
+        self.var = double(self.var, 0)
+        self.count = double(self.count, 0)
+        self.last = double(self.last, np.nan)
+        self.flat = double(self.flat, 0)
+        self.last_hours = double(self.last_hours, np.nan)
+
+    def update(self, device_ids: Sequence[str], timestamps: Sequence[datetime], values) -> List[dict]:
+        """Feed one reading per device; ``values`` has one column per metric (NaN = missing).
+
+        Returns the anomalies found, as dicts with device_id, metric, kind,
+        value and detail.
+        """
+        rows = np.array([self._row(d) for d in device_ids], dtype=np.int64)
+        x = np.asarray(values, dtype=float).reshape(len(rows), len(self.metric_names))
+        hours = np.array([ts.timestamp() / 3600.0 for ts in timestamps])
+        present = ~np.isnan(x)
+
+        mean, var, count, last = self.mean[rows], self.var[rows], self.count[rows], self.last[rows]
+
+        # Checks run against the state before this reading
+        std = np.maximum(np.sqrt(var), self.min_std)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (x - mean) / std, 0.0)
+        zscore = present & (count >= self.warmup) & (np.abs(z) > self.z_threshold)
+
+        change = np.abs(x - last)
+        window = np.maximum(hours - self.last_hours[rows], MIN_RATE_WINDOW_HOURS)[:, None]
+        rate = change / window
+        rapid = present & ~np.isnan(last) & (rate > self.max_rate)
+
+        unchanged = present & (change < 1e-9)
+        flat = np.where(unchanged, self.flat[rows] + 1, np.where(present, 0, self.flat[rows]))
+        flatline = unchanged & self.check_flatline & (flat + 1 >= self.flatline_readings)
+
+        # EWMA and EW variance (West's incremental form); the first reading seeds the mean
+        diff = np.where(present, x - mean, 0.0)
+        first = present & (count == 0)
+        incr = self.alpha * diff
+        self.mean[rows] = np.where(first, x, mean + incr)
+        self.var[rows] = np.where(first, 0.0, np.where(present, (1 - self.alpha) * (var + diff * incr), var))
+        self.count[rows] = count + present
+        self.last[rows] = np.where(present, x, last)
+        self.flat[rows] = flat
+        self.last_hours[rows] = hours
+
+        anomalies = []
+        for kind, mask in (("zscore", zscore), ("rate", rapid), ("flatline", flatline)):
+            for i, j in zip(*np.nonzero(mask)):
+                metric = self.metric_names[j]
+                if kind == "zscore":
+                    detail = {"z": round(float(z[i, j]), 1), "mean": round(float(mean[i, j]), 2)}
+                elif kind == "rate":
+                    detail = {"rate_per_hour": round(float(rate[i, j]), 1)}
+                else:
+                    detail = {"readings": int(flat[i, j]) + 1}
+                anomalies.append({"device_id": device_ids[i], "metric": metric, "kind": kind,
+                                  "value": float(x[i, j]), "detail": detail})
+                ANOMALIES.labels(metric, kind).inc()
+        return anomalies
+
+    def observe(self, device_id: str, timestamp: datetime, reading: dict) -> List[dict]:
+        """Feed a single reading dict (e.g. a sensor document) for one device."""
+        values = [[np.nan if reading.get(m) is None else reading[m] for m in self.metric_names]]
+        return self.update([device_id], [timestamp], values)
+
+
+def anomaly_alert(anomaly: dict) -> dict:
+    """Turn an anomaly into an alert in the same shape as generate_alerts."""
+    metric, kind, value = anomaly["metric"], anomaly["kind"], anomaly["value"]
+    unit = UNITS.get(metric, "")
+    name = metric.capitalize()
+    if kind == "zscore":
+        message = (f"{name} Anomaly: {value:g}{unit} is {abs(anomaly['detail']['z'])}σ from its "
+                   f"recent average of {anomaly['detail']['mean']:g}{unit}")
+    elif kind == "rate":
+        message = f"{name} Changing Rapidly: {anomaly['detail']['rate_per_hour']:g}{unit}/hour"
+    else:
+        message = f"{name} Sensor Stuck: reported {value:g}{unit} for {anomaly['detail']['readings']} readings in a row"
+    return {
+        "id": str(uuid.uuid4()),
+        "type": f"anomaly:{metric}:{kind}",
+        "severity": "warning",
+        "message": message,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "acknowledged": False,
+    }
+
+
+# Detector shared by the ingestion path
+detector = FleetAnomalyDetector()
@@ -0,0 +1,101 @@
+"""
+Single-producer frame stream shared by the WebSocket and SSE endpoints.
+
+One task builds a frame every ``interval`` seconds and serializes it once.
+Every subscriber gets the same bytes through its own small queue, so the
+cost of a frame doesn't grow with the number of connected dashboards. A
+subscriber that falls behind loses its oldest frames rather than holding
+up everyone else.
+
+The last ``replay_size`` frames are kept for ``Last-Event-ID`` resume. A
+reconnecting SSE client gets the frames it missed, or only the latest
+one if the buffer no longer reaches back far enough. Frame ids start from
+the millisecond clock at startup, so they keep increasing across restarts.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Set, Tuple
+
+import metrics
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+DROPPED_FRAMES = metrics.registry.register(metrics.Counter(
+    "khetbox_stream_dropped_frames_total", "Frames dropped for subscribers that fell behind"))
+
+
+class Frame:
+    __slots__ = ("id", "payload", "_sse")
+
+    def __init__(self, frame_id: int, payload: bytes):
+        self.id = frame_id
+        self.payload = payload
+        self._sse: Optional[bytes] = None
+
+    @property
+    def sse(self) -> bytes:
+        """The frame as a Server-Sent Events message, encoded once."""
+        if self._sse is None:
+            self._sse = b"id: %d\nevent: sensors\ndata: %s\n\n" % (self.id, self.payload)
+        return self._sse
+
+
+class FrameBroadcaster:
+    def __init__(self, produce: Callable[[], Awaitable[dict]], interval: float = 8.0,
+                 replay_size: int = 64, queue_size: int = 16):
+        self.produce = produce
+        self.interval = interval
+        self.queue_size = queue_size
+        self.frames: Deque[Frame] = deque(maxlen=replay_size)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.next_id = int(time.time() * 1000)
+
+    @property
+    def latest(self) -> Optional[Frame]:
+        return self.frames[-1] if self.frames else None
+
+    def publish(self, data: dict) -> Frame:
+        frame = Frame(self.next_id, dumps(data))
+        self.next_id += 1
+        self.frames.append(frame)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+                DROPPED_FRAMES.inc()
+            queue.put_nowait(frame)
+        return frame
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self.publish(await self.produce())
+            except Exception as e:
+                logger.error(f"Building sensor frame failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def since(self, last_id: Optional[int]) -> List[Frame]:
+        """Frames to send a (re)connecting subscriber that last saw ``last_id``.
+
+        All the frames after it if the replay buffer still covers them,
+        otherwise just the latest frame.
+        """
+        latest = self.latest
+        if latest is None:
+            return []
+        if last_id == latest.id:
+            return []
+        if last_id is None or last_id > latest.id or last_id < self.frames[0].id - 1:
+            return [latest]
+        return [f for f in self.frames if f.id > last_id]
+
+    def subscribe(self, last_id: Optional[int] = None) -> Tuple[asyncio.Queue, List[Frame]]:
+        """A queue of new frames, plus the frames to send first."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue, self.since(last_id)
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
@@ -0,0 +1,202 @@
+"""
+CCTV stream health monitor and snapshot cache.
+
+``CctvHealthMonitor`` probes each stream URL in the background. At most
+``concurrency`` probes run at once, and a failing stream backs off
+exponentially. Each round's ``status``/``last_active`` changes go to the
+store in one write (a bulk write on MongoDB). A probe that returns a JPEG
+(a snapshot URL, or the first frame of an MJPEG stream) stores it in
+``SnapshotCache``. That is a small LRU cache on disk, one file per camera,
+which the API serves as thumbnails, so dashboards don't have to open every
+live stream.
+
+Probes use urllib in worker threads, so no HTTP client dependency is needed.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_SNAPSHOT_BYTES = 2 * 1024 * 1024
+JPEG_START, JPEG_END = b"\xff\xd8", b"\xff\xd9"
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class Snapshot(NamedTuple):
+    path: Path
+    size: int
+    etag: str
+    modified: float
+
+
+class SnapshotCache:
+    """Latest JPEG per camera on disk, evicting the least recently used past the limits."""
+
+    def __init__(self, directory, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self.total_bytes = 0
+
+    def load(self) -> None:
+        """Create the directory and pick up snapshots from a previous run, oldest first.
+
+        Blocking (it reads and hashes every file); run it in a worker thread.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.directory.glob("*.jpg"), key=lambda p: p.stat().st_mtime):
+            self._track(path.stem, path, path.read_bytes())
+        self._evict()
+
+    def _track(self, camera_id: str, path: Path, data: bytes) -> Snapshot:
+        old = self.entries.pop(camera_id, None)
+        if old is not None:
+            self.total_bytes -= old.size
+        snapshot = Snapshot(path, len(data), hashlib.sha1(data).hexdigest(), path.stat().st_mtime)
+        self.entries[camera_id] = snapshot
+        self.total_bytes += snapshot.size
+        return snapshot
+
+    def _evict(self) -> None:
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, snapshot = self.entries.popitem(last=False)
+            self.total_bytes -= snapshot.size
+            snapshot.path.unlink(missing_ok=True)
+
+    def put(self, camera_id: str, data: bytes) -> Snapshot:
+        if not _SAFE_ID.match(camera_id):
+            raise ValueError(f"Invalid camera id: {camera_id!r}")
+        path = self.directory / f"{camera_id}.jpg"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        # Readers see the old or the new file, never a partial one
+        os.replace(tmp, path)
+        snapshot = self._track(camera_id, path, data)
+        self._evict()
+        return snapshot
+
+    def get(self, camera_id: str) -> Optional[Snapshot]:
+        snapshot = self.entries.get(camera_id)
+        if snapshot is not None:
+            self.entries.move_to_end(camera_id)
+        return snapshot
+
+
+def extract_jpeg(content_type: str, body: bytes) -> Optional[bytes]:
+    """The JPEG in a probe response: the whole body, or the first MJPEG frame."""
+    if content_type.startswith("image/jpeg"):
+        return body if body.startswith(JPEG_START) else None
+    if content_type.startswith("multipart/x-mixed-replace"):
+        start = body.find(JPEG_START)
+        end = body.find(JPEG_END, start + 2) if start >= 0 else -1
+        if end >= 0:
+            return body[start:end + 2]
+    return None
+
+
+def _fetch(url: str, timeout: float) -> Tuple[str, bytes]:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/x-mixed-replace"):
+            # A live MJPEG stream never ends; read until the first frame is complete
+            body = b""
+            while len(body) < MAX_SNAPSHOT_BYTES:
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                body += chunk
+                start = body.find(JPEG_START)
+                if start >= 0 and body.find(JPEG_END, start + 2) >= 0:
+                    break
+        elif content_type.startswith("image/jpeg"):
+            body = response.read(MAX_SNAPSHOT_BYTES)
+        else:
+            body = b""
+        return content_type, body
+
+
+class CctvHealthMonitor:
+    def __init__(self, cache: Optional[SnapshotCache], interval: float = 30.0, concurrency: int = 4,
+                 timeout: float = 5.0, max_backoff: float = 600.0):
+        self.cache = cache
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.failures: Dict[str, int] = {}
+        self.next_probe: Dict[str, float] = {}
+
+    def _due(self, stream_id: str, now: float) -> bool:
+        return self.next_probe.get(stream_id, 0.0) <= now
+
+    def _backoff(self, stream_id: str) -> float:
+        failures = self.failures.get(stream_id, 0)
+        return min(self.interval * 2 ** failures, self.max_backoff)
+
+    async def probe(self, stream: dict) -> dict:
+        """Probe one stream; returns its status update."""
+        url = stream.get("snapshot_url") or stream["url"]
+        async with self.semaphore:
+            try:
+                content_type, body = await asyncio.to_thread(_fetch, url, self.timeout)
+                ok = True
+            except Exception as e:
+                logger.debug(f"Probe of {stream['id']} ({url}) failed: {e}")
+                ok = False
+
+        now = time.time()
+        if not ok:
+            self.failures[stream["id"]] = self.failures.get(stream["id"], 0) + 1
+            self.next_probe[stream["id"]] = now + self._backoff(stream["id"])
+            return {"id": stream["id"], "status": "offline"}
+
+        self.failures.pop(stream["id"], None)
+        self.next_probe[stream["id"]] = now + self.interval
+        jpeg = extract_jpeg(content_type, body)
+        if jpeg is not None and self.cache is not None:
+            self.cache.put(stream["id"], jpeg)
+        return {"id": stream["id"], "status": "active", "last_active": datetime.now(timezone.utc)}
+
+    async def probe_round(self, streams_repo, device_id: str) -> List[dict]:
+        """Probe every stream that is due and store the status changes in one write."""
+        streams = await streams_repo.probe_targets(device_id)
+        now = time.time()
+        due = [s for s in streams if self._due(s["id"], now)]
+        results = await asyncio.gather(*(self.probe(s) for s in due))
+
+        previous = {s["id"]: s.get("status") for s in streams}
+        changes = {}
+        for result in results:
+            update = {k: v for k, v in result.items() if k != "id"}
+            # Offline streams keep their last_active; skip writes that change nothing
+            if update.keys() == {"status"} and previous.get(result["id"]) == result["status"]:
+                continue
+            changes[result["id"]] = update
+        if changes:
+            await streams_repo.update_status(device_id, changes)
+        return results
+
+    async def run_once(self, db, device_id: str) -> List[dict]:
+        """One probe round against a MongoDB database."""
+        from repositories import MongoCctvStreams
+
+        return await self.probe_round(MongoCctvStreams(lambda: db), device_id)
+
+    async def run(self, get_store, device_id: str, breaker) -> None:
+        while True:
+            try:
+                async with breaker:
+                    await self.probe_round(get_store().cctv_streams, device_id)
+            except Exception as e:
+                logger.warning(f"CCTV health check failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,133 @@
+"""
+Single-flight coalescing for GET routes.
+
+When a cooperative's members all open the dashboard at once, the same
+handful of GET requests arrive together. ``@single_flight`` lets identical
+requests that overlap share one run of the handler and one serialized
+body:
+
+    @router.get("/reports/daily")
+    @single_flight
+    async def get_daily_reports(...):
+
+Requests are identical when they have the same path, query parameters and
+auth scope (the caller's role, so an admin-only response is never handed
+to a farmer), plus any headers listed in ``vary``. Dependencies, including
+auth checks, still run for every request; only the handler body is shared.
+The first request (the leader) starts the handler in its own task, so a
+leader whose client disconnects doesn't cancel it for the followers. The
+entry is dropped as soon as the handler finishes: this collapses
+concurrent work and never caches. Exceptions, HTTPException included,
+reach every waiter.
+
+Handlers may return plain data (serialized once, as FastJSONResponse
+would) or a Response whose body is already rendered; streaming responses
+can't be shared.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import Request
+from starlette.responses import Response, StreamingResponse
+
+import metrics
+import security
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+COALESCED = metrics.registry.register(metrics.Counter(
+    "khetbox_coalesced_requests_total",
+    "GET requests that ran the handler (leader) or shared an in-flight one's response (follower)",
+    ["route", "role"]))
+
+
+class SharedResponse(NamedTuple):
+    body: bytes
+    status_code: int
+    headers: Optional[List[Tuple[bytes, bytes]]]
+
+    def response(self) -> Response:
+        if self.headers is None:
+            return Response(self.body, status_code=self.status_code, media_type="application/json")
+        response = Response(self.body, status_code=self.status_code)
+        response.raw_headers = list(self.headers)
+        return response
+
+
+# Request key -> task running the handler for it
+in_flight: Dict[tuple, asyncio.Task] = {}
+# Route -> [leaders, followers]
+_counts: Dict[str, List[int]] = {}
+
+
+def auth_scope(request: Request) -> str:
+    header = request.headers.get("authorization")
+    token = header[7:] if header and header.startswith("Bearer ") else None
+    session = security.issued_tokens.get(token) if token else None
+    return session["role"] if session else "anonymous"
+
+
+async def _run(endpoint, kwargs) -> SharedResponse:
+    result = await endpoint(**kwargs)
+    if isinstance(result, StreamingResponse):
+        raise TypeError(f"{endpoint.__name__} returns a streaming response, which single_flight can't share")
+    if isinstance(result, Response):
+        return SharedResponse(result.body, result.status_code, result.raw_headers)
+    return SharedResponse(dumps(result), 200, None)
+
+
+def single_flight(endpoint=None, *, vary: Sequence[str] = ()):
+    """Share one run of ``endpoint`` between identical concurrent requests."""
+    if endpoint is None:
+        return lambda fn: single_flight(fn, vary=vary)
+
+    signature = inspect.signature(endpoint)
+    request_param = next((p.name for p in signature.parameters.values() if p.annotation is Request), None)
+    injected = request_param is None
+    if injected:
+        # FastAPI passes the Request to any parameter annotated with it
+        request_param = "coalesce_request"
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(request_param, inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+    route = endpoint.__name__
+    counts = _counts.setdefault(route, [0, 0])
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        request = kwargs.pop(request_param) if injected else kwargs[request_param]
+        key = (
+            request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+            auth_scope(request),
+            tuple(request.headers.get(h) for h in vary),
+        )
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_run(endpoint, kwargs))
+            in_flight[key] = task
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+            counts[0] += 1
+            COALESCED.labels(route, "leader").inc()
+        else:
+            counts[1] += 1
+            COALESCED.labels(route, "follower").inc()
+        shared = await asyncio.shield(task)
+        return shared.response()
+
+    wrapper.__signature__ = signature
+    return wrapper
+
+
+def stats() -> dict:
+    """Leaders, followers and collapse ratio (share of requests that didn't run the handler) per route."""
+    return {
+        route: {"leaders": leaders, "followers": followers,
+                "collapse_ratio": round(followers / (leaders + followers), 3) if leaders + followers else 0.0}
+        for route, (leaders, followers) in _counts.items()
+    }
@@ -0,0 +1,197 @@
+"""
+Database access shared by the routers.
+
+The Motor client is constructed on first use rather than at import, so
+importing the app (e.g. a serverless cold start) doesn't resolve the
+connection string or import Motor until a request actually needs the
+database. Also owns the circuit breaker, the write spool and the
+last-known-value cache.
+
+The routers reach the sensors, readings, alerts, reports, storage,
+cctv_streams and users collections through ``get_store()`` (see
+repositories.py). STORAGE_BACKEND picks MongoDB (the default) or "sqlite",
+an embedded store for single-container sites that can't run mongod. In
+that mode ``get_db()`` raises MongoDisabled, so the MongoDB-only features
+(fleet analytics, persisted notification retries) answer as they do
+while MongoDB is down.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import metrics
+from db_health import CircuitBreaker, CircuitOpenError, PoolWaitListener, mongo_client_options
+from spool import WriteSpool, LastKnown
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# MongoDB connection (default to local for easier local development)
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'test_database')
+pool_wait_listener = PoolWaitListener(histogram=metrics.MONGO_POOL_WAIT)
+
+# "mongo" or "sqlite" (embedded, for single-container sites)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+SQLITE_PATH = os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'khetbox.db'))
+if STORAGE_BACKEND not in ("mongo", "sqlite"):
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; use 'mongo' or 'sqlite'")
+
+_client = None
+_store = None
+
+
+class MongoDisabled(CircuitOpenError):
+    """Raised by get_db() when the embedded store is in use instead of MongoDB."""
+
+
+def get_client():
+    global _client
+    if STORAGE_BACKEND != "mongo":
+        raise MongoDisabled(f"MongoDB is not used with STORAGE_BACKEND={STORAGE_BACKEND}")
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        _client = AsyncIOMotorClient(
+            mongo_url,
+            event_listeners=[pool_wait_listener, metrics.MongoCommandListener()],
+            **mongo_client_options()
+        )
+    return _client
+
+
+def get_db():
+    return get_client()[db_name]
+
+
+def set_client(client) -> None:
+    """Use ``client`` instead of the configured one (benchmarks and tests)."""
+    global _client
+    if _client is not None and _client is not client:
+        _client.close()
+    _client = client
+
+
+def close_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_store():
+    """Repositories of the configured backend (see repositories.py)."""
+    global _store
+    if _store is None:
+        if STORAGE_BACKEND == "sqlite":
+            from sqlite_store import SQLiteStore
+
+            _store = SQLiteStore(SQLITE_PATH)
+        else:
+            from repositories import MongoStore
+
+            _store = MongoStore(get_db)
+    return _store
+
+
+def set_store(store) -> None:
+    """Use ``store`` instead of the configured one (benchmarks and tests)."""
+    global _store
+    _store = store
+
+
+async def close_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+# Short-circuits DB calls to the fallback path while the database is down
+mongo_breaker = CircuitBreaker(
+    probe=lambda: get_store().ping(),
+    failure_threshold=int(os.environ.get('MONGO_BREAKER_FAILURES', '3')),
+    probe_interval=float(os.environ.get('MONGO_BREAKER_PROBE_INTERVAL', '5')),
+)
+
+# Writes that fail while MongoDB is unreachable are spooled to disk and replayed later
+spool = WriteSpool(os.environ.get('SPOOL_DIR', str(ROOT_DIR / 'spool')))
+SPOOL_FSYNC_INTERVAL = float(os.environ.get('SPOOL_FSYNC_INTERVAL', '1.0'))
+SPOOL_REPLAY_INTERVAL = float(os.environ.get('SPOOL_REPLAY_INTERVAL', '10'))
+SPOOL_REPLAY_CONCURRENCY = int(os.environ.get('SPOOL_REPLAY_CONCURRENCY', '8'))
+
+# Last values successfully read from MongoDB, served instead of made-up data during outages
+last_known = LastKnown()
+
+metrics.registry.register(metrics.Gauge(
+    "khetbox_spool_pending_writes", "Writes waiting in the local spool", fn=lambda: spool.pending()))
+metrics.registry.register(metrics.Gauge(
+    "khetbox_mongo_breaker_open", "1 while the MongoDB circuit breaker is open",
+    fn=lambda: 1 if mongo_breaker.state == "open" else 0))
+
+
+async def write_or_spool(collection: str, op: str, **kwargs) -> bool:
+    """Apply a write to MongoDB, spooling it to disk if the database is unreachable.
+
+    While older writes are still waiting in the spool, new ones are spooled
+    behind them so replay keeps the original order. Raises MongoDisabled
+    with the embedded store; its writes go through get_store().
+    """
+    if STORAGE_BACKEND != "mongo":
+        raise MongoDisabled(f"write to {collection} needs MongoDB (STORAGE_BACKEND={STORAGE_BACKEND})")
+    if spool.pending():
+        spool.append(collection, op, **kwargs)
+        return False
+    try:
+        async with mongo_breaker:
+            await getattr(get_db()[collection], op)(**kwargs)
+        return True
+    except Exception as e:
+        logger.warning(f"Write to {collection} failed, spooling: {e}")
+        spool.append(collection, op, **kwargs)
+        return False
+
+
+async def run_when_ready(name: str, fn):
+    """Run ``fn(db)`` once MongoDB is reachable.
+
+    Meant for background startup work, so startup doesn't wait on it.
+    """
+    while not mongo_breaker.ready:
+        await asyncio.sleep(mongo_breaker.probe_interval)
+    try:
+        async with mongo_breaker:
+            result = await fn(get_db())
+        logger.info(f"{name} done: {result}")
+    except Exception as e:
+        logger.warning(f"{name} failed: {e}")
+
+
+async def ensure_indexes_when_ready():
+    from indexes import ensure_startup_indexes
+
+    await run_when_ready("Index creation", ensure_startup_indexes)
+
+
+async def spool_flush_loop():
+    while True:
+        await asyncio.sleep(SPOOL_FSYNC_INTERVAL)
+        spool.flush()
+
+
+async def spool_replay_loop():
+    while True:
+        await asyncio.sleep(SPOOL_REPLAY_INTERVAL)
+        if not spool.pending() or mongo_breaker.state == "open":
+            continue
+        try:
+            async with mongo_breaker:
+                replayed = await spool.replay(get_db(), concurrency=SPOOL_REPLAY_CONCURRENCY)
+            logger.info(f"Replayed {replayed} spooled writes to MongoDB")
+        except Exception as e:
+            logger.warning(f"Spool replay deferred, MongoDB still unavailable: {e}")
@@ -0,0 +1,190 @@
+"""
+MongoDB connection tuning, pool monitoring and a circuit breaker.
+
+The breaker trips after consecutive connection failures so that requests
+go straight to their cached/fallback path instead of each waiting out the
+server selection timeout. A background probe closes it again once the
+database answers a ping.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from pymongo import monitoring
+from pymongo.errors import ConnectionFailure
+
+logger = logging.getLogger(__name__)
+
+
+def mongo_client_options() -> dict:
+    """Connection pool settings for AsyncIOMotorClient, overridable via env."""
+    return {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    }
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """Records how long operations wait to check a connection out of the pool.
+
+    Check-out start and completion are reported synchronously on the same
+    thread, so the start time is kept in a thread-local. Waits are also fed
+    to ``histogram`` (seconds) when one is given.
+    """
+
+    BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is None:
+            return
+        self._local.started = None
+        waited_ms = (time.perf_counter() - started) * 1000
+        if self.histogram is not None:
+            self.histogram.observe(waited_ms / 1000)
+        index = len(self.BUCKETS_MS)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if waited_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += waited_ms
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+            self.bucket_counts[index] += 1
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self.checkout_failures += 1
+
+    # Remaining pool events are not needed
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "wait_ms_buckets": {
+                    **{f"le_{b}": c for b, c in zip(self.BUCKETS_MS, self.bucket_counts)},
+                    "le_inf": self.bucket_counts[-1],
+                },
+            }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting MongoDB while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Trips after ``failure_threshold`` consecutive connection failures.
+
+    Use as ``async with breaker:`` around database calls. While open, entering
+    the block raises ``CircuitOpenError`` immediately; ``probe_loop`` pings the
+    database every ``probe_interval`` seconds and closes the breaker on success.
+    """
+
+    def __init__(self, probe: Callable[[], Awaitable], failure_threshold: int = 3, probe_interval: float = 5.0):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self.short_circuited = 0
+        self.ready = False
+
+    @property
+    def state(self) -> str:
+        return "open" if self.opened_at is not None else "closed"
+
+    def trip(self, reason: str = "") -> None:
+        if self.opened_at is None:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logger.warning(f"MongoDB circuit breaker opened {reason}".rstrip())
+        self.ready = False
+
+    def reset(self) -> None:
+        if self.opened_at is not None:
+            logger.info("MongoDB circuit breaker closed")
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.ready = True
+
+    def record_failure(self, exc: BaseException) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.trip(f"after {self.consecutive_failures} consecutive failures: {exc}")
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+
+    async def __aenter__(self):
+        if self.opened_at is not None:
+            self.short_circuited += 1
+            raise CircuitOpenError("MongoDB circuit breaker is open")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        elif issubclass(exc_type, ConnectionFailure):
+            self.record_failure(exc)
+        return False
+
+    async def check(self) -> bool:
+        """Ping the database once and update breaker state and readiness."""
+        try:
+            await self.probe()
+        except Exception as e:
+            self.trip(f"(ping failed: {e})")
+            return False
+        self.reset()
+        return True
+
+    async def probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            if self.opened_at is not None:
+                await self.check()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.opened_at is not None else 0,
+        }
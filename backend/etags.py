@@ -0,0 +1,23 @@
+"""
+If-None-Match handling for the endpoints that send an ETag.
+
+The header can list several tags (``"a", "b"``), be ``*``, and proxies may
+have marked tags weak with ``W/``. If-None-Match compares weakly (RFC 9110
+13.1.2), so the ``W/`` prefix is ignored on both sides.
+"""
+from typing import Optional
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches ``etag``, i.e. a 304 applies."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = _opaque(etag)
+    return any(_opaque(tag) == current for tag in if_none_match.split(","))
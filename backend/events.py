@@ -0,0 +1,277 @@
+"""
+Door and power events as time intervals.
+
+Readings are turned into intervals for each event kind: door open, running
+on battery (solar inactive) and battery critical. Closed intervals are
+stored in the ``events`` collection with ``start``/``end``. An interval
+that is still open has ``end: None``.
+
+Within a kind, intervals never overlap and arrive in time order. So each
+kind is kept in an ``IntervalIndex``: sorted start/end arrays plus a prefix
+sum of durations. The total time and number of intervals overlapping any
+window take two bisections, O(log n).
+"""
+import logging
+import os
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import timezones
+
+logger = logging.getLogger(__name__)
+
+# Event kind -> condition on a sensor reading
+EVENT_KINDS = {
+    "door_open": lambda r: bool(r.get("door_open")),
+    "on_battery": lambda r: r.get("solar_active") is False,
+    "battery_critical": lambda r: r.get("battery") is not None and r["battery"] < 25,
+}
+
+# Daily totals that raise an alert once exceeded
+DAILY_LIMITS_SECONDS = {
+    "door_open": float(os.environ.get('DOOR_OPEN_DAILY_LIMIT_MIN', '30')) * 60,
+    "on_battery": float(os.environ.get('ON_BATTERY_DAILY_LIMIT_H', '12')) * 3600,
+}
+EVENT_HISTORY_DAYS = float(os.environ.get('EVENT_HISTORY_DAYS', '7'))
+
+
+def _seconds(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _datetime(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class IntervalIndex:
+    """Non-overlapping intervals in time order, at most the last one still open."""
+
+    def __init__(self):
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+        self.prefix: List[float] = [0.0]  # prefix[i] = total duration of the first i intervals
+        self.open_start: Optional[float] = None
+
+    def __len__(self):
+        return len(self.starts) + (self.open_start is not None)
+
+    def open(self, start: float) -> None:
+        self.open_start = start
+
+    def close(self, end: float) -> None:
+        if self.open_start is not None:
+            self.add(self.open_start, end)
+            self.open_start = None
+
+    def add(self, start: float, end: float) -> None:
+        if self.starts and start < self.ends[-1]:
+            raise ValueError("Intervals must be added in time order without overlap")
+        self.starts.append(start)
+        self.ends.append(end)
+        self.prefix.append(self.prefix[-1] + (end - start))
+
+    def _span(self, a: float, b: float) -> Tuple[int, int]:
+        # Closed intervals i..j-1 overlap [a, b): those ending after a and starting before b
+        return bisect_right(self.ends, a), bisect_left(self.starts, b)
+
+    def total(self, a: float, b: float, now: Optional[float] = None) -> float:
+        """Seconds covered by intervals within [a, b); an open interval runs until ``now``."""
+        i, j = self._span(a, b)
+        total = 0.0
+        if i < j:
+            total = self.prefix[j] - self.prefix[i]
+            total -= max(0.0, a - self.starts[i])
+            total -= max(0.0, self.ends[j - 1] - b)
+        if self.open_start is not None and now is not None:
+            total += max(0.0, min(b, now) - max(a, self.open_start))
+        return total
+
+    def count(self, a: float, b: float, now: Optional[float] = None) -> int:
+        """Number of intervals overlapping [a, b)."""
+        i, j = self._span(a, b)
+        count = max(0, j - i)
+        if self.open_start is not None and now is not None and self.open_start < b and now > a:
+            count += 1
+        return count
+
+    def overlapping(self, a: float, b: float, now: Optional[float] = None) -> List[Tuple[float, Optional[float]]]:
+        """The intervals overlapping [a, b); an open interval has end None."""
+        i, j = self._span(a, b)
+        found = [(self.starts[k], self.ends[k]) for k in range(i, j)]
+        if self.open_start is not None and self.open_start < b and (now is None or now > a):
+            found.append((self.open_start, None))
+        return found
+
+    def prune(self, before: float) -> None:
+        """Forget closed intervals that ended before ``before``."""
+        cut = bisect_right(self.ends, before)
+        if cut:
+            base = self.prefix[cut]
+            self.starts = self.starts[cut:]
+            self.ends = self.ends[cut:]
+            self.prefix = [p - base for p in self.prefix[cut:]]
+
+
+class EventTracker:
+    """Derives event intervals from one device's readings."""
+
+    def __init__(self):
+        self.indexes: Dict[str, IntervalIndex] = {kind: IntervalIndex() for kind in EVENT_KINDS}
+        # Time of the first reading observed; intervals from before it come from the store
+        self.first_seen: Optional[float] = None
+
+    def observe(self, timestamp: datetime, reading: dict) -> List[dict]:
+        """Update the intervals with a reading.
+
+        Returns the transitions as dicts with kind, start and end (None when
+        the interval has just opened).
+        """
+        # MongoDB keeps milliseconds; match it so stored starts compare equal
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        now = _seconds(timestamp)
+        if self.first_seen is None:
+            self.first_seen = now
+        transitions = []
+        for kind, condition in EVENT_KINDS.items():
+            index = self.indexes[kind]
+            active = condition(reading)
+            if active and index.open_start is None:
+                index.open(now)
+                transitions.append({"kind": kind, "start": timestamp, "end": None})
+            elif not active and index.open_start is not None:
+                start = index.open_start
+                index.close(now)
+                transitions.append({"kind": kind, "start": _datetime(start), "end": timestamp})
+        self._prune(now)
+        return transitions
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - EVENT_HISTORY_DAYS * 86400
+        for index in self.indexes.values():
+            # Pruning copies the arrays, so only do it once a few intervals have expired
+            if len(index.ends) > 16 and index.ends[16] < cutoff:
+                index.prune(cutoff)
+
+    def merge(self, intervals: List[dict]) -> Tuple[int, List[dict]]:
+        """Fold stored intervals (oldest first) in under the ones observed live.
+
+        Intervals starting at or after the first observed reading were
+        written by this tracker and are skipped. A stored interval left open
+        before it is closed at the first reading, as the next reading would
+        have closed it. Returns the number of intervals merged and those
+        closing transitions, which still have to be stored.
+        """
+        cutoff = self.first_seen
+        merged = {kind: IntervalIndex() for kind in EVENT_KINDS}
+        closing = []
+        loaded = 0
+        for event in intervals:
+            index = merged.get(event["kind"])
+            start = _seconds(event["start"])
+            if index is None or (cutoff is not None and start >= cutoff):
+                continue
+            if event.get("end") is not None:
+                end = _seconds(event["end"])
+                if cutoff is not None:
+                    end = min(end, cutoff)
+            elif cutoff is None:
+                index.open(start)
+                loaded += 1
+                continue
+            else:
+                end = cutoff
+                closing.append({"kind": event["kind"], "start": _datetime(start), "end": _datetime(cutoff)})
+            index.open_start = None
+            try:
+                index.add(start, end)
+            except ValueError:
+                logger.warning(f"Skipping overlapping {event['kind']} interval starting {event['start']}")
+                continue
+            loaded += 1
+
+        for kind, index in merged.items():
+            live = self.indexes[kind]
+            for start, end in zip(live.starts, live.ends):
+                index.add(start, end)
+            if live.open_start is not None:
+                index.open(live.open_start)
+            self.indexes[kind] = index
+        return loaded, closing
+
+    def summary(self, start: datetime, end: datetime, now: Optional[datetime] = None) -> dict:
+        """Per-kind total seconds and interval counts in [start, end), for report summaries."""
+        a, b = _seconds(start), _seconds(end)
+        now_s = _seconds(now or datetime.now(timezone.utc))
+        summary = {}
+        for kind, index in self.indexes.items():
+            summary[f"{kind}_seconds"] = round(index.total(a, b, now=now_s))
+            summary[f"{kind}_events"] = index.count(a, b, now=now_s)
+        return summary
+
+    def alerts(self, now: Optional[datetime] = None, tz_name: str = "UTC") -> List[dict]:
+        """Alerts for kinds whose total so far today exceeds their daily limit.
+
+        "Today" is the local day in ``tz_name``, the same day the device's
+        reports cover.
+        """
+        now = now or datetime.now(timezone.utc)
+        day_start, _ = timezones.day_bounds(timezones.local_date(now, tz_name), tz_name)
+        alerts = []
+        for kind, limit in DAILY_LIMITS_SECONDS.items():
+            total = self.indexes[kind].total(_seconds(day_start), _seconds(now), now=_seconds(now))
+            if total <= limit:
+                continue
+            if kind == "door_open":
+                message = f"Door Open Too Long: open for {round(total / 60)} minutes in total today"
+            else:
+                message = f"Running on Battery: {total / 3600:.1f} hours without solar today"
+            alerts.append({
+                "id": str(uuid.uuid4()),
+                "type": f"events:{kind}:daily",
+                "severity": "warning",
+                "message": message,
+                "timestamp": now.isoformat(),
+                "acknowledged": False,
+            })
+        return alerts
+
+
+def event_writes(device_id: str, transitions: List[dict]) -> List[Tuple[str, dict]]:
+    """The (op, kwargs) writes to the ``events`` collection for ``transitions``.
+
+    Opening and closing an interval both upsert on (device_id, kind, start),
+    so a spool replay keeps them in order and a close that lands first still
+    leaves a single document.
+    """
+    writes = []
+    for t in transitions:
+        interval = {"device_id": device_id, "kind": t["kind"], "start": t["start"]}
+        if t["end"] is None:
+            update = {"$setOnInsert": {"end": None}}
+        else:
+            update = {"$set": {"end": t["end"], "duration_seconds": (t["end"] - t["start"]).total_seconds()}}
+        writes.append(("update_one", {"filter": interval, "update": update, "upsert": True}))
+    return writes
+
+
+async def load_history(repository, tracker: EventTracker, device_id: str) -> int:
+    """Merge the stored intervals of the last EVENT_HISTORY_DAYS into ``tracker``.
+
+    ``repository`` is the store's events repository (see repositories.py).
+    Readings observed while the history loads are kept (see
+    EventTracker.merge), and stored intervals they show to have ended are
+    closed in the store. Returns the number of intervals loaded.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=EVENT_HISTORY_DAYS)
+    intervals = await repository.history(device_id, since)
+    loaded, closing = tracker.merge(intervals)
+    if closing:
+        await repository.record(device_id, closing)
+    return loaded
+
+# Tracker for the demo device, fed by the status endpoint
+tracker = EventTracker()
@@ -0,0 +1,178 @@
+"""
+Fleet-wide comparison of containers for the admin dashboard.
+
+``fleet_summary`` ranks every device by temperature excursions, battery
+health, alert rate and capacity utilization over the last ``hours``. The
+metrics come from the hourly rollups rather than raw readings (24 rows per
+device and day), plus the alerts, inventory totals and sensor documents.
+
+The fleet is split into FLEET_SHARDS contiguous device_id ranges. Each
+range gets its own set of pipelines and all of them run concurrently, so
+on a real deployment the work is spread over the connection pool (and over
+shards, when the collections are sharded on device_id), and each pipeline
+walks a single slice of the (device_id, hour) and (device_id, timestamp)
+indexes. Results are cached for FLEET_CACHE_TTL seconds per window.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLEET_SHARDS = int(os.environ.get('FLEET_SHARDS', '8'))
+FLEET_CACHE_TTL = float(os.environ.get('FLEET_CACHE_TTL', '30'))
+
+# Same limits as generate_alerts: an hour whose maximum passed 8°C is an excursion,
+# one whose minimum battery fell under 25% a low-battery hour
+TEMP_EXCURSION_LIMIT = 8.0
+BATTERY_CRITICAL = 25.0
+
+# Ranking -> (device field, highest first?)
+RANKINGS = {
+    "temperature_excursions": ("excursion_hours", True),
+    "battery_health": ("avg_battery", False),
+    "alert_rate": ("alerts_per_day", True),
+    "capacity_utilization": ("capacity_utilization", True),
+}
+
+
+def device_ranges(device_ids: List[str], shards: int) -> List[Tuple[str, str]]:
+    """Split sorted device ids into up to ``shards`` contiguous (first, last) ranges."""
+    device_ids = sorted(device_ids)
+    size = max(-(-len(device_ids) // max(shards, 1)), 1)
+    return [(device_ids[i], device_ids[min(i + size, len(device_ids)) - 1]) for i in range(0, len(device_ids), size)]
+
+
+async def _rollup_stats(db, first: str, last: str, since: datetime) -> List[dict]:
+    return await db.hourly_rollups.aggregate([
+        {"$match": {"device_id": {"$gte": first, "$lte": last}, "hour": {"$gte": since}}},
+        {"$group": {
+            "_id": "$device_id",
+            "hours": {"$sum": 1},
+            "readings": {"$sum": "$count"},
+            "temperature_sum": {"$sum": "$temperature.sum"},
+            "max_temperature": {"$max": "$temperature.max"},
+            "excursion_hours": {"$sum": {"$cond": [{"$gt": ["$temperature.max", TEMP_EXCURSION_LIMIT]}, 1, 0]}},
+            "battery_sum": {"$sum": "$battery.sum"},
+            "min_battery": {"$min": "$battery.min"},
+            "low_battery_hours": {"$sum": {"$cond": [{"$lt": ["$battery.min", BATTERY_CRITICAL]}, 1, 0]}},
+        }},
+    ]).to_list(length=None)
+
+
+async def _alert_counts(db, first: str, last: str, since: datetime) -> List[dict]:
+    return await db.alerts.aggregate([
+        {"$match": {"device_id": {"$gte": first, "$lte": last}, "timestamp": {"$gte": since}}},
+        {"$group": {
+            "_id": "$device_id",
+            "alerts": {"$sum": 1},
+            "critical_alerts": {"$sum": {"$cond": [{"$eq": ["$severity", "critical"]}, 1, 0]}},
+        }},
+    ]).to_list(length=None)
+
+
+async def _capacity(db, first: str, last: str) -> Tuple[List[dict], List[dict]]:
+    in_range = {"device_id": {"$gte": first, "$lte": last}}
+    totals, sensors = await asyncio.gather(
+        db.inventory_totals.find(in_range, {"_id": 0, "device_id": 1, "capacity_kg": 1, "used_kg": 1}).to_list(length=None),
+        db.sensors.find(in_range, {"_id": 0, "device_id": 1, "storage_used": 1}).to_list(length=None),
+    )
+    return totals, sensors
+
+
+async def _shard(db, first: str, last: str, since: datetime, hours: float) -> List[dict]:
+    """Per-device metrics for the devices in [first, last]."""
+    rollups, alerts, (totals, sensors) = await asyncio.gather(
+        _rollup_stats(db, first, last, since), _alert_counts(db, first, last, since), _capacity(db, first, last))
+
+    devices: Dict[str, dict] = {}
+
+    def row(device_id):
+        return devices.setdefault(device_id, {
+            "device_id": device_id, "hours_reporting": 0, "avg_temperature": None, "max_temperature": None,
+            "excursion_hours": 0, "avg_battery": None, "min_battery": None, "low_battery_hours": 0,
+            "alerts": 0, "critical_alerts": 0, "alerts_per_day": 0.0, "capacity_utilization": None,
+        })
+
+    for s in sensors:
+        if s.get("storage_used") is not None:
+            row(s["device_id"])["capacity_utilization"] = round(s["storage_used"], 1)
+    for t in totals:
+        # Tracked stock beats the sensor's fill estimate
+        if t.get("capacity_kg"):
+            row(t["device_id"])["capacity_utilization"] = round(100 * t.get("used_kg", 0) / t["capacity_kg"], 1)
+    for r in rollups:
+        d = row(r["_id"])
+        d["hours_reporting"] = r["hours"]
+        d["excursion_hours"] = r["excursion_hours"]
+        d["low_battery_hours"] = r["low_battery_hours"]
+        if r["readings"]:
+            d["avg_temperature"] = round(r["temperature_sum"] / r["readings"], 1)
+            d["max_temperature"] = r["max_temperature"]
+            d["avg_battery"] = round(r["battery_sum"] / r["readings"], 0)
+            d["min_battery"] = r["min_battery"]
+    for a in alerts:
+        d = row(a["_id"])
+        d["alerts"] = a["alerts"]
+        d["critical_alerts"] = a["critical_alerts"]
+        d["alerts_per_day"] = round(a["alerts"] * 24 / hours, 2)
+    return list(devices.values())
+
+
+def rank(devices: List[dict], limit: int) -> Dict[str, List[dict]]:
+    """The ``limit`` worst devices per ranking; devices without a value are left out."""
+    rankings = {}
+    for name, (field, highest_first) in RANKINGS.items():
+        scored = sorted((d for d in devices if d[field] is not None), key=lambda d: d["device_id"])
+        scored.sort(key=lambda d: d[field], reverse=highest_first)
+        rankings[name] = scored[:limit]
+    return rankings
+
+
+async def fleet_summary(db, hours: float = 24, shards: int = FLEET_SHARDS, now: Optional[datetime] = None) -> dict:
+    """Per-device metrics for the whole fleet over the last ``hours``, worst first per ranking."""
+    now = now or datetime.now(timezone.utc)
+    since = (now - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    device_ids = await db.sensors.distinct("device_id")
+    ranges = device_ranges(device_ids, shards) if device_ids else []
+    results = await asyncio.gather(*(_shard(db, first, last, since, hours) for first, last in ranges))
+    devices = [d for shard in results for d in shard]
+
+    reporting = [d for d in devices if d["hours_reporting"]]
+    return {
+        "window_hours": hours,
+        "since": since.isoformat(),
+        "generated_at": now.isoformat(),
+        "devices": len(devices),
+        "fleet": {
+            "devices_reporting": len(reporting),
+            "devices_with_excursions": sum(1 for d in devices if d["excursion_hours"]),
+            "devices_low_battery": sum(1 for d in devices if d["low_battery_hours"]),
+            "alerts": sum(d["alerts"] for d in devices),
+        },
+        "device_metrics": devices,
+    }
+
+
+class FleetSummaryCache:
+    """Summaries per window, reused for ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = FLEET_CACHE_TTL):
+        self.ttl = ttl
+        self.entries: Dict[float, Tuple[float, dict]] = {}
+
+    def get(self, hours: float) -> Optional[dict]:
+        entry = self.entries.get(hours)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        return None
+
+    def put(self, hours: float, summary: dict) -> None:
+        self.entries[hours] = (time.monotonic() + self.ttl, summary)
+
+
+# Cache shared by /api/fleet/summary
+cache = FleetSummaryCache()
@@ -0,0 +1,243 @@
+"""
+Battery forecasting: which containers will run flat, and when.
+
+Each device's battery moves at roughly a steady rate while on battery
+(solar inactive) and another while charging. Both rates are fitted by least
+squares through the origin on the reading-to-reading changes:
+
+    rate = sum(w * Δbattery * Δt) / sum(w * Δt²)
+
+where each interval counts towards the regime the device was in when it
+began. The weights ``w`` halve every FORECAST_HALF_LIFE_HOURS, so the fit
+follows an ageing battery or a dirtier panel. Intervals longer than
+MAX_GAP_HOURS are left out, since the device may have been off.
+
+Only three weighted sums per regime are kept, in arrays with one row per
+device. ``fit`` loads a whole fleet's history in one vectorized pass, and
+``update`` folds in one reading per device in O(1), so the two give the
+same rates. The time to BATTERY_CRITICAL follows from the current battery
+and the rate of the regime the device is in. While a device is charging,
+it is also projected at its on-battery rate, which tells which containers
+will go dark tonight.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same level as the critical battery alert in generate_alerts
+BATTERY_CRITICAL = 25.0
+FORECAST_HALF_LIFE_HOURS = float(os.environ.get('FORECAST_HALF_LIFE_HOURS', '6'))
+FORECAST_HISTORY_HOURS = float(os.environ.get('FORECAST_HISTORY_HOURS', '24'))
+# Warn when the battery is projected to reach BATTERY_CRITICAL within this many hours
+FORECAST_ALERT_HOURS = float(os.environ.get('FORECAST_ALERT_HOURS', '6'))
+MAX_GAP_HOURS = 1.0
+# A regime's rate is only trusted once this much (weighted) time has been observed in it
+MIN_OBSERVED_HOURS = 0.25
+
+ON_BATTERY, CHARGING = 0, 1
+
+
+def _hours(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp() / 3600.0
+
+
+def _hours_array(timestamps) -> np.ndarray:
+    # datetime64 arrays (taken as UTC) convert in one step, e.g. for bulk history loads
+    if isinstance(timestamps, np.ndarray) and np.issubdtype(timestamps.dtype, np.datetime64):
+        return timestamps.astype("datetime64[ms]").astype(np.int64) / 3.6e6
+    return np.array([_hours(ts) for ts in timestamps], dtype=float)
+
+
+class FleetBatteryForecaster:
+    """Charge and discharge rates, and time to critical, for a fleet of devices."""
+
+    def __init__(self, half_life_hours: float = FORECAST_HALF_LIFE_HOURS, critical: float = BATTERY_CRITICAL,
+                 max_gap_hours: float = MAX_GAP_HOURS, capacity: int = 16):
+        self.half_life = half_life_hours
+        self.critical = critical
+        self.max_gap = max_gap_hours
+
+        self.rows: Dict[str, int] = {}
+        # Per regime: weighted sums of Δbattery·Δt, Δt² and Δt
+        self.sxy = np.zeros((capacity, 2))
+        self.sxx = np.zeros((capacity, 2))
+        self.sx = np.zeros((capacity, 2))
+        self.last_hours = np.full(capacity, np.nan)
+        self.last_battery = np.full(capacity, np.nan)
+        self.last_solar = np.zeros(capacity, dtype=bool)
+
+    def _row(self, device_id: str) -> int:
+        row = self.rows.get(device_id)
+        if row is None:
+            row = len(self.rows)
+            if row == len(self.last_hours):
+                self._grow()
+            self.rows[device_id] = row
+        return row
+
+    def _rows_for(self, device_ids) -> np.ndarray:
+        # New devices are registered once each; the per-reading lookup is a plain dict get
+        for d in dict.fromkeys(device_ids):
+            self._row(d)
+        return np.fromiter(map(self.rows.__getitem__, device_ids), dtype=np.int64, count=len(device_ids))
+
+    def _grow(self) -> None:
+        def double(a, fill):
+            extra = np.full((len(a),) + a.shape[1:], fill, dtype=a.dtype)
+            return np.concatenate([a, extra])
+        self.sxy = double(self.sxy, 0)
+        self.sxx = double(self.sxx, 0)
+        self.sx = double(self.sx, 0)
+        self.last_hours = double(self.last_hours, np.nan)
+        self.last_battery = double(self.last_battery, np.nan)
+        self.last_solar = double(self.last_solar, False)
+
+    def _intervals(self, dt, change):
+        # Intervals that count towards a fit, and their Δb·Δt and Δt² terms
+        valid = ~np.isnan(dt) & ~np.isnan(change) & (dt > 0) & (dt <= self.max_gap)
+        dt = np.where(valid, dt, 0.0)
+        return valid, np.where(valid, change, 0.0) * dt, dt * dt, dt
+
+    def fit(self, device_ids: Sequence[str], timestamps: Sequence[datetime], battery, solar) -> None:
+        """Replace the state of the given devices with a fit over their readings (any order)."""
+        rows = self._rows_for(device_ids)
+        hours = _hours_array(timestamps)
+        battery = np.asarray(battery, dtype=float)
+        solar = np.asarray(solar, dtype=bool)
+        touched = np.unique(rows)
+        for a in (self.sxy, self.sxx, self.sx):
+            a[touched] = 0.0
+        # Readings without a battery value are skipped, as in update
+        keep = ~np.isnan(battery)
+        drow, dhours = np.diff(rows), np.diff(hours)
+        if np.all((drow > 0) | ((drow == 0) & (dhours >= 0))):
+            order = np.flatnonzero(keep)  # already grouped by device and in time order
+        else:
+            order = np.lexsort((hours, rows))
+            order = order[keep[order]]
+        rows, hours, battery, solar = rows[order], hours[order], battery[order], solar[order]
+        if not len(rows):
+            return
+        last = np.flatnonzero(np.r_[rows[1:] != rows[:-1], True])
+        self.last_hours[rows[last]] = hours[last]
+        self.last_battery[rows[last]] = battery[last]
+        self.last_solar[rows[last]] = solar[last]
+
+        same = rows[1:] == rows[:-1]
+        valid, xy, xx, x = self._intervals(np.where(same, np.diff(hours), np.nan), np.diff(battery))
+        interval_rows, regime = rows[1:][valid], solar[:-1][valid].astype(np.int64)
+        # Weight by age at the device's last reading, as the incremental decay would
+        weight = 0.5 ** ((self.last_hours[interval_rows] - hours[1:][valid]) / self.half_life)
+        cells = interval_rows * 2 + regime
+        for a, terms in ((self.sxy, xy), (self.sxx, xx), (self.sx, x)):
+            a += np.bincount(cells, weights=weight * terms[valid], minlength=a.size).reshape(a.shape)
+
+    def update(self, device_ids: Sequence[str], timestamps: Sequence[datetime], battery, solar) -> None:
+        """Fold in one reading per device."""
+        rows = np.array([self._row(d) for d in device_ids], dtype=np.int64)
+        hours = _hours_array(timestamps)
+        battery = np.asarray(battery, dtype=float)
+        solar = np.asarray(solar, dtype=bool)
+
+        present = ~np.isnan(battery)
+        dt = hours - self.last_hours[rows]
+        # Readings without a battery value are skipped entirely, decay included
+        aged = present & ~np.isnan(dt)
+        decay = 0.5 ** (np.where(aged, np.maximum(dt, 0.0), 0.0) / self.half_life)[:, None]
+        valid, xy, xx, x = self._intervals(dt, battery - self.last_battery[rows])
+        regime = self.last_solar[rows].astype(np.int64)
+        onehot = np.zeros((len(rows), 2))
+        onehot[np.arange(len(rows)), regime] = valid
+        self.sxy[rows] = self.sxy[rows] * decay + onehot * xy[:, None]
+        self.sxx[rows] = self.sxx[rows] * decay + onehot * xx[:, None]
+        self.sx[rows] = self.sx[rows] * decay + onehot * x[:, None]
+
+        self.last_hours[rows] = np.where(present, hours, self.last_hours[rows])
+        self.last_battery[rows] = np.where(present, battery, self.last_battery[rows])
+        self.last_solar[rows] = np.where(present, solar, self.last_solar[rows])
+
+    def rates(self, rows) -> np.ndarray:
+        """%/hour per device and regime (columns ON_BATTERY, CHARGING); NaN until enough data."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.sx[rows] >= MIN_OBSERVED_HOURS, self.sxy[rows] / self.sxx[rows], np.nan)
+
+    def forecast(self, device_ids: Optional[Sequence[str]] = None) -> List[dict]:
+        """Rates and hours to the critical level for the given devices (default: all)."""
+        ids = list(self.rows) if device_ids is None else [d for d in device_ids if d in self.rows]
+        rows = np.array([self.rows[d] for d in ids], dtype=np.int64)
+        rates = self.rates(rows)
+        battery, solar = self.last_battery[rows], self.last_solar[rows]
+        current_rate = rates[np.arange(len(rows)), solar.astype(np.int64)]
+        headroom = np.maximum(battery - self.critical, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Hours until critical; NaN when the rate is unknown or the battery isn't draining
+            current = np.where(current_rate < 0, headroom / -current_rate, np.nan)
+            on_battery = np.where(rates[:, ON_BATTERY] < 0, headroom / -rates[:, ON_BATTERY], np.nan)
+
+        def value(x, digits=1):
+            return None if np.isnan(x) else round(float(x), digits)
+
+        return [{
+            "device_id": d,
+            "battery": value(battery[i]),
+            "solar_active": bool(solar[i]),
+            "discharge_rate": value(rates[i, ON_BATTERY], 2),
+            "charge_rate": value(rates[i, CHARGING], 2),
+            "hours_to_critical": value(current[i]),
+            "hours_to_critical_on_battery": value(on_battery[i]),
+        } for i, d in enumerate(ids)]
+
+    def observe(self, device_id: str, timestamp: datetime, reading: dict) -> dict:
+        """Fold in a single reading dict (e.g. a sensor document); returns the device's forecast."""
+        battery = np.nan if reading.get("battery") is None else reading["battery"]
+        self.update([device_id], [timestamp], [battery], [bool(reading.get("solar_active"))])
+        return self.forecast([device_id])[0]
+
+
+def forecast_alerts(forecast: dict, within_hours: float = FORECAST_ALERT_HOURS) -> List[dict]:
+    """A predictive alert, in the same shape as generate_alerts, if the battery will be critical soon."""
+    hours = forecast["hours_to_critical"]
+    battery = forecast["battery"]
+    # Below the critical level the threshold alert already fires
+    if hours is None or battery is None or battery <= BATTERY_CRITICAL or hours > within_hours:
+        return []
+    return [{
+        "id": str(uuid.uuid4()),
+        "type": "forecast:battery",
+        "severity": "critical" if hours <= 1 else "warning",
+        "message": (f"Battery Forecast: will reach {BATTERY_CRITICAL:g}% in {hours:g} hours "
+                    f"at the current {abs(forecast['discharge_rate']):g}%/hour drain"
+                    if not forecast["solar_active"] else
+                    f"Battery Forecast: will reach {BATTERY_CRITICAL:g}% in {hours:g} hours even while charging"),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "acknowledged": False,
+    }]
+
+
+async def load_history(repository, forecaster: FleetBatteryForecaster, device_id: str) -> int:
+    """Fit ``forecaster`` for the device from its last FORECAST_HISTORY_HOURS of readings.
+
+    ``repository`` is the store's readings repository (see repositories.py).
+    Returns the number of readings used.
+    """
+    since = datetime.now(timezone.utc) - timedelta(hours=FORECAST_HISTORY_HOURS)
+    readings = await repository.history(device_id, since, ("battery", "solar_active"))
+    forecaster.fit(
+        [device_id] * len(readings),
+        [r["timestamp"] for r in readings],
+        [r.get("battery", np.nan) for r in readings],
+        [bool(r.get("solar_active")) for r in readings],
+    )
+    return len(readings)
+
+
+# Forecaster shared by the ingestion path and /api/battery/forecast
+forecaster = FleetBatteryForecaster()
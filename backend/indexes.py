@@ -0,0 +1,109 @@
+"""
+Declarative index registry for the KhetBox collections.
+
+Every query shape the API runs should be covered by an index listed here.
+``ensure_indexes`` is idempotent and runs in the background at startup;
+test_query_plans.py checks each endpoint's queries with explain().
+
+A spec that an existing deployment can only satisfy after a data migration
+(e.g. a unique index over data that still has duplicates) names that
+migration, and startup leaves it to the migration until it has been applied.
+"""
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    # Migration that creates the index on existing deployments
+    migration: Optional[int] = None
+
+
+INDEXES = [
+    # Latest sensor document per device (sensor clock upsert)
+    IndexSpec("sensors", [("device_id", 1)]),
+    # Reading history per device, newest first
+    IndexSpec("readings", [("device_id", 1), ("timestamp", -1)]),
+    # get_alerts: filter by device, sort by timestamp desc
+    IndexSpec("alerts", [("device_id", 1), ("timestamp", -1)]),
+    # Alert deltas for pollers: alerts changed since a version
+    IndexSpec("alerts", [("device_id", 1), ("version", 1)]),
+    IndexSpec("alert_state", [("device_id", 1)], unique=True),
+    # get_daily_reports / export_report_pdf: equality on date + device_id; the
+    # scheduler upserts on it. Older deployments have it without unique and
+    # may hold duplicate reports until migration 9 removes them
+    IndexSpec("reports", [("date", -1), ("device_id", 1)], unique=True, migration=9),
+    # Hourly rollups per device, read by hour range
+    IndexSpec("hourly_rollups", [("device_id", 1), ("hour", 1)], unique=True),
+    IndexSpec("storage", [("device_id", 1)]),
+    IndexSpec("cctv_streams", [("device_id", 1)]),
+    IndexSpec("users", [("email", 1)], unique=True),
+    # Capacity reads: one totals document per device
+    IndexSpec("inventory_totals", [("device_id", 1)], unique=True),
+    # Stock movement history per device, newest first
+    IndexSpec("inventory_ledger", [("device_id", 1), ("timestamp", -1)]),
+    # Door/power intervals per device by start time (history load, closing an interval)
+    IndexSpec("events", [("device_id", 1), ("start", 1)]),
+    # Notification retries due for another attempt
+    IndexSpec("notification_retries", [("id", 1)], unique=True),
+    IndexSpec("notification_retries", [("dead", 1), ("next_attempt", 1)]),
+]
+
+
+def index_name(spec: IndexSpec) -> str:
+    # Same naming scheme MongoDB uses by default, so indexes created by
+    # earlier scripts (init_db.py) are recognised instead of duplicated
+    return "_".join(f"{field}_{direction}" for field, direction in spec.keys)
+
+
+async def ensure_indexes(db, specs: List[IndexSpec] = INDEXES) -> dict:
+    """Create any missing indexes; existing ones are left untouched.
+
+    Returns a mapping of collection name to the index names created or
+    confirmed. Failures (e.g. duplicate data blocking a unique index) are
+    logged per collection and don't stop the rest.
+    """
+    by_collection = {}
+    for spec in specs:
+        by_collection.setdefault(spec.collection, []).append(
+            IndexModel(spec.keys, name=index_name(spec), unique=spec.unique)
+        )
+
+    ensured = {}
+    for collection, models in by_collection.items():
+        try:
+            ensured[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.warning(f"Could not ensure indexes on {collection}: {e}")
+    return ensured
+
+
+async def ensure_startup_indexes(db) -> dict:
+    """ensure_indexes, skipping specs whose migration hasn't been applied yet."""
+    from migrations import applied_versions
+
+    applied = await applied_versions(db)
+    specs, deferred = [], []
+    for spec in INDEXES:
+        (specs if spec.migration is None or spec.migration in applied else deferred).append(spec)
+    for spec in deferred:
+        logger.info(f"Leaving index {spec.collection}.{index_name(spec)} to pending migration {spec.migration}")
+    return await ensure_indexes(db, specs)
+
+
+def plan_stages(plan: dict) -> List[str]:
+    """Flatten the stage names of an explain() winning plan."""
+    stages = [plan.get("stage")] if plan.get("stage") else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return stages
@@ -0,0 +1,240 @@
+"""
+Inventory ledger and materialized capacity counters.
+
+Every stock movement is recorded as an event in ``inventory_ledger`` and
+applied with ``$inc`` to two sets of counters:
+
+- the storage unit document itself (``crops.$.quantity`` and ``used_kg``),
+  which is the source of truth. Stock-in and stock-out are conditional
+  updates, so concurrent movements can't overfill a unit or take out more
+  than it holds.
+- one ``inventory_totals`` document per device with per-crop and per-unit
+  totals, so a capacity read is a single indexed ``find_one`` instead of a
+  scan over units and crops.
+
+``rebuild_totals`` recomputes a device's totals from its storage units; it
+is used by the migration that introduces the ledger and as a repair tool.
+
+The embedded store (sqlite_store.py) applies movements to a unit document
+in one transaction with ``apply_movement`` and derives capacity from the
+units with ``totals_from_units`` instead.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+DEFAULT_UNIT_CAPACITY_KG = 1500
+
+# Colours for the largest crops in the capacity breakdown; the rest go into "Other"
+BREAKDOWN_COLORS = ["#EF4444", "#F59E0B", "#10B981", "#3B82F6"]
+OTHER_COLOR = "#6366F1"
+OTHER_ICON = "📦"
+
+
+class InventoryError(ValueError):
+    pass
+
+
+class UnknownUnit(InventoryError):
+    pass
+
+
+class InsufficientStock(InventoryError):
+    pass
+
+
+class CapacityExceeded(InventoryError):
+    pass
+
+
+def _check_key(name: str) -> None:
+    # Crop and unit names become field names in the totals document
+    if not name or "." in name or name.startswith("$"):
+        raise InventoryError(f"Invalid name: {name!r}")
+
+
+def check_movement(unit: str, crop: str, quantity_kg: float, kind: str) -> None:
+    if kind not in ("in", "out"):
+        raise InventoryError(f"Unknown movement kind: {kind!r}")
+    if quantity_kg <= 0:
+        raise InventoryError("quantity_kg must be positive")
+    _check_key(unit)
+    _check_key(crop)
+
+
+def ledger_event(device_id: str, unit: str, crop: str, kind: str, quantity_kg: float,
+                 note: Optional[str], now: datetime) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "device_id": device_id,
+        "unit": unit,
+        "crop": crop,
+        "kind": kind,
+        "quantity_kg": quantity_kg,
+        "note": note,
+        "timestamp": now,
+    }
+
+
+async def record_movement(db, device_id: str, unit: str, crop: str, quantity_kg: float, kind: str,
+                          icon: Optional[str] = None, note: Optional[str] = None) -> dict:
+    """Record a stock-in (``kind="in"``) or stock-out (``kind="out"``) and update the counters.
+
+    Raises UnknownUnit, InsufficientStock or CapacityExceeded if the
+    movement can't be applied; nothing is written in that case.
+    """
+    check_movement(unit, crop, quantity_kg, kind)
+
+    unit_filter = {"device_id": device_id, "name": unit}
+    unit_doc = await db.storage.find_one(unit_filter, {"_id": 0, "capacity_kg": 1})
+    if unit_doc is None:
+        raise UnknownUnit(f"No storage unit {unit!r} on {device_id}")
+
+    now = datetime.now(timezone.utc)
+    delta = quantity_kg if kind == "in" else -quantity_kg
+    if kind == "out":
+        result = await db.storage.update_one(
+            {**unit_filter, "crops": {"$elemMatch": {"name": crop, "quantity": {"$gte": quantity_kg}}}},
+            {"$inc": {"crops.$.quantity": delta, "used_kg": delta}},
+        )
+        if not result.modified_count:
+            raise InsufficientStock(f"Not enough {crop} in {unit} to remove {quantity_kg} kg")
+    else:
+        capacity = unit_doc.get("capacity_kg", DEFAULT_UNIT_CAPACITY_KG)
+        has_room = {"used_kg": {"$lte": capacity - quantity_kg}}
+        while True:
+            result = await db.storage.update_one(
+                {**unit_filter, "crops.name": crop, **has_room},
+                {"$inc": {"crops.$.quantity": delta, "used_kg": delta}},
+            )
+            if result.modified_count:
+                # Restocking an emptied crop starts a new lot for shelf-life tracking
+                await db.storage.update_one(
+                    {**unit_filter, "crops": {"$elemMatch": {"name": crop, "quantity": quantity_kg}}},
+                    {"$set": {"crops.$.stocked_at": now}},
+                )
+                break
+            new_crop = {"name": crop, "quantity": quantity_kg, "unit": "kg", "icon": icon or OTHER_ICON,
+                        "stocked_at": now}
+            result = await db.storage.update_one(
+                {**unit_filter, "crops.name": {"$ne": crop}, **has_room},
+                {"$push": {"crops": new_crop}, "$inc": {"used_kg": delta}},
+            )
+            if result.modified_count:
+                break
+            if not await db.storage.count_documents({**unit_filter, **has_room}, limit=1):
+                raise CapacityExceeded(f"{unit} has no room for {quantity_kg} kg more")
+            # Otherwise another request added or emptied the crop in between; try again
+
+    totals_update = {
+        "$inc": {"used_kg": delta, f"crops.{crop}": delta, f"units.{unit}.used_kg": delta},
+        "$set": {"updated_at": now},
+    }
+    if icon:
+        totals_update["$set"][f"icons.{crop}"] = icon
+    result = await db.inventory_totals.update_one({"device_id": device_id}, totals_update)
+    if not result.matched_count:
+        await rebuild_totals(db, device_id)
+
+    event = ledger_event(device_id, unit, crop, kind, quantity_kg, note, now)
+    await db.inventory_ledger.insert_one(dict(event))
+    return event
+
+
+def apply_movement(unit_doc: dict, crop: str, quantity_kg: float, kind: str,
+                   icon: Optional[str] = None, now: Optional[datetime] = None) -> None:
+    """Apply a checked movement to a storage unit document in place.
+
+    The in-memory counterpart of record_movement's conditional updates, for
+    callers that hold the document exclusively (a transaction). Raises
+    InsufficientStock or CapacityExceeded and leaves the document untouched
+    if the movement can't be applied.
+    """
+    now = now or datetime.now(timezone.utc)
+    crops = unit_doc.setdefault("crops", [])
+    lot = next((c for c in crops if c["name"] == crop), None)
+    used = unit_doc.get("used_kg", sum(c.get("quantity", 0) for c in crops))
+    if kind == "out":
+        if lot is None or lot.get("quantity", 0) < quantity_kg:
+            raise InsufficientStock(f"Not enough {crop} in {unit_doc['name']} to remove {quantity_kg} kg")
+        lot["quantity"] -= quantity_kg
+        unit_doc["used_kg"] = used - quantity_kg
+        return
+    if used > unit_doc.get("capacity_kg", DEFAULT_UNIT_CAPACITY_KG) - quantity_kg:
+        raise CapacityExceeded(f"{unit_doc['name']} has no room for {quantity_kg} kg more")
+    if lot is None:
+        crops.append({"name": crop, "quantity": quantity_kg, "unit": "kg", "icon": icon or OTHER_ICON,
+                      "stocked_at": now})
+    else:
+        if lot.get("quantity", 0) <= 0:
+            # Restocking an emptied crop starts a new lot for shelf-life tracking
+            lot["stocked_at"] = now
+        lot["quantity"] = lot.get("quantity", 0) + quantity_kg
+    unit_doc["used_kg"] = used + quantity_kg
+
+
+async def rebuild_totals(db, device_id: str) -> dict:
+    """Recompute the device totals from its storage units.
+
+    Not safe to run concurrently with record_movement for the same device.
+    """
+    units = await db.storage.find(
+        {"device_id": device_id}, {"_id": 0, "name": 1, "capacity_kg": 1, "crops": 1}
+    ).to_list(length=None)
+    totals = totals_from_units(device_id, units)
+    await db.inventory_totals.replace_one({"device_id": device_id}, dict(totals), upsert=True)
+    return totals
+
+
+def totals_from_units(device_id: str, units: List[dict]) -> dict:
+    """The ``inventory_totals`` document for a device's storage units."""
+    totals = {
+        "device_id": device_id,
+        "capacity_kg": 0,
+        "used_kg": 0,
+        "crops": {},
+        "icons": {},
+        "units": {},
+        "updated_at": datetime.now(timezone.utc),
+    }
+    for unit in units:
+        capacity = unit.get("capacity_kg", DEFAULT_UNIT_CAPACITY_KG)
+        used = 0
+        for crop in unit.get("crops", []):
+            used += crop["quantity"]
+            totals["crops"][crop["name"]] = totals["crops"].get(crop["name"], 0) + crop["quantity"]
+            if crop.get("icon"):
+                totals["icons"][crop["name"]] = crop["icon"]
+        totals["units"][unit["name"]] = {"capacity_kg": capacity, "used_kg": used}
+        totals["capacity_kg"] += capacity
+        totals["used_kg"] += used
+    return totals
+
+
+def capacity_view(totals: dict) -> dict:
+    """Shape an ``inventory_totals`` document into the /api/capacity response."""
+    total = totals.get("capacity_kg", 0)
+    used = totals.get("used_kg", 0)
+    icons = totals.get("icons", {})
+
+    crops = sorted(((name, kg) for name, kg in totals.get("crops", {}).items() if kg > 0),
+                   key=lambda item: item[1], reverse=True)
+    breakdown = [
+        {"name": name, "kg": kg, "color": color, "icon": icons.get(name, OTHER_ICON)}
+        for (name, kg), color in zip(crops, BREAKDOWN_COLORS)
+    ]
+    other = sum(kg for _, kg in crops[len(BREAKDOWN_COLORS):])
+    if other:
+        breakdown.append({"name": "Other", "kg": other, "color": OTHER_COLOR, "icon": OTHER_ICON})
+
+    return {
+        "total_capacity_kg": total,
+        "used_kg": used,
+        "available_kg": total - used,
+        "used_percentage": round(used / total * 100, 1) if total else 0.0,
+        "breakdown": breakdown,
+        "units": [
+            {"name": name, "capacity_kg": unit["capacity_kg"], "used_kg": unit["used_kg"]}
+            for name, unit in totals.get("units", {}).items()
+        ],
+    }
@@ -0,0 +1,336 @@
+"""
+Low-overhead metrics with Prometheus text exposition.
+
+Label sets are allocated up front (or once per route, on first use), so
+recording a request is a couple of list increments: no dicts or label
+tuples are built on the hot path. ``registry.render()`` produces the
+``/metrics`` payload.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Return the child for a label set, creating it once.
+
+        Callers on hot paths should keep the returned child rather than
+        calling ``labels()`` per observation.
+        """
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """A gauge; pass ``fn`` to read the value from a callback at render time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], float]] = None):
+        self.fn = fn
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._children[()].dec(amount)
+
+    def _render_child(self, values, child):
+        value = self.fn() if self.fn is not None else child.value
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...], threadsafe: bool):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock() if threadsafe else None
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if self.lock is None:
+            self.counts[index] += 1
+            self.sum += value
+        else:
+            with self.lock:
+                self.counts[index] += 1
+                self.sum += value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram.
+
+    Children are lock-free by default, which is safe for observations made
+    on the event loop; pass ``threadsafe=True`` for metrics fed from driver
+    threads (MongoDB monitoring callbacks).
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, threadsafe: bool = False):
+        self.buckets = tuple(sorted(buckets))
+        self.threadsafe = threadsafe
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self.threadsafe)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        counts = list(child.counts)
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "khetbox_http_request_duration_seconds", "HTTP request latency by route", ["route", "method"]))
+RESPONSES = registry.register(Counter(
+    "khetbox_http_responses_total", "HTTP responses by route and status class", ["route", "method", "status"]))
+IN_FLIGHT = registry.register(Gauge(
+    "khetbox_http_requests_in_flight", "HTTP requests currently being served"))
+MONGO_COMMAND_LATENCY = registry.register(Histogram(
+    "khetbox_mongo_command_duration_seconds", "MongoDB command latency", ["command"], threadsafe=True))
+MONGO_COMMAND_FAILURES = registry.register(Counter(
+    "khetbox_mongo_command_failures_total", "Failed MongoDB commands", ["command"]))
+MONGO_POOL_WAIT = registry.register(Histogram(
+    "khetbox_mongo_pool_wait_seconds", "Time spent waiting for a pooled MongoDB connection", threadsafe=True))
+WS_SEND_LATENCY = registry.register(Histogram(
+    "khetbox_ws_send_duration_seconds", "WebSocket message send latency"))
+WS_CLIENTS = registry.register(Gauge(
+    "khetbox_ws_clients", "Connected WebSocket clients"))
+SSE_CLIENTS = registry.register(Gauge(
+    "khetbox_sse_clients", "Connected Server-Sent Events clients"))
+WS_SEND_QUEUE = registry.register(Gauge(
+    "khetbox_ws_send_queue_depth", "WebSocket sends started but not yet completed"))
+LOOP_LAG = registry.register(Histogram(
+    "khetbox_event_loop_lag_seconds", "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+MONGO_COMMANDS = ("find", "getMore", "insert", "update", "delete", "aggregate", "count", "ping", "createIndexes")
+
+
+class _RouteMetrics:
+    __slots__ = ("latency", "responses")
+
+    def __init__(self, route: str, method: str):
+        self.latency = REQUEST_LATENCY.labels(route, method)
+        self.responses = [RESPONSES.labels(route, method, cls) for cls in STATUS_CLASSES]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and in-flight count.
+
+    Per-route label children are attached once to each route object (see
+    ``preallocate``); unmatched paths share a single ``<unmatched>`` set so
+    arbitrary URLs can't grow the label space.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._unmatched: Dict[str, _RouteMetrics] = {}
+
+    def _route_metrics(self, scope) -> _RouteMetrics:
+        method = scope["method"]
+        route = scope.get("route")
+        if route is not None:
+            per_method = getattr(route, "_khetbox_metrics", None)
+            if per_method is None:
+                per_method = {}
+                route._khetbox_metrics = per_method
+            metrics = per_method.get(method)
+            if metrics is None:
+                metrics = per_method.setdefault(method, _RouteMetrics(route.path, method))
+            return metrics
+        metrics = self._unmatched.get(method)
+        if metrics is None:
+            metrics = self._unmatched.setdefault(method, _RouteMetrics("<unmatched>", method))
+        return metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT._children[()]
+        in_flight.value += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.value -= 1
+            metrics = self._route_metrics(scope)
+            metrics.latency.observe(elapsed)
+            metrics.responses[min(max(status_code // 100, 1), 5) - 1].inc()
+
+
+def preallocate(routes) -> None:
+    """Allocate label children for every known route and method at startup."""
+    for route in routes:
+        methods = getattr(route, "methods", None)
+        if not methods:
+            continue
+        per_method = getattr(route, "_khetbox_metrics", None) or {}
+        for method in methods:
+            per_method.setdefault(method, _RouteMetrics(route.path, method))
+        route._khetbox_metrics = per_method
+    for command in MONGO_COMMANDS:
+        MONGO_COMMAND_LATENCY.labels(command)
+        MONGO_COMMAND_FAILURES.labels(command)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds MongoDB command latencies (reported by the driver) into histograms."""
+
+    def _latency(self, command_name: str):
+        return MONGO_COMMAND_LATENCY.labels(command_name)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._latency(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self._latency(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+async def monitor_loop_lag(interval: float = 0.5) -> None:
+    """Measure how late the event loop wakes a sleeping task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,394 @@
+"""
+Versioned, resumable schema migrations for the KhetBox database.
+
+Each migration has a version number and is recorded in the
+``schema_migrations`` collection once applied. Migrations are idempotent and
+work in bulk batches walked in ``_id`` order; the last ``_id`` of every batch
+is checkpointed, so an interrupted run resumes where it stopped. A sleep
+between batches keeps large backfills from starving the live API.
+
+Usage:
+    python migrations.py                 # apply all pending migrations
+    python migrations.py --status        # list applied / pending versions
+    python migrations.py --batch-size 1000 --throttle 0.1
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+DEFAULT_DEVICE_ID = "khetbox-001"
+
+# Default device data (migration 4; also seeds the embedded store, see sqlite_store.py)
+SEED_SENSOR = {
+    "temperature": 4.4,
+    "humidity": 61.0,
+    "battery": 61.0,
+    "storage_used": 61.0,
+    "solar_active": True,
+    "door_open": False,
+    "door_open_time": None,
+}
+SEED_STORAGE_UNITS = [
+    {
+        "name": "Cold Storage Unit A",
+        "type": "cold",
+        "temperature_range": "2-8°C",
+        "humidity_control": True,
+        "current_temp": 4.4,
+        "current_humidity": 61.0,
+        "crops": [
+            {"name": "Tomatoes", "quantity": 450, "unit": "kg", "icon": "🍅"},
+            {"name": "Chillies", "quantity": 280, "unit": "kg", "icon": "🌶️"},
+            {"name": "Leafy Greens", "quantity": 180, "unit": "kg", "icon": "🥬"}
+        ],
+    },
+    {
+        "name": "Dry Storage Unit B",
+        "type": "dry",
+        "temperature_range": "15-25°C",
+        "humidity_control": True,
+        "current_temp": 22.5,
+        "current_humidity": 45.0,
+        "crops": [
+            {"name": "Rice", "quantity": 650, "unit": "kg", "icon": "🍚"},
+            {"name": "Wheat", "quantity": 420, "unit": "kg", "icon": "🌾"},
+            {"name": "Pulses", "quantity": 220, "unit": "kg", "icon": "🫘"}
+        ],
+    },
+]
+SEED_CCTV_STREAMS = [
+    {
+        "id": "cam-inside-01",
+        "name": "Inside Camera",
+        "location": "Storage Container Interior",
+        "url": "https://placeholder-stream-inside.khetbox.local/live",
+    },
+    {
+        "id": "cam-outside-01",
+        "name": "Outside Camera",
+        "location": "Container Exterior & Entrance",
+        "url": "https://placeholder-stream-outside.khetbox.local/live",
+    },
+]
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[["MigrationContext"], Awaitable[None]]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+class MigrationContext:
+    def __init__(self, db, version: int, batch_size: int = 500, throttle: float = 0.05):
+        self.db = db
+        self.version = version
+        self.batch_size = batch_size
+        self.throttle = throttle
+
+    async def _checkpoint(self, key: str) -> Optional[object]:
+        state = await self.db[MIGRATIONS_COLLECTION].find_one({"_id": self.version})
+        return (state or {}).get("checkpoints", {}).get(key)
+
+    async def _save_checkpoint(self, key: str, last_id, processed: int) -> None:
+        await self.db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": self.version},
+            {
+                "$set": {f"checkpoints.{key}": last_id, "updated_at": datetime.now(timezone.utc)},
+                "$inc": {"processed": processed},
+            },
+            upsert=True,
+        )
+
+    async def update_in_batches(self, collection: str, query: dict, transform: Callable[[dict], Optional[dict]],
+                                projection: Optional[dict] = None) -> int:
+        """Apply ``transform`` to every document matching ``query``, batch by batch.
+
+        ``transform`` returns the ``$set`` document for a matching document,
+        or None to leave it unchanged. Returns the number of documents updated.
+        """
+        key = f"{collection}:{'.'.join(sorted(query))}"
+        last_id = await self._checkpoint(key)
+        updated = 0
+        while True:
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            batch = await self.db[collection].find(batch_query, projection).sort("_id", 1).to_list(length=self.batch_size)
+            if not batch:
+                break
+
+            ops = []
+            for doc in batch:
+                changes = transform(doc)
+                if changes:
+                    ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+            if ops:
+                result = await self.db[collection].bulk_write(ops, ordered=False)
+                updated += result.modified_count
+
+            last_id = batch[-1]["_id"]
+            await self._save_checkpoint(key, last_id, len(batch))
+            if len(batch) < self.batch_size:
+                break
+            await asyncio.sleep(self.throttle)
+        return updated
+
+
+# Migrations
+
+@migration(1, "create readings time-series collection")
+async def create_readings_timeseries(ctx: MigrationContext):
+    if "readings" in await ctx.db.list_collection_names():
+        return
+    try:
+        await ctx.db.create_collection(
+            "readings",
+            timeseries={"timeField": "timestamp", "metaField": "device_id", "granularity": "minutes"},
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as e:
+        # Time-series collections need MongoDB 5.0+; fall back to a regular one
+        logger.warning(f"Time-series collection unsupported, creating a regular one: {e}")
+        await ctx.db.create_collection("readings")
+
+
+@migration(2, "backfill device_id")
+async def backfill_device_id(ctx: MigrationContext):
+    for collection in ("sensors", "alerts", "reports", "storage", "cctv_streams"):
+        count = await ctx.update_in_batches(
+            collection,
+            {"device_id": {"$exists": False}},
+            lambda doc: {"device_id": DEFAULT_DEVICE_ID},
+            projection={"_id": 1},
+        )
+        logger.info(f"  {collection}: set device_id on {count} documents")
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@migration(3, "convert string timestamps to dates")
+async def convert_string_timestamps(ctx: MigrationContext):
+    fields = {
+        "cctv_streams": "last_active",
+        "alerts": "timestamp",
+        "sensors": "last_update",
+        "reports": "created_at",
+        "storage": "created_at",
+    }
+    for collection, field in fields.items():
+        def to_date(doc, field=field):
+            parsed = _parse_timestamp(doc[field])
+            return {field: parsed} if parsed else None
+
+        count = await ctx.update_in_batches(
+            collection,
+            {field: {"$type": "string"}},
+            to_date,
+            projection={field: 1},
+        )
+        logger.info(f"  {collection}.{field}: converted {count} documents")
+
+
+@migration(4, "seed default device data")
+async def seed_defaults(ctx: MigrationContext):
+    # Only inserts what's missing; never overwrites existing documents
+    now = datetime.now(timezone.utc)
+    await ctx.db.sensors.update_one(
+        {"device_id": DEFAULT_DEVICE_ID},
+        {"$setOnInsert": {**SEED_SENSOR, "last_update": now, "created_at": now}},
+        upsert=True,
+    )
+    for unit in SEED_STORAGE_UNITS:
+        await ctx.db.storage.update_one(
+            {"device_id": DEFAULT_DEVICE_ID, "name": unit["name"]},
+            {"$setOnInsert": {**unit, "created_at": now}},
+            upsert=True,
+        )
+    for stream in SEED_CCTV_STREAMS:
+        await ctx.db.cctv_streams.update_one(
+            {"device_id": DEFAULT_DEVICE_ID, "id": stream["id"]},
+            {"$setOnInsert": {**stream, "status": "active", "last_active": now, "created_at": now}},
+            upsert=True,
+        )
+
+
+@migration(5, "ensure indexes")
+async def create_indexes(ctx: MigrationContext):
+    from indexes import ensure_indexes
+
+    await ensure_indexes(ctx.db)
+
+
+@migration(6, "inventory ledger and capacity counters")
+async def inventory_counters(ctx: MigrationContext):
+    from indexes import INDEXES, ensure_indexes
+    from inventory import DEFAULT_UNIT_CAPACITY_KG, rebuild_totals
+
+    def unit_counters(doc):
+        return {
+            "capacity_kg": doc.get("capacity_kg", DEFAULT_UNIT_CAPACITY_KG),
+            "used_kg": sum(crop.get("quantity", 0) for crop in doc.get("crops", [])),
+        }
+
+    await ctx.update_in_batches("storage", {"used_kg": {"$exists": False}}, unit_counters,
+                                projection={"capacity_kg": 1, "crops": 1})
+
+    # Opening balances, so the ledger accounts for stock that predates it
+    now = datetime.now(timezone.utc)
+    async for unit in ctx.db.storage.find({}, {"_id": 0, "device_id": 1, "name": 1, "crops": 1}):
+        for crop in unit.get("crops", []):
+            event_id = f"opening:{unit['device_id']}:{unit['name']}:{crop['name']}"
+            await ctx.db.inventory_ledger.update_one(
+                {"id": event_id},
+                {"$setOnInsert": {
+                    "device_id": unit["device_id"], "unit": unit["name"], "crop": crop["name"],
+                    "kind": "in", "quantity_kg": crop.get("quantity", 0), "note": "opening balance",
+                    "timestamp": now,
+                }},
+                upsert=True,
+            )
+
+    for device_id in await ctx.db.storage.distinct("device_id"):
+        await rebuild_totals(ctx.db, device_id)
+    await ensure_indexes(ctx.db, [spec for spec in INDEXES if spec.collection.startswith("inventory_")])
+
+
+@migration(7, "stocked_at on crop lots")
+async def crop_stocked_at(ctx: MigrationContext):
+    # Existing stock is aged from when its storage unit was created
+    now = datetime.now(timezone.utc)
+
+    def stamp_crops(doc):
+        crops = doc.get("crops", [])
+        if all("stocked_at" in crop for crop in crops):
+            return None
+        stocked_at = doc.get("created_at", now)
+        return {"crops": [{"stocked_at": stocked_at, **crop} for crop in crops]}
+
+    await ctx.update_in_batches("storage", {}, stamp_crops, projection={"crops": 1, "created_at": 1})
+
+
+@migration(8, "unacknowledged alert counters")
+async def alert_counters(ctx: MigrationContext):
+    from alert_state import rebuild_state
+    from indexes import INDEXES, ensure_indexes
+
+    await ensure_indexes(ctx.db, [spec for spec in INDEXES if spec.collection in ("alerts", "alert_state")])
+    for device_id in await ctx.db.alerts.distinct("device_id"):
+        await rebuild_state(ctx.db, device_id)
+
+
+@migration(9, "unique daily reports")
+async def unique_reports(ctx: MigrationContext):
+    from indexes import INDEXES, ensure_indexes, index_name
+
+    # Reports used to be created lazily by concurrent requests; keep the newest of any duplicates
+    seen = set()
+    async for doc in ctx.db.reports.find({}, {"_id": 1, "date": 1, "device_id": 1}).sort("created_at", -1):
+        key = (doc.get("date"), doc.get("device_id"))
+        if key in seen:
+            await ctx.db.reports.delete_one({"_id": doc["_id"]})
+        else:
+            seen.add(key)
+
+    specs = [spec for spec in INDEXES if spec.collection in ("reports", "hourly_rollups")]
+    # The same index existed without the unique option; it has to be rebuilt
+    name = index_name(next(spec for spec in specs if spec.collection == "reports"))
+    existing = await ctx.db.reports.index_information()
+    if name in existing and not existing[name].get("unique"):
+        await ctx.db.reports.drop_index(name)
+    await ensure_indexes(ctx.db, specs)
+
+
+@migration(10, "timezone on daily reports")
+async def report_timezones(ctx: MigrationContext):
+    # Reports before per-device timezones covered UTC days
+    await ctx.update_in_batches("reports", {"timezone": {"$exists": False}}, lambda doc: {"timezone": "UTC"},
+                                projection={"_id": 1})
+
+
+# Runner
+
+async def applied_versions(db) -> set:
+    cursor = db[MIGRATIONS_COLLECTION].find({"applied_at": {"$exists": True}}, {"_id": 1})
+    return {doc["_id"] async for doc in cursor}
+
+
+async def migrate(db, target: Optional[int] = None, batch_size: int = 500, throttle: float = 0.05) -> List[int]:
+    """Apply pending migrations up to ``target`` (default: all). Returns the versions applied."""
+    done = await applied_versions(db)
+    applied = []
+    for m in MIGRATIONS:
+        if m.version in done or (target is not None and m.version > target):
+            continue
+        logger.info(f"Applying migration {m.version}: {m.name}")
+        await m.apply(MigrationContext(db, m.version, batch_size=batch_size, throttle=throttle))
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": m.version},
+            {"$set": {"name": m.name, "applied_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        applied.append(m.version)
+    return applied
+
+
+async def main(argv=None):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Apply KhetBox database migrations")
+    parser.add_argument("--target", type=int, help="highest migration version to apply")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--throttle", type=float, default=0.05, help="seconds to sleep between batches")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).parent / '.env')
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'test_database')
+
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000)
+    db = client[db_name]
+    try:
+        if args.status:
+            done = await applied_versions(db)
+            for m in MIGRATIONS:
+                print(f"  [{'x' if m.version in done else ' '}] {m.version:04d} {m.name}")
+            return
+        applied = await migrate(db, target=args.target, batch_size=args.batch_size, throttle=args.throttle)
+        print(f"Applied migrations: {applied or 'none pending'}")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Request and response models.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+# Models
+class User(BaseModel):
+    email: str
+    password: str
+    role: str = "farmer"
+    name: Optional[str] = None
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class SensorData(BaseModel):
+    temperature: float
+    humidity: float
+    battery: float
+    storage_used: float
+    solar_active: bool
+    door_open: bool
+    door_open_duration: int
+    last_update: str
+
+class Alert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    severity: str
+    message: str
+    timestamp: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    acknowledged: bool = False
+
+class StorageInfo(BaseModel):
+    name: str
+    type: str
+    temperature_range: str
+    humidity_control: bool
+    current_temp: float
+    current_humidity: float
+    crops: List[dict]
+
+class CCTVStream(BaseModel):
+    id: str
+    name: str
+    location: str
+    url: str
+    status: str
+    last_active: str
+
+class DailyReport(BaseModel):
+    date: str
+    avg_temperature: float
+    min_temperature: float
+    max_temperature: float
+    avg_humidity: float
+    avg_battery: float
+    alerts_count: int
+    uptime_percentage: float
+
+class InventoryMovement(BaseModel):
+    unit: str
+    crop: str
+    quantity_kg: float = Field(gt=0)
+    kind: Literal["in", "out"]
+    icon: Optional[str] = None
+    note: Optional[str] = None
+
+class AlertAckRequest(BaseModel):
+    # Either explicit alert ids, or a filter; both may be combined
+    ids: Optional[List[str]] = Field(default=None, max_length=10000)
+    severity: Optional[Literal["critical", "warning"]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    device_id: str = "khetbox-001"
+
+class DeviceTimezone(BaseModel):
+    timezone: str = Field(min_length=1, max_length=64)  # IANA name, e.g. "Asia/Kolkata"
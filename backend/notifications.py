@@ -0,0 +1,469 @@
+"""
+Alert notifications over SMS gateways, email and webhooks.
+
+``submit`` puts alerts on an in-memory queue and returns straight away, so
+ingestion never waits on a notification. A single worker fans them out to
+the recipients:
+
+- dedup: a recipient gets the same alert type from the same device at most
+  once per ``dedup_seconds``;
+- digest: warnings are held per recipient and sent as one message when the
+  recipient's digest window closes. A flapping sensor then costs one
+  message per window instead of one per status tick;
+- priority: critical alerts skip the digest and go out immediately.
+
+A failed send is stored in the ``notification_retries`` collection and retried
+with exponential backoff, up to ``max_attempts`` tries. Entries that run out
+of attempts stay in the collection, marked ``dead``. While MongoDB is
+unreachable, retries are held in memory until they can be stored.
+
+Sinks are pluggable: anything with a ``name`` and
+``async send(recipient, message)``. ``FakeSink`` records messages for tests
+and benchmarks.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import metrics
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {"warning": 1, "critical": 2}
+
+NOTIFY_DEDUP_MIN = float(os.environ.get('NOTIFY_DEDUP_MIN', '15'))
+NOTIFY_DIGEST_MIN = float(os.environ.get('NOTIFY_DIGEST_MIN', '10'))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8'))
+
+SENT = metrics.registry.register(metrics.Counter(
+    "khetbox_notifications_sent_total", "Notifications delivered", ["sink", "kind"]))
+FAILED = metrics.registry.register(metrics.Counter(
+    "khetbox_notification_failures_total", "Failed notification attempts", ["sink"]))
+SUPPRESSED = metrics.registry.register(metrics.Counter(
+    "khetbox_notification_alerts_suppressed_total", "Alerts not notified", ["reason"]))
+LATENCY = metrics.registry.register(metrics.Histogram(
+    "khetbox_notification_latency_seconds", "Time from alert submission to delivery", ["kind"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 900.0, 3600.0)))
+
+
+class Recipient(NamedTuple):
+    id: str
+    sink: str  # name of the sink that delivers to this recipient
+    address: str  # phone number, email address or webhook URL
+    digest_seconds: float = NOTIFY_DIGEST_MIN * 60
+    min_severity: str = "warning"
+    devices: Optional[Tuple[str, ...]] = None  # None = every device
+
+    def wants(self, device_id: str, severity: str) -> bool:
+        if self.devices is not None and device_id not in self.devices:
+            return False
+        return SEVERITY_RANK.get(severity, 0) >= SEVERITY_RANK[self.min_severity]
+
+
+# Sinks
+
+class WebhookSink:
+    """POSTs the message as JSON to the recipient's URL."""
+
+    name = "webhook"
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+
+    def _post(self, url: str, body: bytes) -> None:
+        import urllib.request
+
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def send(self, recipient: Recipient, message: dict) -> None:
+        await asyncio.to_thread(self._post, recipient.address, dumps(message))
+
+
+class SmsGatewaySink(WebhookSink):
+    """Sends the message text through an HTTP SMS gateway."""
+
+    name = "sms"
+
+    def __init__(self, gateway_url: str, timeout: float = 10.0):
+        super().__init__(timeout)
+        self.gateway_url = gateway_url
+
+    async def send(self, recipient: Recipient, message: dict) -> None:
+        body = dumps({"to": recipient.address, "message": message["body"]})
+        await asyncio.to_thread(self._post, self.gateway_url, body)
+
+
+class EmailSink:
+    """Plain-text email over SMTP."""
+
+    name = "email"
+
+    def __init__(self, host: str, port: int = 587, sender: str = "alerts@khetbox.local",
+                 username: Optional[str] = None, password: Optional[str] = None, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def _send(self, to: str, subject: str, body: str) -> None:
+        import smtplib
+        from email.message import EmailMessage
+
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = to
+        email["Subject"] = subject
+        email.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.username:
+                smtp.starttls()
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, recipient: Recipient, message: dict) -> None:
+        await asyncio.to_thread(self._send, recipient.address, message["subject"], message["body"])
+
+
+class FakeSink:
+    """Records messages instead of sending them; can be told to fail."""
+
+    def __init__(self, name: str = "fake", latency: float = 0.0, fail_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_next = 0
+        self.sent: List[Tuple[Recipient, dict]] = []
+        self._random = random.Random(seed)
+
+    async def send(self, recipient: Recipient, message: dict) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise ConnectionError("fake sink failure")
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            raise ConnectionError("fake sink failure")
+        self.sent.append((recipient, message))
+
+
+# Messages
+
+def format_message(recipient: Recipient, alerts: List[Tuple[str, dict]], kind: str) -> dict:
+    """A notification for ``alerts``, given as (device_id, alert) pairs."""
+    if len(alerts) == 1:
+        device_id, alert = alerts[0]
+        subject = f"[KhetBox {device_id}] {alert['severity'].upper()}: {alert['message']}"
+        body = alert["message"]
+    else:
+        devices = sorted({device_id for device_id, _ in alerts})
+        critical = sum(1 for _, a in alerts if a["severity"] == "critical")
+        subject = f"[KhetBox] {len(alerts)} alerts from {len(devices)} device{'s' if len(devices) > 1 else ''}"
+        if critical:
+            subject += f" ({critical} critical)"
+        body = "\n".join(
+            f"{device_id} {_time(a['timestamp'])} {a['severity'].upper()}: {a['message']}" for device_id, a in alerts
+        )
+    return {
+        "id": str(uuid.uuid4()),
+        "recipient": recipient.id,
+        "kind": kind,
+        "subject": subject,
+        "body": body,
+        "alerts": [
+            {"device_id": device_id, **{k: a.get(k) for k in ("id", "type", "severity", "message", "timestamp")}}
+            for device_id, a in alerts
+        ],
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def _time(timestamp) -> str:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return timestamp.strftime("%H:%M")
+
+
+# Retry queue
+
+class RetryQueue:
+    """Failed notifications waiting for another attempt.
+
+    Entries are stored in MongoDB when ``get_db`` is given, so they survive a
+    restart. Entries that can't be stored yet (or with no database at all)
+    are kept in memory.
+    """
+
+    def __init__(self, get_db: Optional[Callable] = None, breaker=None):
+        self.get_db = get_db
+        self.breaker = breaker
+        self.memory: Dict[str, dict] = {}
+
+    def _guard(self):
+        return self.breaker if self.breaker is not None else nullcontext()
+
+    async def _save(self) -> None:
+        if self.get_db is None or not self.memory:
+            return
+        try:
+            async with self._guard():
+                collection = self.get_db().notification_retries
+                for entry_id in list(self.memory):
+                    await collection.update_one({"id": entry_id}, {"$set": self.memory[entry_id]}, upsert=True)
+                    del self.memory[entry_id]
+        except Exception as e:
+            logger.warning(f"Could not store {len(self.memory)} notification retries, holding them in memory: {e}")
+
+    async def put(self, entry: dict) -> None:
+        self.memory[entry["id"]] = entry
+        await self._save()
+
+    async def due(self, now: datetime, limit: int = 100) -> List[dict]:
+        await self._save()
+        due = [e for e in self.memory.values() if not e["dead"] and e["next_attempt"] <= now]
+        if self.get_db is not None and len(due) < limit:
+            try:
+                async with self._guard():
+                    due += await self.get_db().notification_retries.find(
+                        {"dead": False, "next_attempt": {"$lte": now}}, {"_id": 0}
+                    ).sort("next_attempt", 1).limit(limit - len(due)).to_list(length=limit)
+            except Exception as e:
+                logger.warning(f"Could not read notification retries: {e}")
+        return due[:limit]
+
+    async def remove(self, entry_id: str) -> None:
+        if self.memory.pop(entry_id, None) is not None or self.get_db is None:
+            return
+        try:
+            async with self._guard():
+                await self.get_db().notification_retries.delete_one({"id": entry_id})
+        except Exception as e:
+            logger.warning(f"Could not remove notification retry {entry_id}: {e}")
+
+
+# Dispatcher
+
+class NotificationDispatcher:
+    def __init__(self, recipients: Iterable[Recipient], sinks: Iterable, retries: Optional[RetryQueue] = None,
+                 dedup_seconds: float = NOTIFY_DEDUP_MIN * 60, max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+                 base_backoff: float = 30.0, max_backoff: float = 3600.0, jitter: float = 0.1,
+                 concurrency: int = 16, tick: float = 1.0, queue_size: int = 100_000):
+        self.recipients = list(recipients)
+        self.by_id = {r.id: r for r in self.recipients}
+        self.sinks = {s.name: s for s in sinks}
+        self.retries = retries or RetryQueue()
+        self.dedup_seconds = dedup_seconds
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.tick = tick
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.last_sent: Dict[Tuple[str, str, str], float] = {}  # (recipient, device, alert type) -> time
+        # recipient id -> (deadline, [(device_id, alert, submitted_at)])
+        self.digests: Dict[str, Tuple[float, List[Tuple[str, dict, float]]]] = {}
+        self.in_flight: set = set()  # retry ids being attempted
+        self.tasks: set = set()
+        for recipient in self.recipients:
+            if recipient.sink not in self.sinks:
+                logger.warning(f"No {recipient.sink!r} sink configured for notification recipient {recipient.id}")
+
+    def submit(self, device_id: str, alerts: List[dict]) -> None:
+        """Queue alerts for notification; never blocks."""
+        if not self.recipients:
+            return
+        now = time.monotonic()
+        for alert in alerts:
+            if alert.get("severity") not in SEVERITY_RANK:
+                continue
+            try:
+                self.queue.put_nowait((device_id, alert, now))
+            except asyncio.QueueFull:
+                SUPPRESSED.labels("queue_full").inc()
+
+    async def run(self) -> None:
+        await asyncio.gather(self._consume(), self._timer())
+
+    async def _consume(self) -> None:
+        while True:
+            self._route(*await self.queue.get())
+            # Drain whatever else is queued without going back to the event loop
+            while not self.queue.empty():
+                self._route(*self.queue.get_nowait())
+
+    async def _timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush(time.monotonic())
+            except Exception as e:
+                logger.warning(f"Notification flush failed: {e}")
+
+    def _route(self, device_id: str, alert: dict, submitted: float) -> None:
+        for recipient in self.recipients:
+            if not recipient.wants(device_id, alert["severity"]):
+                continue
+            key = (recipient.id, device_id, alert["type"])
+            last = self.last_sent.get(key)
+            if last is not None and submitted - last < self.dedup_seconds:
+                SUPPRESSED.labels("duplicate").inc()
+                continue
+            self.last_sent[key] = submitted
+            if alert["severity"] == "critical" or recipient.digest_seconds <= 0:
+                message = format_message(recipient, [(device_id, alert)], "immediate")
+                self._spawn(self._deliver(recipient, message, [submitted]))
+            else:
+                deadline, items = self.digests.get(recipient.id, (submitted + recipient.digest_seconds, []))
+                items.append((device_id, alert, submitted))
+                self.digests[recipient.id] = (deadline, items)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush(self, now: float, force: bool = False) -> None:
+        """Send digests whose window has closed (all of them if ``force``) and retry due failures."""
+        for recipient_id, (deadline, items) in list(self.digests.items()):
+            if force or deadline <= now:
+                del self.digests[recipient_id]
+                recipient = self.by_id[recipient_id]
+                message = format_message(recipient, [(d, a) for d, a, _ in items], "digest")
+                self._spawn(self._deliver(recipient, message, [s for _, _, s in items]))
+
+        for entry in await self.retries.due(datetime.now(timezone.utc)):
+            if entry["id"] not in self.in_flight:
+                self.in_flight.add(entry["id"])
+                self._spawn(self._retry(entry))
+
+        if len(self.last_sent) > 10_000:
+            self.last_sent = {k: t for k, t in self.last_sent.items() if now - t < self.dedup_seconds}
+
+    async def drain(self) -> None:
+        """Wait until everything queued has been routed and all sends have finished."""
+        while not self.queue.empty() or self.tasks:
+            await asyncio.sleep(0)
+            if self.tasks:
+                await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    async def _send(self, recipient: Recipient, message: dict) -> Optional[str]:
+        """Send through the recipient's sink; returns the error, or None on success."""
+        sink = self.sinks.get(recipient.sink)
+        if sink is None:
+            return f"no {recipient.sink!r} sink"
+        async with self.semaphore:
+            try:
+                await sink.send(recipient, message)
+                return None
+            except Exception as e:
+                FAILED.labels(recipient.sink).inc()
+                return str(e) or type(e).__name__
+
+    async def _deliver(self, recipient: Recipient, message: dict, submitted: List[float]) -> None:
+        error = await self._send(recipient, message)
+        if error is None:
+            SENT.labels(recipient.sink, message["kind"]).inc()
+            done = time.monotonic()
+            latency = LATENCY.labels(message["kind"])
+            for t in submitted:
+                latency.observe(done - t)
+            return
+        logger.info(f"Notification {message['id']} to {recipient.id} failed, will retry: {error}")
+        await self.retries.put(self._retry_entry(recipient, message, 1, error))
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _retry_entry(self, recipient: Recipient, message: dict, attempts: int, error: str) -> dict:
+        return {
+            "id": message["id"],
+            "recipient": recipient.id,
+            "message": message,
+            "attempts": attempts,
+            "last_error": error,
+            "dead": attempts >= self.max_attempts,
+            "next_attempt": datetime.now(timezone.utc) + timedelta(seconds=self.backoff(attempts)),
+        }
+
+    async def _retry(self, entry: dict) -> None:
+        try:
+            recipient = self.by_id.get(entry["recipient"])
+            if recipient is None:
+                # Recipient removed from the configuration since
+                await self.retries.remove(entry["id"])
+                return
+            error = await self._send(recipient, entry["message"])
+            if error is None:
+                SENT.labels(recipient.sink, "retry").inc()
+                await self.retries.remove(entry["id"])
+                return
+            retry = self._retry_entry(recipient, entry["message"], entry["attempts"] + 1, error)
+            if retry["dead"]:
+                logger.warning(f"Giving up on notification {entry['id']} to {recipient.id} "
+                               f"after {retry['attempts']} attempts: {error}")
+            await self.retries.put(retry)
+        finally:
+            self.in_flight.discard(entry["id"])
+
+
+# Configuration
+
+def load_recipients(raw: Optional[str] = None) -> List[Recipient]:
+    """Recipients from NOTIFY_RECIPIENTS, a JSON list of objects with Recipient's fields."""
+    raw = raw if raw is not None else os.environ.get('NOTIFY_RECIPIENTS', '')
+    if not raw.strip():
+        return []
+    recipients = []
+    for item in json.loads(raw):
+        if "digest_minutes" in item:
+            item["digest_seconds"] = float(item.pop("digest_minutes")) * 60
+        if item.get("devices") is not None:
+            item["devices"] = tuple(item["devices"])
+        recipients.append(Recipient(**item))
+    return recipients
+
+
+def build_sinks() -> list:
+    sinks = [WebhookSink()]
+    if os.environ.get('NOTIFY_SMS_GATEWAY_URL'):
+        sinks.append(SmsGatewaySink(os.environ['NOTIFY_SMS_GATEWAY_URL']))
+    if os.environ.get('NOTIFY_SMTP_HOST'):
+        sinks.append(EmailSink(
+            os.environ['NOTIFY_SMTP_HOST'],
+            port=int(os.environ.get('NOTIFY_SMTP_PORT', '587')),
+            sender=os.environ.get('NOTIFY_EMAIL_FROM', 'alerts@khetbox.local'),
+            username=os.environ.get('NOTIFY_SMTP_USER'),
+            password=os.environ.get('NOTIFY_SMTP_PASSWORD'),
+        ))
+    return sinks
+
+
+def create_dispatcher() -> NotificationDispatcher:
+    import database
+
+    try:
+        recipients = load_recipients()
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid NOTIFY_RECIPIENTS, notifications are off: {e}")
+        recipients = []
+    return NotificationDispatcher(
+        recipients, build_sinks(),
+        # Retries are kept in memory only when there's no MongoDB
+        RetryQueue(database.get_db if database.STORAGE_BACKEND == "mongo" else None, database.mongo_breaker))
+
+
+# Dispatcher fed by the ingestion path; started with the app if recipients are configured
+dispatcher = create_dispatcher()
@@ -0,0 +1,202 @@
+"""
+Opt-in instrumentation for finding code that stalls the event loop.
+
+* ``BlockingMonitor``: a watchdog thread that notices when the loop stops
+  answering a heartbeat and captures the loop thread's stack while it is
+  still blocked.
+* ``SamplingProfiler``: samples the loop thread's stack at a fixed rate and
+  aggregates it into collapsed stacks ("a;b;c 42"), the input format of
+  flamegraph.pl, speedscope and similar tools.
+* ``CpuTimeMiddleware``: per-route CPU time, counted only while the
+  request's own coroutine is running, so interleaved requests aren't
+  charged for each other.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as Tally, deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_CPU = metrics.registry.register(metrics.Histogram(
+    "khetbox_http_request_cpu_seconds", "Event-loop CPU time spent serving a request", ["route", "method"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)))
+LOOP_BLOCKS = metrics.registry.register(metrics.Counter(
+    "khetbox_event_loop_blocks_total", "Times the event loop was blocked longer than the threshold"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})"
+
+
+def collapse_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class BlockingMonitor:
+    """Reports callbacks that hold the event loop longer than ``threshold`` seconds."""
+
+    def __init__(self, threshold: float = 0.1, max_events: int = 50):
+        self.threshold = threshold
+        self.events = deque(maxlen=max_events)
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._heartbeat_task = None
+        self._thread = None
+
+    async def _heartbeat(self):
+        interval = self.threshold / 4
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(interval)
+
+    def _watch(self):
+        current = None
+        while not self._stop.wait(self.threshold / 4):
+            blocked_for = time.monotonic() - self._beat
+            if blocked_for < self.threshold:
+                if current is not None:
+                    logger.warning(f"Event loop blocked for {current['blocked_ms']:.0f} ms in:\n{current['stack']}")
+                    current = None
+                continue
+            if current is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                current = {
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "blocked_ms": blocked_for * 1000,
+                    "stack": "".join(traceback.format_stack(frame)) if frame else "",
+                }
+                self.events.append(current)
+                LOOP_BLOCKS.inc()
+            else:
+                current["blocked_ms"] = blocked_for * 1000
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-block-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+
+class SamplingProfiler:
+    """Samples the event-loop thread's stack from a background thread."""
+
+    def __init__(self):
+        self.samples = Tally()
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.interval = 0.005
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.005, duration: float = 30.0) -> None:
+        """Start sampling the calling (event-loop) thread; stops by itself after ``duration``."""
+        if self.running:
+            return
+        self.samples = Tally()
+        self.sample_count = 0
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        deadline = self.started_at + duration
+        self._thread = threading.Thread(target=self._sample, args=(deadline,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _sample(self, deadline: float) -> None:
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.samples[collapse_stack(frame)] += 1
+            self.sample_count += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Aggregated samples in collapsed-stack format, heaviest first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.sample_count,
+            "elapsed_s": round(time.monotonic() - self.started_at, 1) if self.started_at else 0,
+        }
+
+
+class _CpuTimed:
+    """Awaitable wrapper that sums thread CPU time over each step of ``coro``."""
+
+    __slots__ = ("coro", "cpu")
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.cpu = 0.0
+
+    def __await__(self):
+        it = self.coro.__await__()
+        send_value, throw_exc = None, None
+        while True:
+            started = time.thread_time()
+            try:
+                if throw_exc is not None:
+                    yielded = it.throw(throw_exc)
+                else:
+                    yielded = it.send(send_value)
+            except StopIteration as stop:
+                self.cpu += time.thread_time() - started
+                return stop.value
+            except BaseException:
+                self.cpu += time.thread_time() - started
+                raise
+            self.cpu += time.thread_time() - started
+            try:
+                send_value, throw_exc = (yield yielded), None
+            except BaseException as exc:
+                send_value, throw_exc = None, exc
+
+
+class CpuTimeMiddleware:
+    """ASGI middleware recording per-route CPU time into ``REQUEST_CPU``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timed = _CpuTimed(self.app(scope, receive, send))
+        try:
+            await timed
+        finally:
+            route = scope.get("route")
+            REQUEST_CPU.labels(route.path if route is not None else "<unmatched>", scope["method"]).observe(timed.cpu)
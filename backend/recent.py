@@ -0,0 +1,206 @@
+"""
+Recent readings per device, kept in memory.
+
+Each device has a fixed-size ring buffer covering the last RECENT_HOURS
+hours at one slot per RECENT_RESOLUTION_SEC seconds: a uint32 array of
+timestamps (epoch seconds) and a float32 array with one column per metric.
+A reading goes to the slot of its time step, so appending is O(1) with no
+head pointer, a newer reading in the same step replaces the older one, and
+stale slots are simply the ones whose timestamp falls outside the window
+being asked for.
+
+At the defaults (24 h at one slot a minute) a device takes 1440 slots of
+16 bytes, about 23 KB, allocated up front; 10k devices need about 230 MB
+and the buffers never grow. Window statistics are vectorized over the
+slots, so /api/status/recent, the report fallback and the sustained-
+condition alerts never go to MongoDB or the simulator for recent data.
+"""
+import logging
+import os
+import uuid
+import warnings
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("temperature", "humidity", "battery")
+PERCENTILES = (5, 50, 95)
+
+RECENT_HOURS = float(os.environ.get('RECENT_HOURS', '24'))
+RECENT_RESOLUTION = int(os.environ.get('RECENT_RESOLUTION_SEC', '60'))
+# How long a condition must hold before a sustained alert is raised
+SUSTAINED_MINUTES = float(os.environ.get('SUSTAINED_ALERT_MIN', '15'))
+
+
+def _seconds(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+class RecentWindow:
+    """Ring buffer of one device's readings."""
+
+    __slots__ = ("resolution", "capacity", "metric_names", "timestamps", "values")
+
+    def __init__(self, hours: float = RECENT_HOURS, resolution: int = RECENT_RESOLUTION,
+                 metric_names: Sequence[str] = METRICS):
+        self.resolution = resolution
+        self.capacity = max(int(hours * 3600 // resolution), 1)
+        self.metric_names = tuple(metric_names)
+        # 0 marks an empty slot
+        self.timestamps = np.zeros(self.capacity, dtype=np.uint32)
+        self.values = np.full((self.capacity, len(self.metric_names)), np.nan, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def append(self, ts: datetime, reading: dict) -> None:
+        seconds = _seconds(ts)
+        slot = (seconds // self.resolution) % self.capacity
+        if seconds < self.timestamps[slot]:
+            return  # late reading; the slot already holds a newer one
+        self.timestamps[slot] = seconds
+        for j, metric in enumerate(self.metric_names):
+            value = reading.get(metric)
+            self.values[slot, j] = np.nan if value is None else value
+
+    def window(self, since: datetime, until: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps and values of the readings in [since, until), oldest first."""
+        mask = self.timestamps >= _seconds(since)
+        if until is not None:
+            mask &= self.timestamps < _seconds(until)
+        idx = np.flatnonzero(mask)
+        idx = idx[np.argsort(self.timestamps[idx], kind="stable")]
+        return self.timestamps[idx], self.values[idx]
+
+    def stats(self, since: datetime, until: Optional[datetime] = None,
+              percentiles: Sequence[float] = PERCENTILES) -> Optional[dict]:
+        """Count, mean, min, max and percentiles of each metric; None if the window is empty."""
+        timestamps, values = self.window(since, until)
+        if not len(timestamps):
+            return None
+        values = values.astype(np.float64)
+        present = ~np.isnan(values)
+        counts = present.sum(axis=0)
+        result = {"count": len(timestamps), "metrics": {}}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+            means = np.nanmean(values, axis=0)
+            lows = np.nanmin(values, axis=0)
+            highs = np.nanmax(values, axis=0)
+            points = np.nanpercentile(values, percentiles, axis=0)
+        for j, metric in enumerate(self.metric_names):
+            if not counts[j]:
+                result["metrics"][metric] = None
+                continue
+            result["metrics"][metric] = {
+                "count": int(counts[j]),
+                "mean": round(float(means[j]), 2),
+                "min": round(float(lows[j]), 2),
+                "max": round(float(highs[j]), 2),
+                **{f"p{p:g}": round(float(points[i, j]), 2) for i, p in enumerate(percentiles)},
+            }
+        return result
+
+    def hourly(self, start: datetime, end: datetime, tz=timezone.utc) -> List[dict]:
+        """Hourly means from ``start`` (an hour boundary), in the shape of a report's ``hourly_data``."""
+        timestamps, values = self.window(start, end)
+        if not len(timestamps):
+            return []
+        base = _seconds(start)
+        bins = (timestamps.astype(np.int64) - base) // 3600
+        n = int(bins[-1]) + 1
+        present = ~np.isnan(values)
+        counts = np.stack([np.bincount(bins, weights=present[:, j], minlength=n)
+                           for j in range(values.shape[1])], axis=1)
+        sums = np.stack([np.bincount(bins, weights=np.where(present[:, j], values[:, j], 0.0), minlength=n)
+                         for j in range(values.shape[1])], axis=1)
+        points = []
+        for h in np.flatnonzero(counts.sum(axis=1)):
+            hour = datetime.fromtimestamp(base + int(h) * 3600, tz)
+            point = {"hour": hour.strftime("%H:00"), "timestamp": hour.isoformat()}
+            for j, metric in enumerate(self.metric_names):
+                mean = sums[h, j] / counts[h, j] if counts[h, j] else None
+                point[metric] = None if mean is None else round(float(mean), 1 if metric == "temperature" else 0)
+            points.append(point)
+        return points
+
+
+class RecentReadings:
+    """A RecentWindow per device, created on the device's first reading."""
+
+    def __init__(self, hours: float = RECENT_HOURS, resolution: int = RECENT_RESOLUTION):
+        self.hours = hours
+        self.resolution = resolution
+        self.windows: Dict[str, RecentWindow] = {}
+
+    def append(self, device_id: str, ts: datetime, reading: dict) -> RecentWindow:
+        window = self.windows.get(device_id)
+        if window is None:
+            window = self.windows[device_id] = RecentWindow(self.hours, self.resolution)
+        window.append(ts, reading)
+        return window
+
+    def get(self, device_id: str) -> Optional[RecentWindow]:
+        return self.windows.get(device_id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(w.nbytes for w in self.windows.values())
+
+
+def sustained_alerts(window: RecentWindow, now: datetime, minutes: float = SUSTAINED_MINUTES) -> List[dict]:
+    """Alerts for conditions that have held over the last ``minutes``.
+
+    Uses the same limits as ``generate_alerts``, but on the window's 10th
+    percentile (90th for battery), so a brief dip back into range doesn't
+    hide a container that has been too warm for the whole period.
+    """
+    stats = window.stats(now - timedelta(minutes=minutes), percentiles=(10, 90))
+    # Needs most of the period covered, or a restart would look like a sustained reading
+    if stats is None or stats["count"] * window.resolution < 0.8 * minutes * 60:
+        return []
+    alerts = []
+    temperature, battery = stats["metrics"].get("temperature"), stats["metrics"].get("battery")
+    if temperature and temperature["p10"] > 6:
+        alerts.append({
+            "type": "sustained:temperature",
+            "severity": "critical" if temperature["p10"] > 8 else "warning",
+            "message": f"Temperature Sustained: above {temperature['p10']:g}°C for {minutes:g} minutes "
+                       f"(average {temperature['mean']:g}°C)",
+        })
+    if battery and battery["p90"] < 25:
+        alerts.append({
+            "type": "sustained:battery",
+            "severity": "critical",
+            "message": f"Battery Not Charging: below {battery['p90']:g}% for {minutes:g} minutes",
+        })
+    return [{**a, "id": str(uuid.uuid4()), "timestamp": now.isoformat(), "acknowledged": False} for a in alerts]
+
+
+async def load_history(repository, recent: RecentReadings, device_id: str) -> int:
+    """Fill a device's window from the readings stored in the last ``recent.hours``.
+
+    ``repository`` is the store's readings repository (see repositories.py).
+    Returns the number of readings loaded.
+    """
+    since = datetime.now(timezone.utc) - timedelta(hours=recent.hours)
+    readings = await repository.history(device_id, since, METRICS)
+    for reading in readings:
+        recent.append(device_id, reading["timestamp"], reading)
+    return len(readings)
+
+
+# Windows shared by the ingestion path, /api/status/recent, reports and alerts
+recent = RecentReadings()
+
+metrics.registry.register(metrics.Gauge(
+    "khetbox_recent_window_bytes", "Memory held by the in-memory recent-readings windows",
+    fn=lambda: recent.nbytes))
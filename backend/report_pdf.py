@@ -0,0 +1,116 @@
+"""
+PDF rendering of a daily report with ReportLab.
+
+Kept out of the reports router so ReportLab is imported only when a PDF
+is actually exported.
+"""
+from datetime import datetime, timezone
+from io import BytesIO
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib import colors
+
+
+def build_report_pdf(report: dict) -> bytes:
+    # Create PDF in memory
+    pdf_buffer = BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#059669'),
+        spaceAfter=12
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#059669'),
+        spaceAfter=10
+    )
+
+    # Title
+    elements.append(Paragraph("KhetBox Daily Report", title_style))
+    elements.append(Paragraph(f"Date: {report['date']}", styles['Normal']))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Summary section
+    elements.append(Paragraph("Daily Summary", heading_style))
+    summary = report.get('summary', {})
+    summary_data = [
+        ['Metric', 'Value'],
+        ['Average Temperature', f"{summary.get('avg_temperature', 0)}°C"],
+        ['Min Temperature', f"{summary.get('min_temperature', 0)}°C"],
+        ['Max Temperature', f"{summary.get('max_temperature', 0)}°C"],
+        ['Average Humidity', f"{summary.get('avg_humidity', 0)}%"],
+        ['Average Battery', f"{summary.get('avg_battery', 0)}%"],
+        ['Total Alerts', str(summary.get('alerts_count', 0))],
+        ['Uptime', f"{summary.get('uptime_percentage', 0)}%"],
+        ['Door Open', f"{round(summary.get('door_open_seconds', 0) / 60)} min ({summary.get('door_open_events', 0)} times)"],
+        ['On Battery', f"{summary.get('on_battery_seconds', 0) / 3600:.1f} h"],
+        ['Battery Critical', f"{round(summary.get('battery_critical_seconds', 0) / 60)} min"],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[3 * inch, 2 * inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#059669')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
+    ]))
+
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Hourly data section
+    elements.append(Paragraph("Hourly Data", heading_style))
+    hourly = report.get('hourly_data', [])
+
+    if hourly:
+        hourly_data = [['Hour', 'Temperature (°C)', 'Humidity (%)', 'Battery (%)']]
+        for h in hourly[:24]:  # Limit to 24 hours
+            hourly_data.append([
+                h.get('hour', ''),
+                str(h.get('temperature', 0)),
+                str(h.get('humidity', 0)),
+                str(h.get('battery', 0))
+            ])
+
+        hourly_table = Table(hourly_data, colWidths=[1.2 * inch, 1.5 * inch, 1.5 * inch, 1.3 * inch])
+        hourly_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#059669')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
+        ]))
+
+        elements.append(hourly_table)
+
+    # Footer
+    elements.append(Spacer(1, 0.2 * inch))
+    elements.append(Paragraph(
+        f"Report Generated: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}",
+        styles['Italic']
+    ))
+
+    # Build PDF
+    doc.build(elements)
+    pdf_buffer.seek(0)
+    return pdf_buffer.getvalue()
@@ -0,0 +1,147 @@
+"""
+Background materialization of the daily reports.
+
+Every REPORT_REFRESH_MIN minutes the scheduler goes through the fleet, at
+most REPORT_CONCURRENCY devices at a time. For each device it refreshes
+the hourly rollups since its last pass and rebuilds that day's report
+from them. Passes are incremental: only the current hour (and any hours
+since the previous pass) are re-aggregated from readings.
+
+Days are local to each device's timezone (see timezones.py). When a pass
+crosses local midnight the previous day is rebuilt one last time and
+marked ``final``. Reports are upserted on the unique (date, device_id)
+key, so overlapping passes or instances can't create duplicates. The API
+only reads them.
+"""
+import asyncio
+import logging
+import math
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import rollups
+import timezones
+
+logger = logging.getLogger(__name__)
+
+REPORT_REFRESH_INTERVAL = float(os.environ.get('REPORT_REFRESH_MIN', '5')) * 60
+REPORT_CONCURRENCY = int(os.environ.get('REPORT_CONCURRENCY', '8'))
+
+
+async def build_report(db, device_id: str, day: date, now: datetime, tz_name: str) -> Optional[dict]:
+    """The report for the local ``day`` in ``tz_name``, regrouped from the UTC
+    hourly rollups; None if there were no readings."""
+    start, end = timezones.day_bounds(day, tz_name)
+    stored = await rollups.load(db, device_id, rollups.hour_start(start), end)
+    if not rollups.local_hours(stored, tz_name, start, end):
+        return None
+    alerts_count = await db.alerts.count_documents(
+        {"device_id": device_id, "timestamp": {"$gte": start, "$lt": end}})
+    return report_from_rollups(device_id, day, now, tz_name, stored, alerts_count)
+
+
+def report_from_rollups(device_id: str, day: date, now: datetime, tz_name: str,
+                        stored: List[dict], alerts_count: int) -> Optional[dict]:
+    """Report document from the UTC hourly rollups covering the local ``day``
+    (see rollups.py for their shape); None if there were no readings."""
+    start, end = timezones.day_bounds(day, tz_name)
+    hours = rollups.local_hours(stored, tz_name, start, end)
+    combined = rollups.combine(hours)
+    if combined is None:
+        return None
+    # Share of the day's elapsed hours that have readings
+    elapsed_hours = math.ceil((min(now, end) - start).total_seconds() / 3600)
+    hourly = rollups.hour_points(hours)
+    return {
+        "date": day.isoformat(),
+        "device_id": device_id,
+        "timezone": tz_name,
+        "summary": {
+            "avg_temperature": round(combined["temperature"]["mean"], 1),
+            "min_temperature": round(combined["temperature"]["min"], 1),
+            "max_temperature": round(combined["temperature"]["max"], 1),
+            "avg_humidity": round(combined["humidity"]["mean"], 0),
+            "avg_battery": round(combined["battery"]["mean"], 0),
+            "alerts_count": alerts_count,
+            "uptime_percentage": round(100 * len(hours) / max(elapsed_hours, 1), 1),
+        },
+        "hourly_data": hourly,
+        "charts": {
+            "temperature_trend": hourly,
+            "humidity_trend": hourly,
+        },
+        "final": now >= end,
+        "updated_at": now,
+    }
+
+
+async def materialize(db, device_id: str, day: date, now: datetime, tz_name: str) -> Optional[dict]:
+    report = await build_report(db, device_id, day, now, tz_name)
+    if report is not None:
+        await db.reports.update_one(
+            {"date": report["date"], "device_id": device_id},
+            {"$set": report, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+    return report
+
+
+class ReportScheduler:
+    def __init__(self, interval: float = REPORT_REFRESH_INTERVAL, concurrency: int = REPORT_CONCURRENCY):
+        self.interval = interval
+        self.concurrency = concurrency
+        # Device -> start of the hour its last pass reached; earlier hours are complete
+        self.watermarks: Dict[str, datetime] = {}
+
+    async def _start(self, db, device_id: str, now: datetime, tz_name: str) -> datetime:
+        """Where a device's first pass after startup begins."""
+        today = timezones.local_date(now, tz_name)
+        yesterday = today - timedelta(days=1)
+        closed = await db.reports.find_one(
+            {"date": yesterday.isoformat(), "device_id": device_id, "final": True}, {"_id": 0, "date": 1})
+        # Close yesterday too if that was missed while the app was down
+        return timezones.day_bounds(today if closed else yesterday, tz_name)[0]
+
+    async def refresh_device(self, db, device_id: str, now: Optional[datetime] = None) -> List[str]:
+        """Bring one device's rollups and reports up to ``now``; returns the dates written."""
+        now = now or datetime.now(timezone.utc)
+        tz_name = await timezones.device_timezone(db, device_id)
+        since = self.watermarks.get(device_id) or await self._start(db, device_id, now, tz_name)
+        await rollups.refresh_hourly(db, device_id, since, now)
+        written = []
+        day = timezones.local_date(since, tz_name)
+        while day <= timezones.local_date(now, tz_name):
+            if await materialize(db, device_id, day, now, tz_name) is not None:
+                written.append(day.isoformat())
+            day += timedelta(days=1)
+        self.watermarks[device_id] = rollups.hour_start(now)
+        return written
+
+    async def run_once(self, db, now: Optional[datetime] = None) -> int:
+        """One pass over the fleet; returns the number of devices refreshed."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        devices = await db.sensors.distinct("device_id")
+
+        async def refresh(device_id):
+            async with semaphore:
+                await self.refresh_device(db, device_id, now)
+
+        results = await asyncio.gather(*(refresh(d) for d in devices), return_exceptions=True)
+        for device_id, result in zip(devices, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Report refresh for {device_id} failed: {result}")
+        return sum(1 for r in results if not isinstance(r, Exception))
+
+    async def run(self, get_db, breaker) -> None:
+        while True:
+            try:
+                async with breaker:
+                    await self.run_once(get_db())
+            except Exception as e:
+                logger.warning(f"Report materialization pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Scheduler started with the app
+scheduler = ReportScheduler()
@@ -0,0 +1,221 @@
+"""
+Repositories over the collections the API serves, and their MongoDB
+implementation.
+
+A store has one repository per collection, with the operations the routers
+and the ingestion path need rather than a general query API:
+
+    store.sensors        upsert(device_id, fields), timezone(device_id),
+                         set_timezone(device_id, name)
+    store.readings       insert(reading), history(device_id, since, fields)
+    store.alerts         add(device_id, alerts), recent(device_id, limit),
+                         changed_since(device_id, version, limit), state(device_id),
+                         acknowledge(device_id, ids=, severity=, since=, until=, acknowledged_by=)
+    store.reports        daily(device_id, day), build(device_id, day, now, tz_name)
+    store.storage        units(device_id), capacity(device_id), ledger(device_id, limit),
+                         record_movement(device_id, unit, crop, quantity_kg, kind, icon=, note=)
+    store.events         record(device_id, transitions), history(device_id, since)
+    store.cctv_streams   streams(device_id), probe_targets(device_id),
+                         update_status(device_id, changes)
+    store.users          find(email), insert(user)
+
+plus ``ping()``, ``flush()`` and ``close()`` on the store itself. Documents
+come back without ``_id``. Ingestion writes (sensor upserts, readings, new
+alerts, event intervals) may be buffered, and differ in when reads see
+them. On MongoDB they go through write_or_spool: applied immediately while
+the database is up, but during an outage (and until the spool has been
+replayed) they sit in the local spool and reads don't see them. On the
+embedded store (sqlite_store.py) they are queued and committed in batches,
+and every read commits the queue first. All other writes are applied
+before they return.
+
+The MongoDB repositories take ``get_db`` rather than a database, so a
+client swapped in with set_client() is picked up.
+"""
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+import alert_state
+import events
+import inventory
+import timezones
+from database import get_client, write_or_spool
+from report_scheduler import build_report
+from serialization import NO_ID
+
+logger = logging.getLogger(__name__)
+
+
+class MongoSensors:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def upsert(self, device_id: str, fields: dict) -> None:
+        await write_or_spool(
+            "sensors", "update_one",
+            filter={"device_id": device_id}, update={"$set": fields}, upsert=True,
+        )
+
+    async def timezone(self, device_id: str) -> str:
+        return await timezones.device_timezone(self.get_db(), device_id)
+
+    async def set_timezone(self, device_id: str, name: str) -> None:
+        await timezones.set_device_timezone(self.get_db(), device_id, name)
+
+
+class MongoReadings:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def insert(self, reading: dict) -> None:
+        await write_or_spool("readings", "insert_one", document=reading)
+
+    async def history(self, device_id: str, since: datetime, fields: Iterable[str]) -> List[dict]:
+        """Readings at or after ``since``, oldest first, with their timestamp and ``fields``."""
+        return await self.get_db().readings.find(
+            {"device_id": device_id, "timestamp": {"$gte": since}},
+            {"_id": 0, "timestamp": 1, **{f: 1 for f in fields}},
+        ).sort("timestamp", 1).to_list(length=None)
+
+
+class MongoAlerts:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def add(self, device_id: str, alerts: List[dict]) -> dict:
+        """Store newly raised alerts, stamped with a version; returns the change to publish."""
+        state_update, change = alert_state.stamp_new_alerts(device_id, alerts)
+        await write_or_spool("alerts", "insert_many", documents=alerts)
+        await write_or_spool(
+            "alert_state", "update_one",
+            filter={"device_id": device_id}, update=state_update, upsert=True,
+        )
+        return change
+
+    async def recent(self, device_id: str, limit: int = 100) -> List[dict]:
+        return await self.get_db().alerts.find(
+            {"device_id": device_id}, NO_ID).sort("timestamp", -1).limit(limit).to_list(length=limit)
+
+    async def changed_since(self, device_id: str, version: int, limit: int = 500) -> List[dict]:
+        return await self.get_db().alerts.find(
+            {"device_id": device_id, "version": {"$gt": version}}, NO_ID
+        ).sort("version", 1).limit(limit).to_list(length=limit)
+
+    async def state(self, device_id: str) -> dict:
+        return await alert_state.get_state(self.get_db(), device_id)
+
+    async def acknowledge(self, device_id: str, **kwargs) -> dict:
+        return await alert_state.acknowledge(self.get_db(), device_id, **kwargs)
+
+
+class MongoReports:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def daily(self, device_id: str, day: date) -> Optional[dict]:
+        """The stored report for ``day`` (in the device's timezone), as last materialized."""
+        return await self.get_db().reports.find_one({"date": day.isoformat(), "device_id": device_id}, NO_ID)
+
+    async def build(self, device_id: str, day: date, now: datetime, tz_name: str) -> Optional[dict]:
+        """A report for the local ``day`` in any timezone, built from the stored aggregates."""
+        return await build_report(self.get_db(), device_id, day, now, tz_name)
+
+
+class MongoStorage:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def units(self, device_id: str) -> List[dict]:
+        return await self.get_db().storage.find({"device_id": device_id}, NO_ID).to_list(length=10)
+
+    async def capacity(self, device_id: str) -> dict:
+        """The /api/capacity view, from the materialized per-device counters."""
+        totals = await self.get_db().inventory_totals.find_one({"device_id": device_id}, NO_ID)
+        if totals is None:
+            totals = await inventory.rebuild_totals(self.get_db(), device_id)
+        return inventory.capacity_view(totals)
+
+    async def ledger(self, device_id: str, limit: int = 50) -> List[dict]:
+        return await self.get_db().inventory_ledger.find(
+            {"device_id": device_id}, NO_ID).sort("timestamp", -1).limit(limit).to_list(length=limit)
+
+    async def record_movement(self, device_id: str, unit: str, crop: str, quantity_kg: float, kind: str,
+                              icon: Optional[str] = None, note: Optional[str] = None) -> dict:
+        return await inventory.record_movement(
+            self.get_db(), device_id, unit, crop, quantity_kg, kind, icon=icon, note=note)
+
+
+class MongoEvents:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def record(self, device_id: str, transitions: List[dict]) -> None:
+        for op, kwargs in events.event_writes(device_id, transitions):
+            await write_or_spool("events", op, **kwargs)
+
+    async def history(self, device_id: str, since: datetime) -> List[dict]:
+        """Intervals starting at or after ``since``, oldest first."""
+        return await self.get_db().events.find(
+            {"device_id": device_id, "start": {"$gte": since}},
+            {"_id": 0, "kind": 1, "start": 1, "end": 1},
+        ).sort("start", 1).to_list(length=None)
+
+
+class MongoCctvStreams:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def streams(self, device_id: str) -> List[dict]:
+        return await self.get_db().cctv_streams.find(
+            {"device_id": device_id}, {"_id": 0, "created_at": 0}).to_list(length=10)
+
+    async def probe_targets(self, device_id: str) -> List[dict]:
+        return await self.get_db().cctv_streams.find(
+            {"device_id": device_id}, {"_id": 0, "id": 1, "url": 1, "snapshot_url": 1, "status": 1}
+        ).to_list(length=None)
+
+    async def update_status(self, device_id: str, changes: Dict[str, dict]) -> None:
+        """Apply each stream's field changes (stream id -> fields) in one bulk write."""
+        ops = [UpdateOne({"device_id": device_id, "id": stream_id}, {"$set": fields})
+               for stream_id, fields in changes.items()]
+        await self.get_db().cctv_streams.bulk_write(ops, ordered=False)
+
+
+class MongoUsers:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+
+    async def find(self, email: str) -> Optional[dict]:
+        return await self.get_db().users.find_one({"email": email}, NO_ID)
+
+    async def insert(self, user: dict) -> None:
+        await self.get_db().users.insert_one(dict(user))
+
+
+class MongoStore:
+    """The repositories on MongoDB."""
+
+    name = "mongo"
+
+    def __init__(self, get_db: Callable):
+        self.sensors = MongoSensors(get_db)
+        self.readings = MongoReadings(get_db)
+        self.alerts = MongoAlerts(get_db)
+        self.reports = MongoReports(get_db)
+        self.storage = MongoStorage(get_db)
+        self.events = MongoEvents(get_db)
+        self.cctv_streams = MongoCctvStreams(get_db)
+        self.users = MongoUsers(get_db)
+
+    async def ping(self) -> None:
+        await get_client().admin.command('ping')
+
+    async def flush(self) -> int:
+        # Writes are applied (or spooled) as they're made
+        return 0
+
+    async def close(self) -> None:
+        pass
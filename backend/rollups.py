@@ -0,0 +1,162 @@
+"""
+Hourly rollups of sensor readings.
+
+One ``hourly_rollups`` document per device and UTC hour holds the reading
+count plus the sum, min and max of each metric. Reports are built from
+these rather than from raw readings. A rollup is always recomputed for the
+whole hour and written with ``$set``, so refreshing the same hour twice
+(e.g. after a restart) can't double count.
+
+Each rollup also keeps the same aggregates for its four quarter hours.
+Every timezone in use is a whole number of quarter hours from UTC (India is
++5:30, Nepal +5:45), so ``local_hours`` can regroup the UTC rollups into
+any timezone's local hours and days at query time, without going back to
+the readings.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+import timezones
+
+METRICS = ("temperature", "humidity", "battery")
+QUARTER = timedelta(minutes=15)
+
+
+def utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def hour_start(ts: datetime) -> datetime:
+    return utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+async def refresh_hourly(db, device_id: str, since: datetime, until: datetime) -> int:
+    """Recompute the rollups of every hour from the one containing ``since`` up to ``until``.
+
+    Returns the number of hours written.
+    """
+    start = hour_start(since)
+    # Date-part grouping rather than $dateTrunc, which older servers lack
+    group = {
+        "_id": {
+            "y": {"$year": "$timestamp"}, "m": {"$month": "$timestamp"},
+            "d": {"$dayOfMonth": "$timestamp"}, "h": {"$hour": "$timestamp"},
+            "q": {"$floor": {"$divide": [{"$minute": "$timestamp"}, 15]}},
+        },
+        "count": {"$sum": 1},
+    }
+    for metric in METRICS:
+        group[f"{metric}_sum"] = {"$sum": f"${metric}"}
+        group[f"{metric}_min"] = {"$min": f"${metric}"}
+        group[f"{metric}_max"] = {"$max": f"${metric}"}
+    rows = await db.readings.aggregate([
+        {"$match": {"device_id": device_id, "timestamp": {"$gte": start, "$lt": utc(until)}}},
+        {"$group": group},
+    ]).to_list(length=None)
+
+    quarters: Dict[datetime, List[dict]] = {}
+    for row in rows:
+        key = row["_id"]
+        hour = datetime(key["y"], key["m"], key["d"], key["h"], tzinfo=timezone.utc)
+        part = {"count": row["count"]}
+        for metric in METRICS:
+            part[metric] = {k: row[f"{metric}_{k}"] for k in ("sum", "min", "max")}
+        quarters.setdefault(hour, [{"count": 0} for _ in range(4)])[int(key["q"])] = part
+
+    now = datetime.now(timezone.utc)
+    ops = []
+    for rollup in from_quarters(quarters):
+        doc = {**rollup, "updated_at": now}
+        ops.append(UpdateOne({"device_id": device_id, "hour": doc.pop("hour")}, {"$set": doc}, upsert=True))
+    if ops:
+        await db.hourly_rollups.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+async def load(db, device_id: str, start: datetime, end: datetime) -> List[dict]:
+    """The rollups of the hours in [start, end), oldest first."""
+    return await db.hourly_rollups.find(
+        {"device_id": device_id, "hour": {"$gte": utc(start), "$lt": utc(end)}}, {"_id": 0}
+    ).sort("hour", 1).to_list(length=None)
+
+
+def _merge(parts: List[dict]) -> dict:
+    """Count plus sum/min/max of each metric across aggregates."""
+    parts = [p for p in parts if p["count"]]
+    merged = {"count": sum(p["count"] for p in parts)}
+    for metric in METRICS:
+        merged[metric] = {
+            "sum": sum(p[metric]["sum"] for p in parts),
+            "min": min(p[metric]["min"] for p in parts),
+            "max": max(p[metric]["max"] for p in parts),
+        } if parts else {"sum": 0, "min": None, "max": None}
+    return merged
+
+
+def from_quarters(quarters: Dict[datetime, List[dict]]) -> List[dict]:
+    """Rollups, oldest first, from the four quarter-hour aggregates of each UTC hour."""
+    return [{"hour": hour, **_merge(parts), "quarters": parts} for hour, parts in sorted(quarters.items())]
+
+
+def local_hours(rollups: List[dict], tz_name: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> List[dict]:
+    """Regroup UTC rollups into local hours of ``tz_name``, keeping only data in [start, end).
+
+    Returns aggregates like the rollups, with ``hour`` the local start of the
+    hour. Hours whose offset is a whole number of hours map over directly;
+    otherwise each quarter goes to the local hour it falls in.
+    """
+    tz = timezones.zone(tz_name)
+    pieces: Dict[datetime, List[dict]] = {}
+    for r in rollups:
+        hour = utc(r["hour"])
+        offset = hour.astimezone(tz).utcoffset().total_seconds()
+        if offset % 3600 == 0 or "quarters" not in r:
+            # Rollups written before quarters were kept can only move as a whole
+            parts = [(hour, r)]
+        else:
+            parts = [(hour + i * QUARTER, q) for i, q in enumerate(r["quarters"]) if q["count"]]
+        for piece_start, part in parts:
+            if (start is not None and piece_start < start) or (end is not None and piece_start >= end):
+                continue
+            local = piece_start.astimezone(tz)
+            local_hour = (local - timedelta(minutes=local.minute)).astimezone(timezone.utc)
+            pieces.setdefault(local_hour, []).append(part)
+    return [{"hour": h.astimezone(tz), **_merge(parts)} for h, parts in sorted(pieces.items())]
+
+
+def mean(rollup: dict, metric: str) -> Optional[float]:
+    return rollup[metric]["sum"] / rollup["count"] if rollup["count"] else None
+
+
+def combine(rollups: List[dict]) -> Optional[dict]:
+    """Reading-weighted mean, min and max of each metric across ``rollups``."""
+    count = sum(r["count"] for r in rollups)
+    if not count:
+        return None
+    combined = {"count": count}
+    for metric in METRICS:
+        values = [r[metric] for r in rollups if r["count"]]
+        combined[metric] = {
+            "mean": sum(v["sum"] for v in values) / count,
+            "min": min(v["min"] for v in values),
+            "max": max(v["max"] for v in values),
+        }
+    return combined
+
+
+def hour_points(rollups: List[dict]) -> List[dict]:
+    """Hourly chart points, in the shape of the report's ``hourly_data``; labelled in ``hour``'s timezone."""
+    points = []
+    for r in rollups:
+        hour = r["hour"] if r["hour"].tzinfo is not None else utc(r["hour"])
+        points.append({
+            "hour": hour.strftime("%H:00"),
+            "timestamp": hour.isoformat(),
+            "temperature": round(mean(r, "temperature"), 1),
+            "humidity": round(mean(r, "humidity"), 0),
+            "battery": round(mean(r, "battery"), 0),
+        })
+    return points
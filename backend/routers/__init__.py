@@ -0,0 +1,3 @@
+"""
+API routers. Each module can be imported on its own; server.py assembles them.
+"""
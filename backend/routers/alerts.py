@@ -0,0 +1,76 @@
+"""
+Alert history and acknowledgement.
+"""
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from coalesce import single_flight
+from database import get_store, mongo_breaker, last_known
+from models import AlertAckRequest
+from security import require_user
+from serialization import FastJSONResponse
+from simulation import sensor_state, generate_alerts
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+@router.get("/alerts")
+@single_flight
+async def get_alerts(since_version: Optional[int] = Query(None, ge=0)):
+    try:
+        # Get alerts from the store
+        async with mongo_breaker:
+            store = get_store()
+            state = await store.alerts.state("khetbox-001")
+            if since_version is not None:
+                # Only what changed (new or acknowledged) since the poller's last version
+                changed = await store.alerts.changed_since("khetbox-001", since_version, limit=500)
+                return FastJSONResponse({"alerts": changed, **state})
+            alerts_list = await store.alerts.recent("khetbox-001", limit=100)
+        
+        critical_count = sum(1 for a in alerts_list if a.get("severity") == "critical")
+        warning_count = sum(1 for a in alerts_list if a.get("severity") == "warning")
+        
+        result = {
+            "alerts": alerts_list,
+            "total_count": len(alerts_list),
+            "critical_count": critical_count,
+            "warning_count": warning_count,
+            **state,
+        }
+        last_known.set("alerts", result)
+        return FastJSONResponse(result)
+    except Exception as e:
+        logger.error(f"Error fetching alerts from DB: {e}")
+        if last_known.get("alerts") is not None:
+            return last_known.get("alerts")
+        # Fallback to generated alerts
+        sensor_data = sensor_state.to_dict()
+        alerts = generate_alerts(sensor_data)
+        return {
+            "alerts": alerts,
+            "total_count": len(alerts),
+            "critical_count": sum(1 for a in alerts if a["severity"] == "critical"),
+            "warning_count": sum(1 for a in alerts if a["severity"] == "warning")
+        }
+
+@router.post("/alerts/ack")
+async def acknowledge_alerts(request: AlertAckRequest, session: dict = Depends(require_user)):
+    if request.ids is None and request.severity is None and request.since is None and request.until is None:
+        raise HTTPException(status_code=422, detail="Give alert ids or a filter (severity, since, until)")
+    try:
+        async with mongo_breaker:
+            store = get_store()
+            change = await store.alerts.acknowledge(
+                request.device_id, ids=request.ids, severity=request.severity,
+                since=request.since, until=request.until, acknowledged_by=session["email"],
+            )
+            state = await store.alerts.state(request.device_id)
+    except Exception as e:
+        logger.error(f"Error acknowledging alerts: {e}")
+        raise HTTPException(status_code=503, detail="Alert store unavailable")
+    last_known.set("alerts", None)
+    return FastJSONResponse({"acknowledged": change["count"], "change": change, **state})
@@ -0,0 +1,114 @@
+"""
+CCTV stream listing, health monitoring and snapshot thumbnails.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse, Response
+
+from cctv_health import CctvHealthMonitor, SnapshotCache
+from coalesce import single_flight
+from database import get_store, mongo_breaker, last_known
+from etags import etag_matches
+from serialization import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+# Seconds between stream probes; 0 disables the health monitor
+CCTV_PROBE_INTERVAL = float(os.environ.get('CCTV_PROBE_INTERVAL', '30'))
+CCTV_PROBE_CONCURRENCY = int(os.environ.get('CCTV_PROBE_CONCURRENCY', '4'))
+SNAPSHOT_DIR = os.environ.get('CCTV_SNAPSHOT_DIR', str(Path(__file__).parent.parent / 'snapshots'))
+
+# Opened by the health monitor, off the event loop; None until then, or if the
+# directory can't be created (e.g. a read-only deployment)
+_snapshot_cache: Optional[SnapshotCache] = None
+
+def get_snapshot_cache() -> Optional[SnapshotCache]:
+    return _snapshot_cache
+
+async def open_snapshot_cache() -> Optional[SnapshotCache]:
+    global _snapshot_cache
+    cache = SnapshotCache(SNAPSHOT_DIR)
+    try:
+        await asyncio.to_thread(cache.load)
+    except OSError as e:
+        logger.warning(f"CCTV snapshot cache unavailable at {SNAPSHOT_DIR}, thumbnails disabled: {e}")
+        return None
+    _snapshot_cache = cache
+    return cache
+
+async def run_health_monitor():
+    monitor = CctvHealthMonitor(
+        await open_snapshot_cache(), interval=CCTV_PROBE_INTERVAL, concurrency=CCTV_PROBE_CONCURRENCY)
+    await monitor.run(get_store, "khetbox-001", mongo_breaker)
+
+def with_snapshot_urls(streams: list) -> list:
+    cache = get_snapshot_cache()
+    if cache is None:
+        return streams
+    for stream in streams:
+        if stream.get("id") in cache.entries:
+            stream["snapshot_url"] = f"/api/cctv/streams/{stream['id']}/snapshot"
+    return streams
+
+@router.get("/cctv/streams")
+@single_flight
+async def get_cctv_streams():
+    try:
+        # Get CCTV streams from the store
+        async with mongo_breaker:
+            streams = await get_store().cctv_streams.streams("khetbox-001")
+        
+        last_known.set("cctv_streams", streams)
+        return FastJSONResponse({"streams": with_snapshot_urls(streams)})
+    except Exception as e:
+        logger.error(f"Error fetching CCTV streams from DB: {e}")
+        if last_known.get("cctv_streams") is not None:
+            return {"streams": last_known.get("cctv_streams")}
+        # Fallback to hardcoded streams
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "streams": [
+                {
+                    "id": "cam-inside-01",
+                    "name": "Inside Camera",
+                    "location": "Storage Container Interior",
+                    "url": "https://placeholder-stream-inside.khetbox.local/live",
+                    "status": "active",
+                    "last_active": now
+                },
+                {
+                    "id": "cam-outside-01",
+                    "name": "Outside Camera",
+                    "location": "Container Exterior & Entrance",
+                    "url": "https://placeholder-stream-outside.khetbox.local/live",
+                    "status": "active",
+                    "last_active": now
+                }
+            ]
+        }
+
+@router.get("/cctv/streams/{stream_id}/snapshot")
+async def get_stream_snapshot(stream_id: str, if_none_match: Optional[str] = Header(None)):
+    """Latest JPEG captured by the health monitor, for dashboard thumbnails."""
+    cache = get_snapshot_cache()
+    snapshot = cache.get(stream_id) if cache is not None else None
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No snapshot available")
+
+    headers = {
+        "Cache-Control": f"public, max-age={int(CCTV_PROBE_INTERVAL)}",
+        "ETag": f'"{snapshot.etag}"',
+        "Last-Modified": formatdate(snapshot.modified, usegmt=True),
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(snapshot.path, media_type="image/jpeg", headers=headers)
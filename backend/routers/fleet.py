@@ -0,0 +1,43 @@
+"""
+Admin-only fleet analytics: containers ranked against each other.
+"""
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+import fleet
+from coalesce import single_flight
+from database import get_db, mongo_breaker, last_known
+from security import require_admin
+from serialization import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+@router.get("/fleet/summary")
+@single_flight
+async def get_fleet_summary(
+    hours: int = Query(24, ge=1, le=24 * 30),
+    limit: int = Query(10, ge=1, le=500),
+    _: dict = Depends(require_admin),
+):
+    """Worst containers by temperature excursions, battery health, alert rate and capacity utilization."""
+    summary = fleet.cache.get(hours)
+    if summary is None:
+        try:
+            async with mongo_breaker:
+                summary = await fleet.fleet_summary(get_db(), hours)
+        except Exception as e:
+            logger.error(f"Error computing fleet summary: {e}")
+            summary = last_known.get(f"fleet_summary:{hours}")
+            if summary is None:
+                raise HTTPException(status_code=503, detail="Fleet analytics unavailable")
+        else:
+            fleet.cache.put(hours, summary)
+            last_known.set(f"fleet_summary:{hours}", summary)
+
+    return FastJSONResponse({
+        **{k: v for k, v in summary.items() if k != "device_metrics"},
+        "rankings": fleet.rank(summary["device_metrics"], limit),
+    })
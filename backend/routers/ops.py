@@ -0,0 +1,78 @@
+"""
+Operational endpoints: API root, health/readiness, Prometheus metrics and
+the admin-only profiling controls.
+"""
+import logging
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+
+import coalesce
+import database
+import metrics
+from database import mongo_breaker, pool_wait_listener, spool
+from profiling import BlockingMonitor, SamplingProfiler
+from security import require_admin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+metrics_router = APIRouter()
+
+@router.get("/")
+async def root():
+    return {"message": "Khetbox Dashboard API", "version": "1.0.0"}
+
+@router.get("/health")
+async def get_health():
+    return {
+        "storage_backend": database.STORAGE_BACKEND,
+        "database": mongo_breaker.stats(),
+        "pool": pool_wait_listener.stats(),
+        "spool_pending": spool.pending(),
+        "coalescing": coalesce.stats(),
+    }
+
+@router.get("/health/ready")
+async def get_readiness():
+    if not mongo_breaker.ready:
+        raise HTTPException(status_code=503, detail="Database not ready")
+    return {"ready": True}
+
+# Profiling (admin only)
+sampling_profiler = SamplingProfiler()
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get('LOOP_BLOCK_THRESHOLD_MS', '0'))
+blocking_monitor = BlockingMonitor(threshold=LOOP_BLOCK_THRESHOLD_MS / 1000) if LOOP_BLOCK_THRESHOLD_MS > 0 else None
+
+@router.post("/admin/profiler/start")
+async def start_profiler(interval_ms: float = 5, duration_s: float = 30, admin: dict = Depends(require_admin)):
+    if sampling_profiler.running:
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    sampling_profiler.start(interval=max(interval_ms, 1) / 1000, duration=min(duration_s, 600))
+    logger.info(f"Sampling profiler started by {admin['email']}")
+    return sampling_profiler.status()
+
+@router.post("/admin/profiler/stop", response_class=PlainTextResponse)
+async def stop_profiler(admin: dict = Depends(require_admin)):
+    """Stop sampling and return collapsed stacks (flamegraph.pl / speedscope input)."""
+    sampling_profiler.stop()
+    return sampling_profiler.collapsed()
+
+@router.get("/admin/profiler")
+async def get_profiler_status(admin: dict = Depends(require_admin)):
+    return sampling_profiler.status()
+
+@router.get("/admin/loop-blocks")
+async def get_loop_blocks(admin: dict = Depends(require_admin)):
+    if blocking_monitor is None:
+        return {"enabled": False, "events": []}
+    return {
+        "enabled": True,
+        "threshold_ms": LOOP_BLOCK_THRESHOLD_MS,
+        "events": list(blocking_monitor.events)
+    }
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,150 @@
+"""
+Daily reports and PDF export. ReportLab is only imported by the export
+endpoint (via report_pdf), not when the router is loaded.
+"""
+import logging
+import random
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+import events
+import recent
+import timezones
+from coalesce import single_flight
+from database import get_store, mongo_breaker, last_known
+from models import DeviceTimezone
+from security import require_admin
+from serialization import FastJSONResponse
+from simulation import generate_historical_data
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+def with_event_summary(report: dict) -> dict:
+    # Door/power totals come from the live interval index, so they stay current
+    # even though the rest of the report is stored once a day
+    start, end = timezones.day_bounds(date.fromisoformat(report["date"]), report.get("timezone", "UTC"))
+    report["summary"] = {**report["summary"], **events.tracker.summary(start, end)}
+    return report
+
+def recent_hourly(tz_name: str) -> list:
+    # Today's hours so far from the in-memory window of recent readings
+    window = recent.recent.get("khetbox-001")
+    if window is None:
+        return []
+    start, end = timezones.day_bounds(timezones.local_date(datetime.now(timezone.utc), tz_name), tz_name)
+    return window.hourly(start, end, timezones.zone(tz_name))
+
+def simulated_report(tz_name: str) -> dict:
+    # Used only until the scheduler has written today's report, or while MongoDB is down.
+    # Built from the recent readings held in memory when there are any.
+    historical = recent_hourly(tz_name) or generate_historical_data(timezones.zone(tz_name))
+    temps = [d["temperature"] for d in historical if d["temperature"] is not None]
+    humidities = [d["humidity"] for d in historical if d["humidity"] is not None]
+    batteries = [d["battery"] for d in historical if d["battery"] is not None]
+    
+    return {
+        "date": timezones.local_date(datetime.now(timezone.utc), tz_name).isoformat(),
+        "timezone": tz_name,
+        "summary": {
+            "avg_temperature": round(sum(temps) / len(temps), 1),
+            "min_temperature": round(min(temps), 1),
+            "max_temperature": round(max(temps), 1),
+            "avg_humidity": round(sum(humidities) / len(humidities), 0),
+            "avg_battery": round(sum(batteries) / len(batteries), 0),
+            "alerts_count": random.randint(2, 8),
+            "uptime_percentage": 99.7
+        },
+        "hourly_data": historical,
+        "charts": {
+            "temperature_trend": historical,
+            "humidity_trend": historical
+        }
+    }
+
+def fallback_report(tz_name: str) -> dict:
+    today = timezones.local_date(datetime.now(timezone.utc), tz_name).isoformat()
+    cached = last_known.get("report")
+    if cached is not None and cached.get("date") == today and cached.get("timezone") == tz_name:
+        return with_event_summary(cached)
+    return with_event_summary(simulated_report(tz_name))
+
+@router.get("/reports/daily")
+@single_flight
+async def get_daily_reports(tz: Optional[str] = Query(None, description="IANA timezone; defaults to the device's")):
+    # Reports are written by the background scheduler (report_scheduler); this only reads them.
+    # Another timezone's report is regrouped from the stored hourly rollups.
+    if tz is not None:
+        try:
+            timezones.zone(tz)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    tz_name = tz or timezones.cached_timezone("khetbox-001")
+    try:
+        # Get report from the store
+        async with mongo_breaker:
+            store = get_store()
+            device_tz = await store.sensors.timezone("khetbox-001")
+            tz_name = tz or device_tz
+            now = datetime.now(timezone.utc)
+            today = timezones.local_date(now, tz_name)
+            if tz_name == device_tz:
+                report = await store.reports.daily("khetbox-001", today)
+            else:
+                report = await store.reports.build("khetbox-001", today, now, tz_name)
+    except Exception as e:
+        logger.error(f"Error fetching reports from DB: {e}")
+        return fallback_report(tz_name)
+    
+    if report is None:
+        logger.info(f"Report for {today} ({tz_name}) not materialized yet")
+        return fallback_report(tz_name)
+    if tz_name == device_tz:
+        last_known.set("report", report)
+    return FastJSONResponse(with_event_summary(report))
+
+@router.put("/devices/{device_id}/timezone")
+async def set_device_timezone(device_id: str, body: DeviceTimezone, _: dict = Depends(require_admin)):
+    """Set the timezone whose local days the device's reports cover (from the next scheduler pass)."""
+    try:
+        async with mongo_breaker:
+            await get_store().sensors.set_timezone(device_id, body.timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error setting timezone for {device_id}: {e}")
+        raise HTTPException(status_code=503, detail="Device settings unavailable")
+    return {"device_id": device_id, "timezone": body.timezone}
+
+@router.get("/reports/export-pdf")
+async def export_report_pdf():
+    """Export daily report as PDF"""
+    try:
+        # Get report from the store
+        async with mongo_breaker:
+            store = get_store()
+            tz_name = await store.sensors.timezone("khetbox-001")
+            report = await store.reports.daily("khetbox-001", timezones.local_date(datetime.now(timezone.utc), tz_name))
+        
+        if not report:
+            raise HTTPException(status_code=404, detail="Report not found")
+        
+        from report_pdf import build_report_pdf
+
+        pdf_bytes = build_report_pdf(with_event_summary(report))
+        
+        filename = f"khetbox-daily-report-{report['date']}.pdf"
+        
+        return StreamingResponse(
+            iter([pdf_bytes]),
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    
+    except Exception as e:
+        logger.exception(f"Error generating PDF: {e}")
+        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
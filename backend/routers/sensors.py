@@ -0,0 +1,213 @@
+"""
+Live sensor data: /api/status, the /ws/sensors WebSocket and the
+/api/stream/sensors Server-Sent Events fallback.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+
+import alert_state
+import anomaly
+import events
+import forecast
+import metrics
+import notifications
+import recent
+import spoilage
+import timezones
+from anomaly import anomaly_alert
+from broadcast import FrameBroadcaster
+from database import get_store
+from etags import etag_matches
+from serialization import dumps
+from simulation import sensor_state, generate_alerts
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+ws_router = APIRouter()
+
+STREAM_INTERVAL = float(os.environ.get('STREAM_INTERVAL', '8'))
+SSE_KEEPALIVE = 15.0
+
+# WebSocket connections
+connected_clients: List[WebSocket] = []
+sse_clients = 0
+
+# Alert types raised on the previous status tick, so each condition is stored once per episode
+active_alert_types: set = set()
+
+async def persist_reading(sensor_doc: dict):
+    now = datetime.now(timezone.utc)
+    window = recent.recent.append("khetbox-001", now, sensor_doc)
+    store = get_store()
+    await store.sensors.upsert("khetbox-001", {**sensor_doc, "last_update": now})
+    await store.readings.insert({**sensor_doc, "device_id": "khetbox-001", "timestamp": now})
+
+    await store.events.record("khetbox-001", events.tracker.observe(now, sensor_doc))
+
+    spoilage.tracker.observe(now, sensor_doc["temperature"], sensor_doc["humidity"])
+    raised = [a for a in generate_alerts(sensor_doc) if a["severity"] != "normal"]
+    raised += spoilage.tracker.alerts()
+    raised += events.tracker.alerts(now, timezones.cached_timezone("khetbox-001"))
+    raised += [anomaly_alert(a) for a in anomaly.detector.observe("khetbox-001", now, sensor_doc)]
+    raised += recent.sustained_alerts(window, now)
+    raised += forecast.forecast_alerts(forecast.forecaster.observe("khetbox-001", now, sensor_doc))
+    new_alerts = [
+        {**a, "device_id": "khetbox-001", "timestamp": now}
+        for a in raised if a["type"] not in active_alert_types
+    ]
+    active_alert_types.clear()
+    active_alert_types.update(a["type"] for a in raised)
+    if new_alerts:
+        change = await store.alerts.add("khetbox-001", new_alerts)
+        alert_state.versions.publish("khetbox-001", change)
+        notifications.dispatcher.submit("khetbox-001", new_alerts)
+
+class StatusSnapshot(NamedTuple):
+    etag: str
+    body: bytes
+
+# Latest status, pre-serialized; replaced (never modified) on each clock tick
+status_snapshot: Optional[StatusSnapshot] = None
+_snapshot_seq = int(time.time() * 1000)
+
+def publish_status(sensor_doc: dict) -> StatusSnapshot:
+    global status_snapshot, _snapshot_seq
+    _snapshot_seq += 1
+    status_snapshot = StatusSnapshot(f'"{_snapshot_seq}"', dumps(sensor_doc))
+    return status_snapshot
+
+@router.get("/status")
+async def get_status(if_none_match: Optional[str] = Header(None)):
+    # Reads never advance the simulation or touch MongoDB; the sensor clock does both
+    snapshot = status_snapshot or publish_status(sensor_state.to_dict())
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+@router.get("/status/recent")
+async def get_recent_status(minutes: int = Query(60, ge=1, le=int(recent.RECENT_HOURS * 60))):
+    """Mean, min, max and percentiles of each metric over the last ``minutes``, from memory."""
+    window = recent.recent.get("khetbox-001")
+    now = datetime.now(timezone.utc)
+    stats = window.stats(now - timedelta(minutes=minutes)) if window is not None else None
+    return {"device_id": "khetbox-001", "minutes": minutes, **(stats or {"count": 0, "metrics": {}})}
+
+@router.get("/battery/forecast")
+async def get_battery_forecast():
+    """Fitted charge/discharge rates and projected hours until the battery is critical."""
+    forecasts = forecast.forecaster.forecast(["khetbox-001"])
+    if not forecasts:
+        raise HTTPException(status_code=404, detail="No battery readings yet")
+    return {**forecasts[0], "critical_level": forecast.BATTERY_CRITICAL}
+
+_frame_alerts_version = 0
+
+async def tick() -> dict:
+    """One step of the sensor clock.
+
+    Advances the simulation, swaps in the new status snapshot, records the
+    reading (and any new alerts), and returns the frame for live clients.
+    """
+    global _frame_alerts_version
+    sensor_state.update()
+    sensor_doc = sensor_state.to_dict()
+    publish_status(sensor_doc)
+    try:
+        await persist_reading(sensor_doc)
+    except Exception as e:
+        logger.error(f"Recording sensor reading failed: {e}")
+
+    data = {**sensor_doc, "alerts": generate_alerts(sensor_doc)}
+    # Alert changes since the previous frame; None asks clients to refetch
+    version, delta = alert_state.versions.changes_since("khetbox-001", _frame_alerts_version)
+    data["alerts_version"] = _frame_alerts_version = version
+    if delta is None or delta:
+        data["alerts_delta"] = delta
+    return data
+
+# The sensor clock: single producer for /api/status and every WebSocket and SSE client; started with the app
+frames = FrameBroadcaster(tick, interval=STREAM_INTERVAL)
+
+# WebSocket for real-time updates
+@ws_router.websocket("/ws/sensors")
+async def websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    connected_clients.append(websocket)
+    metrics.WS_CLIENTS.set(len(connected_clients))
+    logger.info(f"WebSocket client connected. Total clients: {len(connected_clients)}")
+    queue, backlog = frames.subscribe()
+    
+    try:
+        for frame in backlog:
+            await websocket.send_text(frame.payload.decode('utf-8'))
+        while True:
+            frame = await queue.get()
+            metrics.WS_SEND_QUEUE.inc()
+            send_start = time.perf_counter()
+            try:
+                await websocket.send_text(frame.payload.decode('utf-8'))
+            finally:
+                metrics.WS_SEND_QUEUE.dec()
+                metrics.WS_SEND_LATENCY.observe(time.perf_counter() - send_start)
+    except WebSocketDisconnect:
+        connected_clients.remove(websocket)
+        logger.info(f"WebSocket client disconnected. Total clients: {len(connected_clients)}")
+    except Exception as e:
+        logger.error(f"WebSocket error: {e}")
+        if websocket in connected_clients:
+            connected_clients.remove(websocket)
+    finally:
+        frames.unsubscribe(queue)
+        metrics.WS_CLIENTS.set(len(connected_clients))
+
+# Server-Sent Events for networks where proxies drop WebSockets
+@router.get("/stream/sensors")
+async def stream_sensors(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    resume_from: Optional[int] = Query(None, alias="last_event_id"),
+):
+    # Browsers send Last-Event-ID on reconnect; the query parameter covers the first connection
+    try:
+        last_id = int(last_event_id) if last_event_id else resume_from
+    except ValueError:
+        last_id = None
+
+    async def sse_frames():
+        global sse_clients
+        # Subscribed only once the response starts, so the finally below always unsubscribes
+        queue, backlog = frames.subscribe(last_id)
+        sse_clients += 1
+        metrics.SSE_CLIENTS.set(sse_clients)
+        logger.info(f"SSE client connected. Total clients: {sse_clients}")
+        try:
+            yield b"retry: 3000\n\n"
+            for frame in backlog:
+                yield frame.sse
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comment line, so idle proxies don't close the connection
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame.sse
+        finally:
+            frames.unsubscribe(queue)
+            sse_clients -= 1
+            metrics.SSE_CLIENTS.set(sse_clients)
+
+    return StreamingResponse(sse_frames(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx-style proxies from buffering the stream
+        "X-Accel-Buffering": "no",
+    })
@@ -0,0 +1,111 @@
+"""
+Storage units and capacity.
+"""
+import logging
+import sqlite3
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pymongo.errors import PyMongoError
+
+import inventory
+import spoilage
+from coalesce import single_flight
+from database import get_store, mongo_breaker, last_known
+from db_health import CircuitOpenError
+from models import InventoryMovement
+from security import require_admin
+from serialization import FastJSONResponse
+from simulation import sensor_state
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+@router.get("/storage")
+@single_flight
+async def get_storage():
+    try:
+        # Get storage units from the store
+        async with mongo_breaker:
+            storage_list = await get_store().storage.units("khetbox-001")
+        
+        if not storage_list:
+            logger.warning("No storage units found in DB")
+            return {"storage_units": []}
+        
+        # Pick up lots added or emptied since the last read, then attach shelf-life scores
+        spoilage.tracker.sync(storage_list)
+        spoilage.tracker.annotate(storage_list)
+        last_known.set("storage", storage_list)
+        return FastJSONResponse({"storage_units": storage_list})
+    except Exception as e:
+        logger.error(f"Error fetching storage from DB: {e}")
+        if last_known.get("storage") is not None:
+            return {"storage_units": last_known.get("storage")}
+        # Fallback to sensor data if DB fails
+        sensor_data = sensor_state.to_dict()
+        return {
+            "storage_units": [
+                {
+                    "name": "Cold Storage Unit A",
+                    "type": "cold",
+                    "temperature_range": "2-8°C",
+                    "current_temp": sensor_data["temperature"],
+                    "current_humidity": sensor_data["humidity"]
+                }
+            ]
+        }
+
+@router.post("/storage/inventory")
+async def record_inventory_movement(movement: InventoryMovement, session: dict = Depends(require_admin)):
+    try:
+        async with mongo_breaker:
+            event = await get_store().storage.record_movement(
+                "khetbox-001", movement.unit, movement.crop, movement.quantity_kg,
+                movement.kind, icon=movement.icon, note=movement.note,
+            )
+    except inventory.UnknownUnit as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except inventory.InventoryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (CircuitOpenError, PyMongoError, sqlite3.Error):
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    logger.info(f"Inventory {event['kind']} {event['quantity_kg']} kg {event['crop']} in {event['unit']} by {session['email']}")
+    return FastJSONResponse({"success": True, "event": event})
+
+@router.get("/storage/inventory")
+@single_flight
+async def get_inventory_ledger(limit: int = Query(50, ge=1, le=500)):
+    try:
+        async with mongo_breaker:
+            events = await get_store().storage.ledger("khetbox-001", limit)
+    except Exception as e:
+        logger.error(f"Error fetching inventory ledger from DB: {e}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return FastJSONResponse({"events": events})
+
+@router.get("/capacity")
+@single_flight
+async def get_capacity():
+    try:
+        # Per-device totals: materialized counters on MongoDB, summed from the units on SQLite
+        async with mongo_breaker:
+            capacity = await get_store().storage.capacity("khetbox-001")
+        last_known.set("capacity", capacity)
+        return FastJSONResponse(capacity)
+    except Exception as e:
+        logger.error(f"Error fetching capacity from DB: {e}")
+        if last_known.get("capacity") is not None:
+            return FastJSONResponse(last_known.get("capacity"))
+        # Estimate from the fill-level sensor when there's no inventory data at all
+        total_capacity = 2 * inventory.DEFAULT_UNIT_CAPACITY_KG
+        used_percentage = sensor_state.to_dict()["storage_used"]
+        used_kg = round(total_capacity * used_percentage / 100)
+        return FastJSONResponse({
+            "total_capacity_kg": total_capacity,
+            "used_kg": used_kg,
+            "available_kg": total_capacity - used_kg,
+            "used_percentage": used_percentage,
+            "breakdown": [{"name": "Other", "kg": used_kg, "color": inventory.OTHER_COLOR, "icon": inventory.OTHER_ICON}],
+            "units": [],
+        })
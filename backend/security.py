@@ -0,0 +1,54 @@
+"""
+Demo users and the in-memory token registry used for role checks.
+"""
+import uuid
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Mock users
+# Mock users for demo/fallback (passwords stored as hashes)
+# For local/demo use we store mock passwords in plaintext to avoid
+# initializing passlib/bcrypt at import time (which can fail on some environments).
+# The login path will handle either plaintext or hashed passwords.
+MOCK_USERS = {
+    "farmer@khetbox.com": {"password": "farmer123", "role": "farmer", "name": "Ramesh Kumar", "hashed": False},
+    "admin@khetbox.com": {"password": "admin123", "role": "admin", "name": "Admin User", "hashed": False}
+}
+
+# Tokens handed out by /auth/login, so admin-only routes can check the caller's role
+issued_tokens: dict = {}
+MAX_ISSUED_TOKENS = 10000
+
+def issue_token(email: str, role: str) -> str:
+    token = f"mock-token-{uuid.uuid4()}"
+    if len(issued_tokens) >= MAX_ISSUED_TOKENS:
+        # Drop the oldest token (dicts keep insertion order)
+        issued_tokens.pop(next(iter(issued_tokens)))
+    issued_tokens[token] = {"email": email, "role": role}
+    return token
+
+async def require_user(authorization: Optional[str] = Header(None)) -> dict:
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    session = issued_tokens.get(token) if token else None
+    if session is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return session
+
+def signup_role(requested: str, authorization: Optional[str]) -> str:
+    """Role for a new account: whatever an admin asks for, otherwise always farmer.
+
+    The role in the signup body is client-controlled, so it is only trusted
+    when the request carries an admin's token.
+    """
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    session = issued_tokens.get(token) if token else None
+    if session is not None and session["role"] == "admin" and requested in ("farmer", "admin"):
+        return requested
+    return "farmer"
+
+async def require_admin(authorization: Optional[str] = Header(None)) -> dict:
+    session = await require_user(authorization)
+    if session["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return session
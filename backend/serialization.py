@@ -0,0 +1,44 @@
+"""
+Fast JSON responses for the API.
+
+Handlers return ``FastJSONResponse`` directly, which skips FastAPI's
+``jsonable_encoder`` pass. Documents are shaped at the query (``_id``
+excluded by projection), and BSON datetimes and ObjectIds are converted by
+the encoder itself while it writes bytes, so there is no separate Python
+loop over the documents.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+# Projections for the endpoint queries
+NO_ID = {"_id": 0}
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
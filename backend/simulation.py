@@ -0,0 +1,158 @@
+"""
+Simulated IoT sensor state and the data derived from it (threshold alerts,
+24h history) used until real device ingestion is wired up.
+"""
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import List
+
+# Sensor state (simulated IoT data)
+class SensorState:
+    def __init__(self):
+        self.temperature = 4.4
+        self.humidity = 61.0
+        self.battery = 61.0
+        self.storage_used = 61.0
+        self.solar_active = True
+        self.door_open = False
+        self.door_open_time = None
+        self.last_update = datetime.now(timezone.utc)
+    
+    def update(self):
+        # Smooth realistic changes
+        self.temperature += random.uniform(-0.3, 0.3)
+        self.temperature = max(2.0, min(8.5, self.temperature))
+        
+        self.humidity += random.uniform(-2, 2)
+        self.humidity = max(40, min(85, self.humidity))
+        
+        self.battery += random.uniform(-0.5, 0.3) if not self.solar_active else random.uniform(0.1, 0.5)
+        self.battery = max(20, min(95, self.battery))
+        
+        self.storage_used += random.uniform(-0.1, 0.2)
+        self.storage_used = max(50, min(75, self.storage_used))
+        
+        # Solar status changes occasionally
+        if random.random() < 0.05:
+            self.solar_active = not self.solar_active
+        
+        # Door occasionally opens
+        if random.random() < 0.02:
+            self.door_open = True
+            self.door_open_time = datetime.now(timezone.utc)
+        elif self.door_open and random.random() < 0.3:
+            self.door_open = False
+            self.door_open_time = None
+        
+        self.last_update = datetime.now(timezone.utc)
+    
+    def to_dict(self):
+        return {
+            "temperature": round(self.temperature, 1),
+            "humidity": round(self.humidity, 0),
+            "battery": round(self.battery, 0),
+            "storage_used": round(self.storage_used, 0),
+            "solar_active": self.solar_active,
+            "door_open": self.door_open,
+            "door_open_duration": int((datetime.now(timezone.utc) - self.door_open_time).total_seconds()) if self.door_open and self.door_open_time else 0,
+            "last_update": self.last_update.isoformat()
+        }
+
+sensor_state = SensorState()
+
+# Generate alerts based on sensor data
+def generate_alerts(data: dict) -> List[dict]:
+    alerts = []
+    
+    if data["temperature"] > 8:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "temperature",
+            "severity": "critical",
+            "message": f"Temperature Critical: {data['temperature']}°C exceeds safe limit (8°C)",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    elif data["temperature"] > 6:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "temperature",
+            "severity": "warning",
+            "message": f"Temperature Warning: {data['temperature']}°C approaching limit",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    
+    if data["battery"] < 25:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "battery",
+            "severity": "critical",
+            "message": f"Battery Critical: {data['battery']}% - Charge immediately!",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    elif data["battery"] < 40:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "battery",
+            "severity": "warning",
+            "message": f"Battery Low: {data['battery']}% remaining",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    
+    if data["humidity"] > 80:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "humidity",
+            "severity": "warning",
+            "message": f"High Humidity: {data['humidity']}% - Check ventilation",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    
+    if data["door_open"] and data["door_open_duration"] > 300:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "door",
+            "severity": "warning",
+            "message": f"Door Open: Container door has been open for {data['door_open_duration'] // 60} minutes",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": False
+        })
+    
+    if not alerts:
+        alerts.append({
+            "id": str(uuid.uuid4()),
+            "type": "system",
+            "severity": "normal",
+            "message": "All systems operating normally",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "acknowledged": True
+        })
+    
+    return alerts
+
+# Generate 24h historical data
+def generate_historical_data(tz=timezone.utc):
+    data = []
+    now = datetime.now(tz)
+    base_temp = 4.4
+    base_humidity = 61
+    
+    for i in range(24):
+        hour = now - timedelta(hours=23-i)
+        temp_variation = random.uniform(-1.5, 1.5)
+        humidity_variation = random.uniform(-8, 8)
+        
+        data.append({
+            "hour": hour.strftime("%H:00"),
+            "timestamp": hour.isoformat(),
+            "temperature": round(base_temp + temp_variation, 1),
+            "humidity": round(base_humidity + humidity_variation, 0),
+            "battery": round(61 + random.uniform(-10, 10), 0)
+        })
+    
+    return data
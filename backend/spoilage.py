@@ -0,0 +1,253 @@
+"""
+Shelf-life and spoilage-risk scoring for stored crop lots.
+
+A lot is one crop in one storage unit, aged from its ``stocked_at`` time.
+Every hour of storage uses up one hour of the crop's shelf life. Time spent
+outside the crop's safe band uses it up faster:
+
+    rate = 1 + TEMP_RATE * degrees_outside_band + HUMIDITY_RATE * rh_points_outside_band
+
+On startup ``load_history`` integrates this over the stored readings in one
+vectorized pass: cumulative sums per crop profile, indexed by each lot's
+stocking time. After that, ``SpoilageTracker.observe`` adds each new
+reading's interval to every lot in O(lots), without rescanning history.
+Readings are per device, so all units of a device share its sensor.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CropProfile(NamedTuple):
+    temp_min: float
+    temp_max: float
+    humidity_min: float
+    humidity_max: float
+    shelf_life_days: float
+
+
+# Safe storage bands and shelf life in those conditions
+CROP_PROFILES: Dict[str, CropProfile] = {
+    "tomatoes": CropProfile(4, 10, 60, 90, 21),
+    "chillies": CropProfile(5, 10, 60, 95, 28),
+    "leafy greens": CropProfile(0, 5, 60, 98, 14),
+    "rice": CropProfile(0, 25, 0, 70, 365),
+    "wheat": CropProfile(0, 25, 0, 70, 365),
+    "pulses": CropProfile(0, 25, 0, 70, 365),
+}
+
+# Extra shelf-life hours used per hour, per °C / per %RH outside the band
+TEMP_RATE = 0.5
+HUMIDITY_RATE = 0.05
+# Gaps between readings longer than this count as plain ageing; conditions are unknown
+MAX_GAP_HOURS = 1.0
+# Lots below this fraction of their shelf life, or with fewer days left, are at risk
+AT_RISK_FRACTION = 0.25
+AT_RISK_DAYS = 3.0
+
+SPOILAGE_HISTORY_DAYS = float(os.environ.get('SPOILAGE_HISTORY_DAYS', '14'))
+
+
+def _hours(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp() / 3600.0
+
+
+def _excess(values, low, high):
+    # Distance outside [low, high]; broadcasts readings against bands. Missing
+    # readings (NaN) count as in band.
+    return np.nan_to_num(np.maximum(values - high, 0.0) + np.maximum(low - values, 0.0))
+
+
+class SpoilageTracker:
+    """Running shelf-life consumption for every lot of one device."""
+
+    def __init__(self, profiles: Dict[str, CropProfile] = CROP_PROFILES):
+        self.profiles = profiles
+        self.keys: List[Tuple[str, str]] = []  # (unit, crop) per lot
+        self.stocked_at = np.zeros(0)
+        self.bands = np.zeros((0, 4))  # temp_min, temp_max, humidity_min, humidity_max
+        self.shelf_hours = np.zeros(0)
+        self.consumed = np.zeros(0)
+        self.degree_hours = np.zeros(0)
+        self.last: Optional[Tuple[float, float, float]] = None  # hours, temperature, humidity
+
+    def sync(self, units: List[dict], now: Optional[datetime] = None) -> None:
+        """Match the tracked lots to the crops currently in ``units``.
+
+        New lots start with plain ageing since they were stocked; emptied or
+        removed lots are dropped. Lots that are already tracked keep their state.
+        A crop without ``stocked_at`` is taken as stocked when it was first
+        seen, and matched to its lot by (unit, crop) from then on.
+        """
+        now_h = _hours(now or datetime.now(timezone.utc))
+        # New lots are aged up to the last reading; observe() adds the rest
+        aged_to = self.last[0] if self.last is not None else now_h
+        index = {(key, stocked): i for i, (key, stocked) in enumerate(zip(self.keys, self.stocked_at))}
+        by_key = {key: i for i, key in enumerate(self.keys)}
+        rows = []
+        for unit in units:
+            for crop in unit.get("crops", []):
+                profile = self.profiles.get(crop["name"].strip().lower())
+                if profile is None or crop.get("quantity", 0) <= 0:
+                    continue
+                key = (unit["name"], crop["name"])
+                if crop.get("stocked_at"):
+                    stocked = _hours(crop["stocked_at"])
+                    i = index.get((key, stocked))
+                else:
+                    i = by_key.get(key)
+                    stocked = self.stocked_at[i] if i is not None else now_h
+                if i is not None:
+                    rows.append((key, stocked, profile, self.consumed[i], self.degree_hours[i]))
+                else:
+                    rows.append((key, stocked, profile, max(aged_to - stocked, 0.0), 0.0))
+        self._set_lots(rows)
+
+    def _set_lots(self, rows) -> None:
+        self.keys = [row[0] for row in rows]
+        self.stocked_at = np.array([row[1] for row in rows], dtype=float)
+        self.bands = np.array([row[2][:4] for row in rows], dtype=float).reshape(-1, 4)
+        self.shelf_hours = np.array([row[2].shelf_life_days * 24 for row in rows], dtype=float)
+        self.consumed = np.array([row[3] for row in rows], dtype=float)
+        self.degree_hours = np.array([row[4] for row in rows], dtype=float)
+
+    def load(self, units: List[dict], timestamps, temperatures, humidities) -> None:
+        """Score every lot in ``units`` against a reading history (oldest first)."""
+        self.keys = []
+        self.last = None
+        self.sync(units)
+        t = np.fromiter((_hours(ts) for ts in timestamps), dtype=float)
+        if len(t) == 0:
+            return
+        temp = np.asarray(temperatures, dtype=float)
+        rh = np.asarray(humidities, dtype=float)
+
+        # Interval i runs from reading i to i+1 with reading i's conditions
+        dt = np.diff(t)
+        known = np.minimum(dt, MAX_GAP_HOURS)
+        temp_excess = _excess(temp[:-1, None], self.bands[None, :, 0], self.bands[None, :, 1])
+        rh_excess = _excess(rh[:-1, None], self.bands[None, :, 2], self.bands[None, :, 3])
+        rate = dt[:, None] + (TEMP_RATE * temp_excess + HUMIDITY_RATE * rh_excess) * known[:, None]
+        cum_consumed = np.vstack([np.zeros(len(self.keys)), np.cumsum(rate, axis=0)])
+        cum_degree = np.vstack([np.zeros(len(self.keys)), np.cumsum(temp_excess * known[:, None], axis=0)])
+
+        # Consumption since stocking = plain ageing up to the first reading after
+        # it, then the difference of the cumulative sums from there to the end
+        start = np.searchsorted(t, self.stocked_at)
+        lots = np.arange(len(self.keys))
+        in_window = start < len(t)
+        first = np.minimum(start, len(t) - 1)
+        before = np.where(in_window, t[first] - self.stocked_at, t[-1] - self.stocked_at)
+        self.consumed = np.maximum(before, 0.0) + np.where(
+            in_window, cum_consumed[-1] - cum_consumed[first, lots], 0.0)
+        self.degree_hours = np.where(in_window, cum_degree[-1] - cum_degree[first, lots], 0.0)
+        self.last = (t[-1], temp[-1], rh[-1])
+
+    def observe(self, timestamp: datetime, temperature: float, humidity: float) -> None:
+        """Add the interval since the previous reading to every lot."""
+        now_h = _hours(timestamp)
+        if self.last is not None and len(self.keys):
+            last_h, last_temp, last_rh = self.last
+            dt = max(now_h - last_h, 0.0)
+            known = min(dt, MAX_GAP_HOURS)
+            temp_excess = _excess(last_temp, self.bands[:, 0], self.bands[:, 1])
+            rh_excess = _excess(last_rh, self.bands[:, 2], self.bands[:, 3])
+            # Lots stocked since the last reading only age from their stocking time
+            elapsed = np.clip(now_h - np.maximum(self.stocked_at, last_h), 0.0, dt)
+            self.consumed += elapsed + (TEMP_RATE * temp_excess + HUMIDITY_RATE * rh_excess) * np.minimum(elapsed, known)
+            self.degree_hours += temp_excess * np.minimum(elapsed, known)
+        self.last = (now_h, temperature, humidity)
+
+    def lots(self) -> List[dict]:
+        if not self.keys:
+            return []
+        remaining = np.maximum(self.shelf_hours - self.consumed, 0.0)
+        if self.last is not None:
+            _, temp, rh = self.last
+            rate = 1 + TEMP_RATE * _excess(temp, self.bands[:, 0], self.bands[:, 1]) \
+                + HUMIDITY_RATE * _excess(rh, self.bands[:, 2], self.bands[:, 3])
+        else:
+            rate = np.ones(len(self.keys))
+        remaining_days = remaining / rate / 24
+
+        lots = []
+        for i, (unit, crop) in enumerate(self.keys):
+            if remaining[i] <= 0:
+                risk = "spoiled"
+            elif remaining[i] < AT_RISK_FRACTION * self.shelf_hours[i] or remaining_days[i] < AT_RISK_DAYS:
+                risk = "at_risk"
+            else:
+                risk = "ok"
+            lots.append({
+                "unit": unit,
+                "crop": crop,
+                "stocked_at": datetime.fromtimestamp(self.stocked_at[i] * 3600, timezone.utc).isoformat(),
+                "remaining_days": round(float(remaining_days[i]), 1),
+                "shelf_life_used": round(float(min(self.consumed[i] / self.shelf_hours[i], 1.0)), 3),
+                "degree_hours": round(float(self.degree_hours[i]), 1),
+                "risk": risk,
+            })
+        return lots
+
+    def annotate(self, units: List[dict]) -> List[dict]:
+        """Attach each lot's score to its crop entry in ``units`` (as ``shelf_life``)."""
+        by_key = {(lot["unit"], lot["crop"]): lot for lot in self.lots()}
+        for unit in units:
+            for crop in unit.get("crops", []):
+                lot = by_key.get((unit["name"], crop["name"]))
+                if lot is not None:
+                    crop["shelf_life"] = {k: lot[k] for k in ("remaining_days", "shelf_life_used", "degree_hours", "risk")}
+        return units
+
+    def alerts(self) -> List[dict]:
+        """Alerts for lots that are at risk or spoiled, in the same shape as generate_alerts."""
+        now = datetime.now(timezone.utc).isoformat()
+        alerts = []
+        for lot in self.lots():
+            if lot["risk"] == "ok":
+                continue
+            if lot["risk"] == "spoiled":
+                severity = "critical"
+                message = f"Spoilage: {lot['crop']} in {lot['unit']} has reached the end of its shelf life"
+            else:
+                severity = "warning"
+                message = f"Spoilage Risk: {lot['crop']} in {lot['unit']} has ~{lot['remaining_days']} days of shelf life left"
+            alerts.append({
+                "id": str(uuid.uuid4()),
+                "type": f"spoilage:{lot['unit']}:{lot['crop']}",
+                "severity": severity,
+                "message": message,
+                "timestamp": now,
+                "acknowledged": False,
+            })
+        return alerts
+
+
+async def load_history(store, tracker: SpoilageTracker, device_id: str) -> int:
+    """Initialise ``tracker`` from the device's storage units and recent readings.
+
+    ``store`` is the configured store (see repositories.py). Returns the
+    number of readings scored.
+    """
+    units = await store.storage.units(device_id)
+    since = datetime.now(timezone.utc) - timedelta(days=SPOILAGE_HISTORY_DAYS)
+    readings = await store.readings.history(device_id, since, ("temperature", "humidity"))
+    tracker.load(
+        units,
+        [r["timestamp"] for r in readings],
+        [r.get("temperature", np.nan) for r in readings],
+        [r.get("humidity", np.nan) for r in readings],
+    )
+    return len(readings)
+
+
+# Tracker for the demo device, fed by the status endpoint
+tracker = SpoilageTracker()
@@ -0,0 +1,226 @@
+"""
+Local write-ahead spool for MongoDB writes.
+
+When the database is unreachable, writes are appended to segment files on
+local disk instead of being dropped. Once the connection comes back the
+segments are replayed in order and deleted.
+
+The spool directory is created on the first spooled write, so a read-only
+filesystem (e.g. a serverless deployment) only matters if MongoDB actually
+goes down.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+# Sidecar listing the records of a segment already replayed, one index per line
+CHECKPOINT_SUFFIX = ".done"
+# Time-series collections have no unique _id index, so a re-inserted document
+# isn't rejected as a duplicate (migration 1)
+NO_UNIQUE_ID = {"readings"}
+
+
+def _encode(value):
+    # Keep BSON types that JSON can't represent round-trippable
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    raise TypeError(f"Cannot spool value of type {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+    return obj
+
+
+class WriteSpool:
+    """Append-only, segment-based spool of pending database writes.
+
+    Records are JSON lines. Appends are buffered and fsync'd in batches
+    (every ``fsync_batch`` records or when ``flush()`` is called by the
+    periodic flusher), so an outage costs one write() per record rather
+    than one fsync per record.
+    """
+
+    def __init__(self, directory, segment_max_bytes: int = 4 * 1024 * 1024, fsync_batch: int = 64):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batch = fsync_batch
+        self._file = None
+        self._unsynced = 0
+        self._pending = 0
+        self._replay_lock = asyncio.Lock()
+
+        segments = self._segments()
+        self._next_segment = (self._segment_number(segments[-1]) + 1) if segments else 1
+        for segment in segments:
+            with open(segment, "rb") as f:
+                self._pending += sum(1 for line in f if line.strip())
+            self._pending -= len(self._checkpoint(segment))
+        if self._pending:
+            logger.info(f"Spool has {self._pending} pending writes from a previous run")
+
+    @staticmethod
+    def _segment_number(path: Path) -> int:
+        return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _segments(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"), key=self._segment_number)
+
+    @staticmethod
+    def _checkpoint(segment: Path) -> Set[int]:
+        try:
+            with open(segment.with_suffix(CHECKPOINT_SUFFIX), "rb") as f:
+                return {int(line) for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def pending(self) -> int:
+        return self._pending
+
+    def append(self, collection: str, op: str, **kwargs) -> None:
+        """Spool one write. ``op`` is ``insert_one``, ``insert_many`` or ``update_one``."""
+        if op == "insert_one":
+            kwargs["document"].setdefault("_id", ObjectId())
+        elif op == "insert_many":
+            for doc in kwargs["documents"]:
+                doc.setdefault("_id", ObjectId())
+
+        if self._file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{SEGMENT_PREFIX}{self._next_segment:06d}{SEGMENT_SUFFIX}"
+            self._next_segment += 1
+            self._file = open(path, "ab")
+
+        record = {"collection": collection, "op": op, "args": kwargs}
+        self._file.write(json.dumps(record, default=_encode).encode("utf-8") + b"\n")
+        self._pending += 1
+        self._unsynced += 1
+
+        if self._unsynced >= self.fsync_batch:
+            self.flush()
+        if self._file.tell() >= self.segment_max_bytes:
+            self._close_segment()
+
+    def flush(self) -> None:
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        self._close_segment()
+
+    async def replay(self, db, concurrency: int = 8) -> int:
+        """Replay spooled writes against ``db`` in order; returns the number applied.
+
+        Writes are grouped by target document (collection + filter) so that
+        upserts to the same document keep their order, while independent
+        groups run concurrently, bounded by ``concurrency``. Each applied
+        record is checkpointed in a sidecar file, so a replay that fails
+        partway resumes after the records already applied; the segment and
+        its checkpoint are deleted once every record is in. The few records
+        that were in flight when a replay failed may be applied twice:
+        inserts carry a pre-assigned ``_id``, so that is a no-op except on
+        collections without a unique ``_id`` index (``NO_UNIQUE_ID``), where
+        the resumed replay deletes the ``_id`` before inserting it again.
+        """
+        async with self._replay_lock:
+            applied = 0
+            # Seal the active segment so new writes go to a fresh one while we replay
+            self._close_segment()
+            for segment in self._segments():
+                with open(segment, "rb") as f:
+                    records = [json.loads(line, object_hook=_decode) for line in f if line.strip()]
+                done = self._checkpoint(segment)
+                resumed = bool(done)
+
+                groups: Dict[str, List[int]] = {}
+                for index, record in enumerate(records):
+                    if index in done:
+                        continue
+                    if record["op"] == "update_one":
+                        key = record["collection"] + json.dumps(record["args"]["filter"], sort_keys=True, default=_encode)
+                    else:
+                        key = record["collection"]
+                    groups.setdefault(key, []).append(index)
+
+                semaphore = asyncio.Semaphore(concurrency)
+                checkpoint = open(segment.with_suffix(CHECKPOINT_SUFFIX), "ab")
+
+                async def apply_group(group: List[int]):
+                    nonlocal applied
+                    async with semaphore:
+                        for index in group:
+                            await self._apply(db, records[index], resumed)
+                            checkpoint.write(b"%d\n" % index)
+                            checkpoint.flush()
+                            applied += 1
+                            self._pending -= 1
+
+                # Let independent groups finish (and checkpoint) even if one fails
+                results = await asyncio.gather(*(apply_group(g) for g in groups.values()), return_exceptions=True)
+                checkpoint.close()
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+                segment.unlink()
+                segment.with_suffix(CHECKPOINT_SUFFIX).unlink()
+                logger.info(f"Replayed {len(records) - len(done)} spooled writes from {segment.name}")
+            return applied
+
+    @staticmethod
+    async def _apply(db, record: dict, resumed: bool = False) -> None:
+        collection = db[record["collection"]]
+        args = record["args"]
+        op = record["op"]
+        if op in ("insert_one", "insert_many"):
+            documents = [args["document"]] if op == "insert_one" else args["documents"]
+            if resumed and record["collection"] in NO_UNIQUE_ID:
+                await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in documents]}})
+            for doc in documents:
+                try:
+                    await collection.insert_one(doc)
+                except DuplicateKeyError:
+                    pass
+        elif op == "update_one":
+            await collection.update_one(args["filter"], args["update"], upsert=args.get("upsert", False))
+        else:
+            raise ValueError(f"Unknown spooled operation: {op}")
+
+
+class LastKnown:
+    """Last successfully read value per key, served when the database is unavailable."""
+
+    def __init__(self):
+        self._values: Dict[str, object] = {}
+
+    def set(self, key: str, value) -> None:
+        self._values[key] = value
+
+    def get(self, key: str, default=None) -> Optional[object]:
+        return self._values.get(key, default)
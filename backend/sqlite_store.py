@@ -0,0 +1,643 @@
+"""
+Embedded SQLite store for single-container sites (STORAGE_BACKEND=sqlite).
+
+Implements the repositories of repositories.py on one SQLite file, so a
+Raspberry Pi class box can run the dashboard without mongod. Documents are
+kept as JSON in a ``doc`` column, next to the columns they are looked up or
+ranged by (device_id, timestamps as epoch seconds, alert severity and
+version), each covered by the primary key or an index.
+
+The file is in WAL mode with synchronous=NORMAL: readers don't block the
+writer, and a commit doesn't wait for an fsync (a power cut can lose the
+last commits but not corrupt the file). Ingestion writes are queued and
+committed in batches: one transaction per SQLITE_BATCH_SIZE writes, or
+every SQLITE_FLUSH_INTERVAL seconds, whichever comes first. Every read
+commits the queue first, so it sees them. A batch leaves the queue only
+once it is committed; if it fails, its writes are retried one at a time
+and any that still fail are kept in the ``dead_letters`` table rather than
+dropped. User actions (sign-up, acknowledgements, stock movements,
+timezone changes) are committed before they return. All SQLite calls run
+on one worker thread, so the event loop never waits on the disk.
+
+Daily reports are built from the readings by SQLiteReportScheduler every
+REPORT_REFRESH_MIN minutes, from the same quarter-hour aggregates the
+MongoDB rollups keep (rollups.py), and stored; the API only reads them. Capacity is summed from the storage
+units on read (a handful of rows) rather than kept in counters.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import alert_state
+import inventory
+import rollups
+import timezones
+from migrations import DEFAULT_DEVICE_ID, SEED_CCTV_STREAMS, SEED_SENSOR, SEED_STORAGE_UNITS
+from report_scheduler import REPORT_REFRESH_INTERVAL, report_from_rollups
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BATCH_SIZE = int(os.environ.get('SQLITE_BATCH_SIZE', '256'))
+SQLITE_FLUSH_INTERVAL = float(os.environ.get('SQLITE_FLUSH_INTERVAL', '1.0'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensors (device_id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS readings (
+    device_id TEXT NOT NULL, ts REAL NOT NULL,
+    temperature REAL, humidity REAL, battery REAL, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS readings_device_ts ON readings (device_id, ts);
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY, device_id TEXT NOT NULL, ts REAL NOT NULL, severity TEXT,
+    acknowledged INTEGER NOT NULL, version INTEGER NOT NULL, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_device_ts ON alerts (device_id, ts);
+CREATE INDEX IF NOT EXISTS alerts_device_version ON alerts (device_id, version);
+CREATE INDEX IF NOT EXISTS alerts_unacknowledged ON alerts (device_id, acknowledged, severity);
+CREATE TABLE IF NOT EXISTS alert_state (device_id TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS reports (
+    device_id TEXT NOT NULL, date TEXT NOT NULL, final INTEGER NOT NULL, updated REAL NOT NULL,
+    doc TEXT NOT NULL, PRIMARY KEY (device_id, date)
+);
+CREATE TABLE IF NOT EXISTS storage (
+    device_id TEXT NOT NULL, name TEXT NOT NULL, doc TEXT NOT NULL, PRIMARY KEY (device_id, name)
+);
+CREATE TABLE IF NOT EXISTS inventory_ledger (
+    id TEXT PRIMARY KEY, device_id TEXT NOT NULL, ts REAL NOT NULL, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inventory_ledger_device_ts ON inventory_ledger (device_id, ts);
+CREATE TABLE IF NOT EXISTS events (
+    device_id TEXT NOT NULL, kind TEXT NOT NULL, started REAL NOT NULL, ended REAL, duration_seconds REAL,
+    PRIMARY KEY (device_id, kind, started)
+);
+CREATE TABLE IF NOT EXISTS cctv_streams (
+    device_id TEXT NOT NULL, id TEXT NOT NULL, doc TEXT NOT NULL, PRIMARY KEY (device_id, id)
+);
+CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, doc TEXT NOT NULL);
+-- Queued writes that failed to commit, kept for inspection instead of being dropped
+CREATE TABLE IF NOT EXISTS dead_letters (ts REAL NOT NULL, statement TEXT NOT NULL, params TEXT NOT NULL, error TEXT);
+"""
+
+# Document fields that hold datetimes; JSON keeps them as ISO strings
+DATETIME_FIELDS = frozenset({
+    "timestamp", "last_update", "created_at", "updated_at", "last_active", "stocked_at", "acknowledged_at",
+})
+
+# Per-quarter-hour aggregates, as rollups.refresh_hourly computes them on MongoDB
+QUARTERS_SQL = "SELECT CAST(ts / 900 AS INTEGER) AS quarter, COUNT(*), {} FROM readings " \
+               "WHERE device_id = ? AND ts >= ? AND ts < ? GROUP BY quarter".format(
+                   ", ".join(f"TOTAL({m}), MIN({m}), MAX({m})" for m in rollups.METRICS))
+
+
+def _epoch(ts: datetime) -> float:
+    return rollups.utc(ts).timestamp()
+
+
+def _dumps(doc: dict) -> str:
+    return dumps(doc).decode("utf-8")
+
+
+def _restore(value):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in DATETIME_FIELDS and isinstance(item, str):
+                try:
+                    value[key] = datetime.fromisoformat(item)
+                except ValueError:
+                    pass
+            elif isinstance(item, (dict, list)):
+                _restore(item)
+    elif isinstance(value, list):
+        for item in value:
+            _restore(item)
+    return value
+
+
+def _loads(text: str) -> dict:
+    return _restore(json.loads(text))
+
+
+class SQLiteSensors:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def upsert(self, device_id: str, fields: dict) -> None:
+        # json_patch merges like $set, except that null fields are dropped
+        await self.store.write(
+            "INSERT INTO sensors (device_id, doc) VALUES (?, ?) "
+            "ON CONFLICT (device_id) DO UPDATE SET doc = json_patch(doc, excluded.doc)",
+            (device_id, _dumps({"device_id": device_id, **fields})))
+
+    async def timezone(self, device_id: str) -> str:
+        name = timezones.known_timezone(device_id)
+        if name is None:
+            row = await self.store.query(
+                "SELECT json_extract(doc, '$.timezone') FROM sensors WHERE device_id = ?", (device_id,))
+            name = timezones.remember_timezone(device_id, row[0][0] if row else None)
+        return name
+
+    async def set_timezone(self, device_id: str, name: str) -> None:
+        timezones.zone(name)  # validate
+        await self.store.execute(
+            "INSERT INTO sensors (device_id, doc) VALUES (?, json_object('device_id', ?, 'timezone', ?)) "
+            "ON CONFLICT (device_id) DO UPDATE SET doc = json_set(doc, '$.timezone', ?)",
+            (device_id, device_id, name, name))
+        timezones.remember_timezone(device_id, name)
+
+
+class SQLiteReadings:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def insert(self, reading: dict) -> None:
+        await self.store.write(
+            "INSERT INTO readings (device_id, ts, temperature, humidity, battery, doc) VALUES (?, ?, ?, ?, ?, ?)",
+            (reading["device_id"], _epoch(reading["timestamp"]), reading.get("temperature"),
+             reading.get("humidity"), reading.get("battery"), _dumps(reading)))
+
+    async def history(self, device_id: str, since: datetime, fields: Iterable[str]) -> List[dict]:
+        """Readings at or after ``since``, oldest first, with their timestamp and ``fields``."""
+        fields = list(fields)
+        columns = "".join(", json_extract(doc, ?)" for _ in fields)
+        rows = await self.store.query(
+            f"SELECT ts{columns} FROM readings WHERE device_id = ? AND ts >= ? ORDER BY ts",
+            (*(f"$.{f}" for f in fields), device_id, _epoch(since)))
+        readings = []
+        for ts, *values in rows:
+            reading = {f: v for f, v in zip(fields, values) if v is not None}
+            reading["timestamp"] = datetime.fromtimestamp(ts, timezone.utc)
+            readings.append(reading)
+        return readings
+
+
+class SQLiteAlerts:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def add(self, device_id: str, alerts: List[dict]) -> dict:
+        """Store newly raised alerts, stamped with a version; returns the change to publish."""
+        _, change = alert_state.stamp_new_alerts(device_id, alerts)
+        for alert in alerts:
+            await self.store.write(
+                "INSERT OR IGNORE INTO alerts (id, device_id, ts, severity, acknowledged, version, doc) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (alert["id"], device_id, _epoch(alert["timestamp"]), alert.get("severity"),
+                 int(bool(alert.get("acknowledged"))), alert["version"], _dumps(alert)))
+        await self.store.write(
+            "INSERT INTO alert_state (device_id, version) VALUES (?, ?) "
+            "ON CONFLICT (device_id) DO UPDATE SET version = max(version, excluded.version)",
+            (device_id, change["version"]))
+        return change
+
+    async def recent(self, device_id: str, limit: int = 100) -> List[dict]:
+        rows = await self.store.query(
+            "SELECT doc FROM alerts WHERE device_id = ? ORDER BY ts DESC LIMIT ?", (device_id, limit))
+        return [_loads(doc) for doc, in rows]
+
+    async def changed_since(self, device_id: str, version: int, limit: int = 500) -> List[dict]:
+        rows = await self.store.query(
+            "SELECT doc FROM alerts WHERE device_id = ? AND version > ? ORDER BY version LIMIT ?",
+            (device_id, version, limit))
+        return [_loads(doc) for doc, in rows]
+
+    async def state(self, device_id: str) -> dict:
+        """Current version and unacknowledged counts, as alert_state.get_state returns them."""
+        def read(conn):
+            row = conn.execute("SELECT version FROM alert_state WHERE device_id = ?", (device_id,)).fetchone()
+            counts = dict(conn.execute(
+                "SELECT severity, COUNT(*) FROM alerts WHERE device_id = ? AND acknowledged = 0 GROUP BY severity",
+                (device_id,)).fetchall())
+            return (row[0] if row else 0), counts
+
+        version, counts = await self.store.call(read)
+        alert_state.versions.observe(device_id, version)
+        return {"version": version, "unacknowledged": {s: counts.get(s, 0) for s in alert_state.SEVERITIES}}
+
+    async def acknowledge(self, device_id: str, ids: Optional[List[str]] = None, severity: Optional[str] = None,
+                          since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          acknowledged_by: Optional[str] = None) -> dict:
+        """Acknowledge every unacknowledged alert matching the filter (see alert_state.acknowledge)."""
+        where, params = "device_id = ? AND acknowledged = 0 AND severity = ?", []
+        if ids is not None:
+            where += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += ids
+        if since is not None:
+            where += " AND ts >= ?"
+            params.append(_epoch(since))
+        if until is not None:
+            where += " AND ts < ?"
+            params.append(_epoch(until))
+        version = alert_state.versions.next_version(device_id)
+        acknowledged_at = datetime.now(timezone.utc).isoformat()
+        severities = [severity] if severity is not None else list(alert_state.SEVERITIES)
+
+        def ack(conn):
+            counts = {}
+            for s in severities:
+                cursor = conn.execute(
+                    "UPDATE alerts SET acknowledged = 1, version = ?, doc = json_set(doc, "
+                    "'$.acknowledged', json('true'), '$.acknowledged_at', ?, '$.acknowledged_by', ?, '$.version', ?) "
+                    f"WHERE {where}",
+                    (version, acknowledged_at, acknowledged_by, version, device_id, s, *params))
+                if cursor.rowcount:
+                    counts[s] = cursor.rowcount
+            conn.execute(
+                "INSERT INTO alert_state (device_id, version) VALUES (?, ?) "
+                "ON CONFLICT (device_id) DO UPDATE SET version = max(version, excluded.version)",
+                (device_id, version))
+            return counts
+
+        counts = await self.store.call(ack)
+        change = {"version": version, "op": "ack", "count": sum(counts.values()), "severities": counts}
+        alert_state.versions.publish(device_id, change)
+        return change
+
+
+class SQLiteReports:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def daily(self, device_id: str, day: date) -> Optional[dict]:
+        """The stored report for ``day`` in the device's timezone (see SQLiteReportScheduler)."""
+        rows = await self.store.query(
+            "SELECT doc FROM reports WHERE device_id = ? AND date = ?", (device_id, day.isoformat()))
+        return _loads(rows[0][0]) if rows else None
+
+    async def materialize(self, device_id: str, day: date, now: datetime, tz_name: str) -> Optional[dict]:
+        """Rebuild and store the report for ``day`` unless it is already final."""
+        rows = await self.store.query(
+            "SELECT final, doc FROM reports WHERE device_id = ? AND date = ?", (device_id, day.isoformat()))
+        if rows and rows[0][0]:
+            return _loads(rows[0][1])
+        report = await self.build(device_id, day, now, tz_name)
+        if report is None:
+            return None
+        report["created_at"] = (_loads(rows[0][1]).get("created_at") if rows else None) or now
+        await self.store.execute(
+            "INSERT INTO reports (device_id, date, final, updated, doc) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (device_id, date) DO UPDATE SET "
+            "final = excluded.final, updated = excluded.updated, doc = excluded.doc",
+            (device_id, report["date"], int(report["final"]), now.timestamp(), _dumps(report)))
+        return report
+
+    async def build(self, device_id: str, day: date, now: datetime, tz_name: str) -> Optional[dict]:
+        """A report for the local ``day`` in any timezone, built from the readings."""
+        start, end = timezones.day_bounds(day, tz_name)
+
+        def read(conn):
+            quarters = conn.execute(
+                QUARTERS_SQL, (device_id, rollups.hour_start(start).timestamp(), end.timestamp())).fetchall()
+            alerts = conn.execute(
+                "SELECT COUNT(*) FROM alerts WHERE device_id = ? AND ts >= ? AND ts < ?",
+                (device_id, start.timestamp(), end.timestamp())).fetchone()[0]
+            return quarters, alerts
+
+        rows, alerts_count = await self.store.call(read)
+        quarters: Dict[datetime, List[dict]] = {}
+        for quarter, count, *values in rows:
+            hour = datetime.fromtimestamp(quarter // 4 * 3600, timezone.utc)
+            part = {"count": count}
+            for i, metric in enumerate(rollups.METRICS):
+                part[metric] = dict(zip(("sum", "min", "max"), values[3 * i:3 * i + 3]))
+            quarters.setdefault(hour, [{"count": 0} for _ in range(4)])[quarter % 4] = part
+        return report_from_rollups(device_id, day, now, tz_name, rollups.from_quarters(quarters), alerts_count)
+
+
+class SQLiteReportScheduler:
+    """report_scheduler.ReportScheduler for the embedded store.
+
+    Every REPORT_REFRESH_MIN minutes each device's report for its local
+    today is rebuilt from the readings, and yesterday's until it is final.
+    """
+
+    def __init__(self, interval: float = REPORT_REFRESH_INTERVAL):
+        self.interval = interval
+
+    async def refresh_device(self, store: "SQLiteStore", device_id: str,
+                             now: Optional[datetime] = None) -> List[str]:
+        """Bring one device's reports up to ``now``; returns the dates written."""
+        now = now or datetime.now(timezone.utc)
+        tz_name = await store.sensors.timezone(device_id)
+        today = timezones.local_date(now, tz_name)
+        written = []
+        for day in (today - timedelta(days=1), today):
+            if await store.reports.materialize(device_id, day, now, tz_name) is not None:
+                written.append(day.isoformat())
+        return written
+
+    async def run_once(self, store: "SQLiteStore", now: Optional[datetime] = None) -> int:
+        """One pass over the devices; returns the number refreshed."""
+        refreshed = 0
+        for device_id, in await store.query("SELECT device_id FROM sensors"):
+            try:
+                await self.refresh_device(store, device_id, now)
+                refreshed += 1
+            except Exception as e:
+                logger.warning(f"Report refresh for {device_id} failed: {e}")
+        return refreshed
+
+    async def run(self, get_store: Callable, breaker) -> None:
+        while True:
+            try:
+                async with breaker:
+                    await self.run_once(get_store())
+            except Exception as e:
+                logger.warning(f"Report materialization pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+class SQLiteStorage:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def units(self, device_id: str) -> List[dict]:
+        rows = await self.store.query(
+            "SELECT doc FROM storage WHERE device_id = ? ORDER BY rowid LIMIT 10", (device_id,))
+        return [_loads(doc) for doc, in rows]
+
+    async def capacity(self, device_id: str) -> dict:
+        """The /api/capacity view, summed from the storage units."""
+        rows = await self.store.query("SELECT doc FROM storage WHERE device_id = ? ORDER BY rowid", (device_id,))
+        return inventory.capacity_view(inventory.totals_from_units(device_id, [_loads(doc) for doc, in rows]))
+
+    async def ledger(self, device_id: str, limit: int = 50) -> List[dict]:
+        rows = await self.store.query(
+            "SELECT doc FROM inventory_ledger WHERE device_id = ? ORDER BY ts DESC LIMIT ?", (device_id, limit))
+        return [_loads(doc) for doc, in rows]
+
+    async def record_movement(self, device_id: str, unit: str, crop: str, quantity_kg: float, kind: str,
+                              icon: Optional[str] = None, note: Optional[str] = None) -> dict:
+        """Apply a stock movement and record it in the ledger, in one transaction (see inventory.py)."""
+        inventory.check_movement(unit, crop, quantity_kg, kind)
+        now = datetime.now(timezone.utc)
+
+        def move(conn):
+            row = conn.execute("SELECT doc FROM storage WHERE device_id = ? AND name = ?", (device_id, unit)).fetchone()
+            if row is None:
+                raise inventory.UnknownUnit(f"No storage unit {unit!r} on {device_id}")
+            unit_doc = _loads(row[0])
+            inventory.apply_movement(unit_doc, crop, quantity_kg, kind, icon=icon, now=now)
+            conn.execute("UPDATE storage SET doc = ? WHERE device_id = ? AND name = ?",
+                         (_dumps(unit_doc), device_id, unit))
+            event = inventory.ledger_event(device_id, unit, crop, kind, quantity_kg, note, now)
+            conn.execute("INSERT INTO inventory_ledger (id, device_id, ts, doc) VALUES (?, ?, ?, ?)",
+                         (event["id"], device_id, now.timestamp(), _dumps(event)))
+            return event
+
+        return await self.store.call(move)
+
+
+class SQLiteEvents:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def record(self, device_id: str, transitions: List[dict]) -> None:
+        # Opening and closing an interval upsert the same row, like events.event_writes on MongoDB
+        for t in transitions:
+            end = _epoch(t["end"]) if t["end"] is not None else None
+            start = _epoch(t["start"])
+            await self.store.write(
+                "INSERT INTO events (device_id, kind, started, ended, duration_seconds) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (device_id, kind, started) DO UPDATE SET "
+                "ended = coalesce(excluded.ended, ended), duration_seconds = coalesce(excluded.duration_seconds, duration_seconds)",
+                (device_id, t["kind"], start, end, end - start if end is not None else None))
+
+    async def history(self, device_id: str, since: datetime) -> List[dict]:
+        """Intervals starting at or after ``since``, oldest first."""
+        rows = await self.store.query(
+            "SELECT kind, started, ended FROM events WHERE device_id = ? AND started >= ? ORDER BY started",
+            (device_id, _epoch(since)))
+        return [{
+            "kind": kind,
+            "start": datetime.fromtimestamp(started, timezone.utc),
+            "end": datetime.fromtimestamp(ended, timezone.utc) if ended is not None else None,
+        } for kind, started, ended in rows]
+
+
+class SQLiteCctvStreams:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def streams(self, device_id: str) -> List[dict]:
+        rows = await self.store.query(
+            "SELECT json_remove(doc, '$.created_at') FROM cctv_streams WHERE device_id = ? ORDER BY rowid LIMIT 10",
+            (device_id,))
+        return [_loads(doc) for doc, in rows]
+
+    async def probe_targets(self, device_id: str) -> List[dict]:
+        streams = await self.streams(device_id)
+        return [{k: s[k] for k in ("id", "url", "snapshot_url", "status") if k in s} for s in streams]
+
+    async def update_status(self, device_id: str, changes: Dict[str, dict]) -> None:
+        """Apply each stream's field changes (stream id -> fields) in one transaction."""
+        def update(conn):
+            conn.executemany(
+                "UPDATE cctv_streams SET doc = json_patch(doc, ?) WHERE device_id = ? AND id = ?",
+                [(_dumps(fields), device_id, stream_id) for stream_id, fields in changes.items()])
+
+        await self.store.call(update)
+
+
+class SQLiteUsers:
+    def __init__(self, store: "SQLiteStore"):
+        self.store = store
+
+    async def find(self, email: str) -> Optional[dict]:
+        rows = await self.store.query("SELECT doc FROM users WHERE email = ?", (email,))
+        return _loads(rows[0][0]) if rows else None
+
+    async def insert(self, user: dict) -> None:
+        # Raises sqlite3.IntegrityError for an existing email, like the unique index on MongoDB
+        await self.store.execute("INSERT INTO users (email, doc) VALUES (?, ?)", (user["email"], _dumps(user)))
+
+
+class SQLiteStore:
+    """The repositories on an embedded SQLite database."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, batch_size: int = SQLITE_BATCH_SIZE,
+                 flush_interval: float = SQLITE_FLUSH_INTERVAL, seed: bool = True):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.seed = seed
+        self.commits = 0
+        self.batched_writes = 0
+        self.dead_letters = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        # Queued ingestion writes: (statement, parameters); appended on the loop, drained by the worker
+        self._pending: Deque[Tuple[str, tuple]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+
+        self.sensors = SQLiteSensors(self)
+        self.readings = SQLiteReadings(self)
+        self.alerts = SQLiteAlerts(self)
+        self.reports = SQLiteReports(self)
+        self.storage = SQLiteStorage(self)
+        self.events = SQLiteEvents(self)
+        self.cctv_streams = SQLiteCctvStreams(self)
+        self.users = SQLiteUsers(self)
+
+    # The methods below that take a connection run on the worker thread
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            if self.seed:
+                self._seed(conn)
+            self._conn = conn
+        return self._conn
+
+    def _seed(self, conn: sqlite3.Connection) -> None:
+        # Same defaults as migration 4 (plus the fields migrations 6 and 7 add); only fills in what's missing
+        now = datetime.now(timezone.utc)
+        conn.execute("INSERT OR IGNORE INTO sensors (device_id, doc) VALUES (?, ?)", (DEFAULT_DEVICE_ID, _dumps(
+            {"device_id": DEFAULT_DEVICE_ID, **SEED_SENSOR, "last_update": now, "created_at": now})))
+        for unit in SEED_STORAGE_UNITS:
+            doc = {
+                "device_id": DEFAULT_DEVICE_ID, **unit,
+                "crops": [{"stocked_at": now, **crop} for crop in unit["crops"]],
+                "capacity_kg": inventory.DEFAULT_UNIT_CAPACITY_KG,
+                "used_kg": sum(crop["quantity"] for crop in unit["crops"]),
+                "created_at": now,
+            }
+            conn.execute("INSERT OR IGNORE INTO storage (device_id, name, doc) VALUES (?, ?, ?)",
+                         (DEFAULT_DEVICE_ID, unit["name"], _dumps(doc)))
+            for crop in unit["crops"]:
+                # Opening balances, as migration 6 records them
+                event = {
+                    "id": f"opening:{DEFAULT_DEVICE_ID}:{unit['name']}:{crop['name']}", "device_id": DEFAULT_DEVICE_ID,
+                    "unit": unit["name"], "crop": crop["name"], "kind": "in", "quantity_kg": crop["quantity"],
+                    "note": "opening balance", "timestamp": now,
+                }
+                conn.execute("INSERT OR IGNORE INTO inventory_ledger (id, device_id, ts, doc) VALUES (?, ?, ?, ?)",
+                             (event["id"], DEFAULT_DEVICE_ID, now.timestamp(), _dumps(event)))
+        for stream in SEED_CCTV_STREAMS:
+            doc = {"device_id": DEFAULT_DEVICE_ID, **stream, "status": "active", "last_active": now, "created_at": now}
+            conn.execute("INSERT OR IGNORE INTO cctv_streams (device_id, id, doc) VALUES (?, ?, ?)",
+                         (DEFAULT_DEVICE_ID, stream["id"], _dumps(doc)))
+
+    def _transaction(self, fn: Callable, *args):
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _commit_pending(self) -> int:
+        count = len(self._pending)
+        if not count:
+            return 0
+        self._connection()
+        # Writes queued meanwhile go after these; the batch is only dropped from the queue once committed
+        batch = list(islice(self._pending, count))
+        try:
+            written = self._transaction(self._write_batch, batch)
+        except sqlite3.Error as e:
+            logger.error(f"Committing {count} queued SQLite writes failed, retrying them one at a time: {e}")
+            written = self._transaction(self._write_each, batch)
+        for _ in range(count):
+            self._pending.popleft()
+        self.commits += 1
+        self.batched_writes += written
+        return written
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: List[Tuple[str, tuple]]) -> int:
+        # One executemany per statement; statements only write to their own rows, so grouping is safe
+        batches: Dict[str, List[tuple]] = {}
+        for sql, params in batch:
+            batches.setdefault(sql, []).append(params)
+        for sql, rows in batches.items():
+            conn.executemany(sql, rows)
+        return len(batch)
+
+    def _write_each(self, conn: sqlite3.Connection, batch: List[Tuple[str, tuple]]) -> int:
+        written = 0
+        for sql, params in batch:
+            conn.execute("SAVEPOINT write")
+            try:
+                conn.execute(sql, params)
+                written += 1
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO write")
+                logger.error(f"Queued SQLite write failed, kept in dead_letters: {e}")
+                conn.execute("INSERT INTO dead_letters (ts, statement, params, error) VALUES (?, ?, ?, ?)",
+                             (time.time(), sql, json.dumps(params), str(e)))
+                self.dead_letters += 1
+            conn.execute("RELEASE write")
+        return written
+
+    def _call(self, fn: Callable):
+        self._commit_pending()
+        return self._transaction(fn)
+
+    async def _run(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def write(self, sql: str, params: tuple) -> None:
+        """Queue an ingestion write; commits the batch once it is full."""
+        self._pending.append((sql, params))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def call(self, fn: Callable):
+        """Run ``fn(connection)`` in a transaction on the worker thread, after the queued writes."""
+        return await self._run(self._call, fn)
+
+    async def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return await self.call(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params: tuple = ()) -> None:
+        await self.call(lambda conn: conn.execute(sql, params))
+
+    async def flush(self) -> int:
+        """Commit the queued writes; returns how many there were."""
+        return await self._run(self._commit_pending)
+
+    async def flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Committing queued SQLite writes failed: {e}")
+
+    async def ping(self) -> None:
+        await self.query("SELECT 1")
+
+    async def close(self) -> None:
+        def close():
+            self._commit_pending()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(close)
+        self._executor.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending_writes": len(self._pending),
+            "commits": self.commits,
+            "batched_writes": self.batched_writes,
+            "dead_letters": self.dead_letters,
+        }
@@ -0,0 +1,70 @@
+"""
+Per-device timezones for local reporting days.
+
+A device's timezone is the ``timezone`` field on its ``sensors`` document
+(an IANA name such as "Asia/Kolkata"). Devices without one use
+DEFAULT_DEVICE_TIMEZONE. Lookups are cached in memory, since the timezone
+of a device rarely changes.
+"""
+import os
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_DEVICE_TIMEZONE = os.environ.get('DEFAULT_DEVICE_TIMEZONE', 'Asia/Kolkata')
+
+_device_zones: Dict[str, str] = {}
+
+
+@lru_cache(maxsize=None)
+def zone(name: str) -> tzinfo:
+    """The tzinfo for an IANA name; raises ValueError for unknown names."""
+    if name.upper() == "UTC":
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name!r}")
+
+
+async def device_timezone(db, device_id: str) -> str:
+    name = _device_zones.get(device_id)
+    if name is None:
+        doc = await db.sensors.find_one({"device_id": device_id}, {"_id": 0, "timezone": 1})
+        name = remember_timezone(device_id, (doc or {}).get("timezone"))
+    return name
+
+
+async def set_device_timezone(db, device_id: str, name: str) -> None:
+    zone(name)  # validate
+    await db.sensors.update_one({"device_id": device_id}, {"$set": {"timezone": name}}, upsert=True)
+    remember_timezone(device_id, name)
+
+
+def known_timezone(device_id: str) -> Optional[str]:
+    """The cached timezone of the device; None if it hasn't been looked up yet."""
+    return _device_zones.get(device_id)
+
+
+def remember_timezone(device_id: str, stored: Optional[str]) -> str:
+    """Cache the device's stored timezone (None if unset); returns the one in effect."""
+    name = _device_zones[device_id] = stored or DEFAULT_DEVICE_TIMEZONE
+    return name
+
+
+def cached_timezone(device_id: str) -> str:
+    """The device's timezone if it has been looked up already, else the default (no I/O)."""
+    return _device_zones.get(device_id, DEFAULT_DEVICE_TIMEZONE)
+
+
+def local_date(ts: datetime, name: str) -> date:
+    return ts.astimezone(zone(name)).date()
+
+
+def day_bounds(day: date, name: str) -> Tuple[datetime, datetime]:
+    """UTC start and end of the local ``day``; 23 or 25 hours long across DST changes."""
+    tz = zone(name)
+    start = datetime(day.year, day.month, day.day, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
@@ -0,0 +1,304 @@
+"""
+Load and latency benchmark for the KhetBox API and WebSocket paths.
+
+Boots server:app in a subprocess (against mongomock by default, or a real
+MongoDB with --mongo-url) and drives the traffic mix the frontend produces:
+
+  * Dashboard: /status + /reports/daily on mount, then /status every 8 s
+  * Alerts page: /alerts every 5 s
+  * Storage page: /storage every 10 s
+  * Capacity page: /capacity every 15 s
+  * N concurrent /ws/sensors subscribers
+  * login bursts and PDF exports
+
+Throughput and p50/p95/p99 latency per operation are written as JSON. With
+--baseline the run is compared against a saved result and exits non-zero
+on regressions.
+
+    python bench/bench_api.py --duration 60 --out bench/results.json
+    python bench/bench_api.py --speed 4 --baseline bench/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import websockets
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / 'backend'
+
+POLLING_PAGES = [
+    # (operation, path, interval seconds) as in the frontend pages
+    ('dashboard_status', '/api/status', 8),
+    ('alerts', '/api/alerts', 5),
+    ('storage', '/api/storage', 10),
+    ('capacity', '/api/capacity', 15),
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, op: str, seconds: float, ok: bool = True):
+        self.latencies.setdefault(op, []).append(seconds * 1000)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        results = {}
+        for op, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            results[op] = {
+                'count': len(ordered),
+                'errors': self.errors.get(op, 0),
+                'throughput_rps': round(len(ordered) / elapsed, 3),
+                'p50_ms': round(percentile(ordered, 50), 3),
+                'p95_ms': round(percentile(ordered, 95), 3),
+                'p99_ms': round(percentile(ordered, 99), 3),
+                'max_ms': round(ordered[-1], 3),
+            }
+        return results
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def timed_get(client, recorder, op, path):
+    start = time.perf_counter()
+    try:
+        response = await client.get(path)
+        ok = response.status_code < 400
+        await response.aread()
+    except httpx.HTTPError:
+        ok = False
+    recorder.record(op, time.perf_counter() - start, ok)
+
+
+async def poller(client, recorder, op, path, interval, stop, rng):
+    await asyncio.sleep(rng.uniform(0, interval))
+    while not stop.is_set():
+        await timed_get(client, recorder, op, path)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def dashboard_mount(client, recorder):
+    await asyncio.gather(
+        timed_get(client, recorder, 'dashboard_mount_status', '/api/status'),
+        timed_get(client, recorder, 'dashboard_mount_report', '/api/reports/daily'),
+    )
+
+
+async def ws_subscriber(ws_url, recorder, stop):
+    start = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, open_timeout=10) as ws:
+            recorder.record('ws_connect', time.perf_counter() - start)
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    continue
+                frame = json.loads(message)
+                sent_at = datetime.fromisoformat(frame['last_update'])
+                lag = (datetime.now(timezone.utc) - sent_at).total_seconds()
+                recorder.record('ws_frame_lag', max(lag, 0.0))
+    except (OSError, websockets.WebSocketException):
+        recorder.record('ws_connect', time.perf_counter() - start, ok=False)
+
+
+async def login_bursts(client, recorder, size, interval, stop):
+    credentials = {'email': 'farmer@khetbox.com', 'password': 'farmer123'}
+
+    async def one():
+        start = time.perf_counter()
+        try:
+            response = await client.post('/api/auth/login', json=credentials)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        recorder.record('login', time.perf_counter() - start, ok)
+
+    while not stop.is_set():
+        await asyncio.gather(*(one() for _ in range(size)))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_mix(base_url, args):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        # Make sure today's report exists before PDF exports start
+        await client.get('/api/reports/daily')
+
+        tasks = []
+        for _ in range(args.users):
+            await dashboard_mount(client, recorder)
+            for op, path, interval in POLLING_PAGES:
+                tasks.append(poller(client, recorder, op, path, interval / args.speed, stop, rng))
+
+        ws_url = base_url.replace('http', 'ws', 1) + '/ws/sensors'
+        tasks.extend(ws_subscriber(ws_url, recorder, stop) for _ in range(args.ws_clients))
+        if args.login_burst:
+            tasks.append(login_bursts(client, recorder, args.login_burst, args.login_interval / args.speed, stop))
+        if args.pdf_interval:
+            tasks.append(poller(client, recorder, 'pdf_export', '/api/reports/export-pdf',
+                                args.pdf_interval / args.speed, stop, rng))
+
+        started = time.perf_counter()
+        running = [asyncio.create_task(t) for t in tasks]
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*running, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+    return recorder.summary(elapsed), elapsed
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port):
+    env = dict(os.environ)
+    if args.mongo_url:
+        env['MONGO_URL'] = args.mongo_url
+        env['DB_NAME'] = args.db_name
+        cmd = [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1',
+               '--port', str(port), '--log-level', 'warning']
+        cwd = BACKEND_DIR
+    else:
+        cmd = [sys.executable, str(BENCH_DIR / 'mock_server.py'), '--port', str(port)]
+        cwd = BENCH_DIR
+    return subprocess.Popen(cmd, cwd=cwd, env=env)
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(base_url + '/api/', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for op, base in baseline['results'].items():
+        current = results.get(op)
+        if current is None:
+            regressions.append(f"{op}: missing from this run")
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            # Ignore sub-millisecond noise on very fast operations
+            if current[key] > base[key] * (1 + tolerance) and current[key] - base[key] > 1.0:
+                regressions.append(f"{op}: {key} {base[key]} -> {current[key]}")
+        if current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{op}: throughput {base['throughput_rps']} -> {current['throughput_rps']} rps")
+        base_rate = base['errors'] / base['count'] if base['count'] else 0
+        rate = current['errors'] / current['count'] if current['count'] else 0
+        if rate > base_rate + 0.01:
+            regressions.append(f"{op}: error rate {base_rate:.2%} -> {rate:.2%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the KhetBox API")
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load after warm-up')
+    parser.add_argument('--speed', type=float, default=1.0, help='divide the real polling intervals by this')
+    parser.add_argument('--users', type=int, default=20, help='simulated app users (each opens every page)')
+    parser.add_argument('--ws-clients', type=int, default=50)
+    parser.add_argument('--login-burst', type=int, default=20, help='concurrent logins per burst (0 to disable)')
+    parser.add_argument('--login-interval', type=float, default=30)
+    parser.add_argument('--pdf-interval', type=float, default=20, help='seconds between PDF exports (0 to disable)')
+    parser.add_argument('--max-connections', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mongo-url', help='benchmark against this MongoDB instead of mongomock')
+    parser.add_argument('--db-name', default='khetbox_bench')
+    parser.add_argument('--url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--out', default=str(BENCH_DIR / 'results.json'))
+    parser.add_argument('--baseline', help='saved result to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        process = start_server(args, port)
+    try:
+        wait_until_up(base_url, process) if process else None
+        results, elapsed = asyncio.run(run_mix(base_url, args))
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': 'mongodb' if args.mongo_url else 'mongomock',
+            'elapsed_s': round(elapsed, 3),
+            'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline', 'mongo_url')},
+        },
+        'results': results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+
+    print(f"{'operation':<24}{'count':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for op, r in results.items():
+        print(f"{op:<24}{r['count']:>8}{r['errors']:>6}{r['throughput_rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
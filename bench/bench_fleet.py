@@ -0,0 +1,97 @@
+"""
+Time /api/fleet/summary's aggregation for a 5k-device fleet.
+
+Seeds DEVICES devices with 24 hourly rollups each, a few alerts and
+inventory totals, then times ``fleet_summary`` uncached with 1 shard and
+with FLEET_SHARDS shards, and a cached read. Runs against mongomock by
+default; pass --mongo-url to measure a real MongoDB (the seeded database
+is dropped afterwards). The target is under a second on MongoDB.
+
+Mongomock is only good for checking the bench runs (try --devices 300): it
+evaluates every pipeline in Python on the event loop without using indexes,
+so each shard scans the whole collection and more shards is slower there.
+
+    python bench/bench_fleet.py --devices 5000 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+import fleet
+from indexes import INDEXES, ensure_indexes
+
+
+async def seed(db, devices: int, now: datetime):
+    rng = random.Random(0)
+    ids = [f"khetbox-{i:05d}" for i in range(devices)]
+    await db.sensors.insert_many([{"device_id": d, "storage_used": rng.uniform(30, 95)} for d in ids])
+    await db.inventory_totals.insert_many(
+        [{"device_id": d, "capacity_kg": 1000, "used_kg": rng.randint(100, 1000)} for d in ids[::3]])
+    rollups, alerts = [], []
+    for d in ids:
+        for h in range(1, 25):
+            count = 450
+            temp_max = rng.gauss(6.5, 1.5)
+            battery_min = rng.uniform(15, 90)
+            rollups.append({
+                "device_id": d, "hour": now - timedelta(hours=h), "count": count,
+                "temperature": {"sum": 4.8 * count, "min": 3.0, "max": temp_max},
+                "humidity": {"sum": 60.0 * count, "min": 50.0, "max": 70.0},
+                "battery": {"sum": (battery_min + 5) * count, "min": battery_min, "max": battery_min + 10},
+            })
+        for _ in range(rng.randint(0, 4)):
+            alerts.append({"device_id": d, "severity": rng.choice(["critical", "warning"]),
+                           "timestamp": now - timedelta(minutes=rng.randint(1, 24 * 60))})
+    for i in range(0, len(rollups), 20_000):
+        await db.hourly_rollups.insert_many(rollups[i:i + 20_000])
+    await db.alerts.insert_many(alerts)
+    await ensure_indexes(db, [s for s in INDEXES if s.collection in ("sensors", "alerts", "hourly_rollups", "inventory_totals")])
+
+
+async def timed(label, fn, repeat=2):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = await fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<28} {best * 1000:8.1f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--mongo-url", default=None)
+    args = parser.parse_args()
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, maxPoolSize=64)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    db = client["khetbox_bench_fleet"]
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    try:
+        t0 = time.perf_counter()
+        await seed(db, args.devices, now)
+        print(f"seeded {args.devices} devices in {time.perf_counter() - t0:.1f} s ({'MongoDB' if args.mongo_url else 'mongomock'})")
+
+        await timed("uncached, 1 shard", lambda: fleet.fleet_summary(db, 24, shards=1))
+        summary = await timed(f"uncached, {fleet.FLEET_SHARDS} shards", lambda: fleet.fleet_summary(db, 24))
+        fleet.cache.put(24, summary)
+        await timed("cached + ranking", lambda: asyncio.sleep(0, fleet.rank(fleet.cache.get(24)["device_metrics"], 10)), repeat=100)
+        print(f"devices ranked: {summary['devices']}, with excursions: {summary['fleet']['devices_with_excursions']}")
+    finally:
+        if args.mongo_url:
+            await client.drop_database("khetbox_bench_fleet")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
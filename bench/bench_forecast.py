@@ -0,0 +1,70 @@
+"""
+Battery forecaster at fleet scale.
+
+Fits DEVICES devices from 24 hours of one-a-minute readings in one
+vectorized pass (the startup history load), then times one fleet-wide
+incremental step (a reading from every device), per-reading updates for a
+single device and a forecast for the whole fleet.
+
+    python bench/bench_forecast.py [devices]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from forecast import FleetBatteryForecaster
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+MINUTES = 24 * 60
+
+
+def main():
+    rng = np.random.default_rng(0)
+    start = np.datetime64("2026-01-01T00:00", "m")
+    ids = np.repeat(np.array([f"khetbox-{d:05d}" for d in range(DEVICES)], dtype=object), MINUTES)
+    stamps = np.tile(start + np.arange(MINUTES), DEVICES)
+    solar = np.tile((np.arange(MINUTES) // 60) % 24 < 12, DEVICES)
+    drain = rng.uniform(1, 6, DEVICES)[:, None]
+    steps = np.where(solar.reshape(DEVICES, MINUTES), 4.0, -drain) / 60 + rng.normal(0, 0.02, (DEVICES, MINUTES))
+    battery = np.clip(50 + np.cumsum(steps, axis=1), 0, 100).ravel()
+
+    forecaster = FleetBatteryForecaster()
+    t0 = time.perf_counter()
+    forecaster.fit(ids, stamps, battery, solar)
+    fit_s = time.perf_counter() - t0
+
+    device_ids = [f"khetbox-{d:05d}" for d in range(DEVICES)]
+    now = start + MINUTES
+    t0 = time.perf_counter()
+    forecaster.update(device_ids, np.full(DEVICES, now), battery.reshape(DEVICES, MINUTES)[:, -1] - 0.05,
+                      np.zeros(DEVICES, dtype=bool))
+    step_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for i in range(1000):
+        forecaster.update(["khetbox-00000"], np.array([now + 1 + i]), [40.0 - i * 0.01], [False])
+    single_us = (time.perf_counter() - t0) / 1000 * 1e6
+
+    t0 = time.perf_counter()
+    forecasts = forecaster.forecast()
+    forecast_ms = (time.perf_counter() - t0) * 1000
+
+    dark = sum(1 for f in forecasts if f["hours_to_critical_on_battery"] is not None
+               and f["hours_to_critical_on_battery"] < 12)
+    state_bytes = sum(a.nbytes for a in (forecaster.sxy, forecaster.sxx, forecaster.sx, forecaster.last_hours,
+                                         forecaster.last_battery, forecaster.last_solar))
+    print(f"devices:                 {DEVICES}")
+    print(f"history fit:             {fit_s:.2f} s for {len(ids):,} readings")
+    print(f"fleet step:              {step_ms:.1f} ms for one reading from every device")
+    print(f"single reading:          {single_us:.1f} µs")
+    print(f"fleet forecast:          {forecast_ms:.1f} ms")
+    print(f"dark within 12 h on battery: {dark}")
+    print(f"state:                   {state_bytes / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
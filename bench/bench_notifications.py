@@ -0,0 +1,138 @@
+"""
+Throughput and latency of the notification dispatcher at 10k alerts per minute.
+
+Alerts from DEVICES devices go to RECIPIENTS recipients, each subscribed to
+a slice of the fleet. The fake sink takes SINK_LATENCY per send and fails
+FAIL_RATE of them, so the retry path is exercised too. Two runs:
+
+- burst: all alerts submitted at once; time until every one has been routed
+  and every resulting message sent;
+- paced: alerts submitted at RATE per minute for SECONDS seconds, with a
+  short digest window; reports submit-to-delivery latency for critical
+  (immediate) and warning (digested) alerts, and how many messages
+  recipients actually received.
+
+    python bench/bench_notifications.py
+"""
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from notifications import FakeSink, NotificationDispatcher, Recipient
+
+DEVICES = 500
+RECIPIENTS = 100
+ALERTS = 10_000
+RATE = 10_000  # per minute
+SECONDS = 10
+DIGEST_SECONDS = 2.0
+SINK_LATENCY = 0.02
+FAIL_RATE = 0.01
+ALERT_TYPES = ["temperature", "humidity", "battery", "door", "anomaly:temperature:zscore", "spoilage:A:rice"]
+
+
+class TimingSink(FakeSink):
+    def __init__(self, submitted, latencies, **kwargs):
+        super().__init__(**kwargs)
+        self.submitted = submitted
+        self.latencies = latencies
+
+    async def send(self, recipient, message):
+        await super().send(recipient, message)
+        now = time.perf_counter()
+        for a in message["alerts"]:
+            self.latencies[a["severity"]].append(now - self.submitted[a["id"]])
+
+
+def make_recipients(digest_seconds):
+    per = DEVICES // RECIPIENTS * 2  # each device has two recipients
+    recipients = []
+    for i in range(RECIPIENTS):
+        start = (i // 2) * per % DEVICES
+        devices = tuple(f"khetbox-{d:04d}" for d in range(start, start + per))
+        recipients.append(Recipient(f"r{i}", "fake", f"+91{i:010d}", digest_seconds=digest_seconds, devices=devices))
+    return recipients
+
+
+def make_alert(rng):
+    return {
+        "id": str(uuid.uuid4()),
+        "type": rng.choice(ALERT_TYPES),
+        "severity": "critical" if rng.random() < 0.1 else "warning",
+        "message": "Temperature Warning: 8.4°C approaching limit",
+        "timestamp": datetime.now(timezone.utc),
+        "acknowledged": False,
+    }
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    q = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return f"p50 {q[49] * 1000:8.1f} ms  p99 {q[98] * 1000:8.1f} ms  (n={len(values)})"
+
+
+async def burst():
+    rng = random.Random(1)
+    submitted, latencies = {}, {"critical": [], "warning": []}
+    sink = TimingSink(submitted, latencies, latency=SINK_LATENCY, fail_rate=FAIL_RATE)
+    dispatcher = NotificationDispatcher(make_recipients(0.0), [sink], concurrency=64, dedup_seconds=0)
+    worker = asyncio.create_task(dispatcher._consume())
+
+    alerts = [(f"khetbox-{rng.randrange(DEVICES):04d}", make_alert(rng)) for _ in range(ALERTS)]
+    start = time.perf_counter()
+    for device_id, a in alerts:
+        submitted[a["id"]] = time.perf_counter()
+        dispatcher.submit(device_id, [a])
+    submit_s = time.perf_counter() - start
+    await dispatcher.drain()
+    total_s = time.perf_counter() - start
+    worker.cancel()
+
+    print(f"burst: {ALERTS} alerts, {RECIPIENTS} recipients, sink {SINK_LATENCY * 1000:.0f} ms, {FAIL_RATE:.0%} failing")
+    print(f"  submit   {submit_s * 1000:8.1f} ms  ({ALERTS / submit_s:,.0f} alerts/s)")
+    print(f"  delivered in {total_s:6.2f} s  ({ALERTS / total_s:,.0f} alerts/s), "
+          f"{len(sink.sent)} messages sent, {len(dispatcher.retries.memory)} queued for retry")
+
+
+async def paced():
+    rng = random.Random(2)
+    submitted, latencies = {}, {"critical": [], "warning": []}
+    sink = TimingSink(submitted, latencies, latency=SINK_LATENCY, fail_rate=FAIL_RATE)
+    dispatcher = NotificationDispatcher(make_recipients(DIGEST_SECONDS), [sink], concurrency=64, tick=0.1)
+    runner = asyncio.create_task(dispatcher.run())
+
+    count = RATE * SECONDS // 60
+    interval = 60 / RATE
+    start = time.perf_counter()
+    for i in range(count):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        a = make_alert(rng)
+        submitted[a["id"]] = time.perf_counter()
+        dispatcher.submit(f"khetbox-{rng.randrange(DEVICES):04d}", [a])
+    await asyncio.sleep(DIGEST_SECONDS + 0.5)
+    await dispatcher.flush(time.monotonic(), force=True)
+    await dispatcher.drain()
+    runner.cancel()
+
+    delivered = len(latencies["critical"]) + len(latencies["warning"])
+    print(f"paced: {RATE:,} alerts/min for {SECONDS} s ({count} alerts), digest window {DIGEST_SECONDS} s")
+    print(f"  critical {percentiles(latencies['critical'])}")
+    print(f"  warning  {percentiles(latencies['warning'])}")
+    print(f"  {delivered} alert notifications in {len(sink.sent)} messages "
+          f"({delivered / max(len(sink.sent), 1):.1f} alerts/message), "
+          f"{len(dispatcher.retries.memory)} queued for retry")
+
+
+if __name__ == "__main__":
+    asyncio.run(burst())
+    asyncio.run(paced())
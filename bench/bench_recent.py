@@ -0,0 +1,72 @@
+"""
+Memory and speed of the in-memory recent-readings windows at fleet scale.
+
+Fills DEVICES windows with 24 hours of one-a-minute readings, then reports
+the array memory (nbytes), the process RSS growth, append throughput and
+the time for a one-hour and a 24-hour stats query on one device.
+
+    python bench/bench_recent.py [devices]
+"""
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from recent import RecentReadings
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+HOURS = 24
+APPEND_SAMPLE = 200  # devices whose appends are timed one by one
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    now = datetime(2026, 1, 2, tzinfo=timezone.utc)
+    start = now - timedelta(hours=HOURS)
+    minutes = HOURS * 60
+    rng = np.random.default_rng(0)
+    temps = np.round(4.4 + rng.normal(0, 0.5, minutes), 1).tolist()
+    readings = [{"temperature": t, "humidity": 60.0, "battery": 80.0} for t in temps]
+    stamps = [start + timedelta(minutes=i) for i in range(minutes)]
+    seconds = np.array([int(ts.timestamp()) for ts in stamps], dtype=np.uint32)
+
+    before = rss_mb()
+    fleet = RecentReadings(hours=HOURS, resolution=60)
+    for d in range(DEVICES):
+        window = fleet.append(f"dev-{d}", stamps[0], readings[0])
+        # Fill the buffers directly (the minutes map to slots in order); appends are timed below
+        window.timestamps[:] = seconds
+        window.values[:, 0] = temps
+        window.values[:, 1:] = (60.0, 80.0)
+    after = rss_mb()
+
+    t0 = time.perf_counter()
+    for d in range(APPEND_SAMPLE):
+        for ts, reading in zip(stamps, readings):
+            fleet.append(f"dev-{d}", ts, reading)
+    append_us = (time.perf_counter() - t0) / (APPEND_SAMPLE * minutes) * 1e6
+
+    window = fleet.get("dev-0")
+    for label, since in (("1h", now - timedelta(hours=1)), ("24h", start)):
+        t0 = time.perf_counter()
+        for _ in range(100):
+            window.stats(since)
+        print(f"stats {label:>3}: {(time.perf_counter() - t0) / 100 * 1000:.3f} ms per query")
+
+    print(f"devices:           {DEVICES}")
+    print(f"slots per device:  {window.capacity}")
+    print(f"array memory:      {fleet.nbytes / 2**20:.1f} MiB ({fleet.nbytes / DEVICES / 1024:.1f} KiB per device)")
+    print(f"peak RSS growth:   {after - before:.1f} MiB")
+    print(f"append:            {append_us:.2f} µs per reading")
+
+
+if __name__ == "__main__":
+    main()
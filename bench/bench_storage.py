@@ -0,0 +1,139 @@
+"""
+Compare ingest and daily-report latency of the SQLite and MongoDB stores.
+
+Ingests READINGS readings for one device (the default is a day at the 8 s
+sensor clock) through the same calls as persist_reading: a sensor upsert
+plus a reading insert each. It then times the report of the day 12 hours
+ago, which the readings cover: each store's scheduler pass (rollups and
+materialization on MongoDB, a rebuild from the readings on SQLite) and
+the read of the stored report. Both stores also build a report for
+another timezone.
+
+MongoDB is mongomock unless --mongo-url is given (the bench database is
+dropped afterwards). Mongomock runs in Python on the event loop, so its
+numbers only show the bench works; compare SQLite against a real mongod.
+
+    python bench/bench_storage.py --readings 10800 --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp(prefix='khetbox-bench-spool-'))
+
+import database
+from indexes import ensure_indexes
+from report_scheduler import ReportScheduler
+from repositories import MongoStore
+from sqlite_store import SQLiteReportScheduler, SQLiteStore
+
+DEVICE = "khetbox-001"
+BENCH_DB = "khetbox_bench_storage"
+
+
+def readings(count: int, now: datetime):
+    rng = random.Random(0)
+    step = timedelta(days=1) / count
+    for i in range(count):
+        yield {
+            "device_id": DEVICE, "timestamp": now - (count - i) * step,
+            "temperature": rng.gauss(4.5, 1.0), "humidity": rng.uniform(55, 70),
+            "battery": rng.uniform(40, 90), "storage_used": 61.0, "solar_active": i % 2 == 0,
+        }
+
+
+def line(label: str, samples):
+    samples = sorted(samples)
+    p95 = samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+    print(f"  {label:<30} p50 {statistics.median(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms"
+          f"   max {samples[-1] * 1000:8.3f} ms")
+
+
+async def sample(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+async def ingest(store, count: int, now: datetime):
+    times = []
+    t0 = time.perf_counter()
+    for reading in readings(count, now):
+        t1 = time.perf_counter()
+        await store.sensors.upsert(DEVICE, {k: v for k, v in reading.items() if k != "timestamp"})
+        await store.readings.insert(reading)
+        times.append(time.perf_counter() - t1)
+    await store.flush()
+    total = time.perf_counter() - t0
+    print(f"  {'ingest':<30} {count / total:8.0f} readings/s")
+    line("ingest, per reading", times)
+
+
+async def bench_sqlite(count: int, now: datetime, repeat: int):
+    day = (now - timedelta(hours=12)).date()
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStore(Path(directory) / "khetbox.db")
+        print(f"SQLite ({store.batch_size} writes per commit)")
+        await store.sensors.set_timezone(DEVICE, "UTC")
+        await ingest(store, count, now)
+        line("scheduler pass (materialize)", await sample(
+            lambda: SQLiteReportScheduler().refresh_device(store, DEVICE, now), 1))
+        line("report, stored read", await sample(lambda: store.reports.daily(DEVICE, day), repeat))
+        line("report, other timezone", await sample(
+            lambda: store.reports.build(DEVICE, day, now, "Asia/Kolkata"), repeat))
+        print(f"  {'database size':<30} {Path(store.path).stat().st_size / 2 ** 20:8.1f} MiB")
+        await store.close()
+
+
+async def bench_mongo(count: int, now: datetime, repeat: int, mongo_url):
+    day = (now - timedelta(hours=12)).date()
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    database.set_client(client)
+    database.db_name = BENCH_DB
+    db = database.get_db()
+    store = MongoStore(database.get_db)
+    print("MongoDB" if mongo_url else "mongomock")
+    try:
+        await ensure_indexes(db)
+        await store.sensors.set_timezone(DEVICE, "UTC")
+        await ingest(store, count, now)
+        line("scheduler pass (materialize)", await sample(lambda: ReportScheduler().refresh_device(db, DEVICE, now), 1))
+        line("report, stored read", await sample(lambda: store.reports.daily(DEVICE, day), repeat))
+        line("report, other timezone", await sample(
+            lambda: store.reports.build(DEVICE, day, now, "Asia/Kolkata"), repeat))
+    finally:
+        if mongo_url:
+            await client.drop_database(BENCH_DB)
+        database.close_client()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readings", type=int, default=10800)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--mongo-url", default=None)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    await bench_sqlite(args.readings, now, args.repeat)
+    await bench_mongo(args.readings, now, args.repeat, args.mongo_url)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+Run server:app against an in-memory MongoDB stand-in for benchmarks.
+
+Swaps the Motor client for mongomock-motor, applies the migrations (seed
+data and indexes) and serves the app with uvicorn. Used by bench_api.py;
+can also be run by hand:
+
+    python bench/mock_server.py --port 8765
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# The real client is never contacted; keep server selection short in case it is
+os.environ.setdefault('MONGO_URL', 'mongodb://127.0.0.1:1/')
+os.environ.setdefault('MONGO_SERVER_SELECTION_TIMEOUT_MS', '200')
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp(prefix='khetbox-bench-spool-'))
+
+
+def install_mock_db():
+    import database
+    from mongomock_motor import AsyncMongoMockClient
+
+    database.set_client(AsyncMongoMockClient())
+    return database.get_db()
+
+
+async def seed(db):
+    from migrations import migrate
+
+    # mongomock can't create time-series collections; a plain one is fine here
+    await db.create_collection('readings')
+    await migrate(db, throttle=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the KhetBox API against mongomock")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    import uvicorn
+    import server
+
+    db = install_mock_db()
+    asyncio.run(seed(db))
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,26 @@ export default function Alerts() {
     }
   }, []);
 
+  const acknowledge = async (filterBody) => {
+    const token = localStorage.getItem("khetbox_token");
+    try {
+      await axios.post(`${API}/alerts/ack`, filterBody, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      fetchAlerts();
+    } catch (error) {
+      console.error("Failed to acknowledge alerts:", error);
+    }
+  };
+
+  const acknowledgeVisible = () => {
+    if (filter === 'critical' || filter === 'warning') {
+      acknowledge({ severity: filter });
+    } else {
+      acknowledge({ ids: filteredAlerts.filter(a => !a.acknowledged).map(a => a.id) });
+    }
+  };
+
   useEffect(() => {
     fetchAlerts();
     const interval = setInterval(fetchAlerts, 5000);
@@ -119,6 +139,10 @@ export default function Alerts() {
               <DropdownMenuItem onClick={() => setFilter('normal')}>Normal</DropdownMenuItem>
             </DropdownMenuContent>
           </DropdownMenu>
+          <Button variant="outline" size="sm" onClick={acknowledgeVisible} data-testid="ack-all-btn">
+            <CheckCircle className="w-4 h-4 mr-2" />
+            Acknowledge All
+          </Button>
           <Button variant="outline" size="sm" onClick={fetchAlerts} data-testid="refresh-alerts-btn">
             <RefreshCw className="w-4 h-4 mr-2" />
             Refresh
@@ -209,10 +233,19 @@ export default function Alerts() {
                       </div>
                       <p className={`${config.text} font-medium`}>{alert.message}</p>
                     </div>
-                    {alert.acknowledged && (
+                    {alert.acknowledged ? (
                       <Badge variant="outline" className="text-slate-400 border-slate-200">
                         Acknowledged
                       </Badge>
+                    ) : (
+                      <Button
+                        variant="ghost"
+                        size="sm"
+                        onClick={() => acknowledge({ ids: [alert.id] })}
+                        data-testid={`ack-${alert.id}`}
+                      >
+                        Acknowledge
+                      </Button>
                     )}
                   </div>
                 </div>
@@ -107,6 +107,15 @@ export default function CCTV() {
             <CardContent className="p-0">
               {/* Video Feed Placeholder */}
               <div className="cctv-feed bg-slate-900 aspect-video relative">
+                {/* Latest snapshot from the health monitor, if any */}
+                {stream.snapshot_url && (
+                  <img
+                    src={`${BACKEND_URL}${stream.snapshot_url}`}
+                    alt={`${stream.name} snapshot`}
+                    className="absolute inset-0 w-full h-full object-cover"
+                    data-testid={`snapshot-${stream.id}`}
+                  />
+                )}
                 {/* Simulated video content */}
                 <div className="absolute inset-0 flex items-center justify-center">
                   <div className="text-center">
@@ -37,8 +37,22 @@ export default function Dashboard() {
   useEffect(() => {
     fetchInitialData();
 
-    // WebSocket connection for real-time updates
+    // WebSocket connection for real-time updates, falling back to
+    // Server-Sent Events where proxies drop WebSockets
     let ws;
+    let events;
+
+    const startEventStream = () => {
+      if (events || typeof EventSource === "undefined") return;
+      // EventSource reconnects by itself and resumes with Last-Event-ID
+      events = new EventSource(`${API}/stream/sensors`);
+      events.addEventListener("sensors", (event) => {
+        setSensorData(JSON.parse(event.data));
+        setConnected(true);
+      });
+      events.onerror = () => setConnected(false);
+    };
+
     try {
       ws = new WebSocket(`${WS_URL}/ws/sensors`);
       
@@ -54,7 +68,8 @@ export default function Dashboard() {
 
       ws.onclose = () => {
         setConnected(false);
-        console.log("WebSocket disconnected");
+        console.log("WebSocket disconnected, switching to event stream");
+        startEventStream();
       };
 
       ws.onerror = (error) => {
@@ -63,25 +78,17 @@ export default function Dashboard() {
       };
     } catch (error) {
       console.error("WebSocket connection failed:", error);
+      startEventStream();
     }
 
-    // Fallback polling if WebSocket fails
-    const pollInterval = setInterval(async () => {
-      if (!connected) {
-        try {
-          const response = await axios.get(`${API}/status`);
-          setSensorData(response.data);
-        } catch (error) {
-          console.error("Polling failed:", error);
-        }
-      }
-    }, 8000);
-
     return () => {
-      if (ws) ws.close();
-      clearInterval(pollInterval);
+      if (ws) {
+        ws.onclose = null;
+        ws.close();
+      }
+      if (events) events.close();
     };
-  }, [fetchInitialData, connected]);
+  }, [fetchInitialData]);
 
   const getTemperatureStatus = (temp) => {
     if (temp > 8) return { color: "text-red-500", bg: "bg-red-50", status: "Critical" };
@@ -116,6 +116,14 @@ export default function Storage() {
                   <div className="flex items-center gap-2">
                     <span className="text-xl">{crop.icon}</span>
                     <span className="font-medium text-slate-700">{crop.name}</span>
+                    {crop.shelf_life && (
+                      <span
+                        className={`text-xs ${crop.shelf_life.risk === "ok" ? "text-slate-400" : "text-red-600 font-medium"}`}
+                        data-testid={`shelf-life-${crop.name.toLowerCase().replace(' ', '-')}`}
+                      >
+                        ~{crop.shelf_life.remaining_days} days left
+                      </span>
+                    )}
                   </div>
                   <span className="text-sm text-slate-500">{crop.quantity} {crop.unit}</span>
                 </div>
@@ -0,0 +1,83 @@
+"""
+Admin access: signup can't grant itself the admin role, and the profiler
+endpoints are admin-only and return collapsed stacks.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp())
+
+import database
+import security
+from routers import auth, ops
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+
+@pytest.fixture
+def client():
+    database.set_client(mongomock_motor.AsyncMongoMockClient())
+    database.set_store(None)
+    database.mongo_breaker.reset()
+    users = dict(security.MOCK_USERS)
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.include_router(ops.router)
+
+    @app.get("/api/busy")
+    def busy():
+        time.sleep(0.05)
+
+    with TestClient(app) as client:
+        yield client
+    security.MOCK_USERS.clear()
+    security.MOCK_USERS.update(users)
+    database.set_store(None)
+
+
+def login(client, email, password):
+    response = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200
+    body = response.json()
+    return body["user"]["role"], {"Authorization": f"Bearer {body['token']}"}
+
+
+def test_signup_ignores_requested_admin_role(client):
+    response = client.post("/api/auth/signup", json={"email": "eve@example.com", "password": "pw", "role": "admin"})
+    assert response.status_code == 200
+    role, headers = login(client, "eve@example.com", "pw")
+    assert role == "farmer"
+    assert client.post("/api/admin/profiler/start", headers=headers).status_code == 403
+    assert client.get("/api/admin/profiler").status_code == 401
+
+    # An admin can create another admin
+    _, admin = login(client, "admin@khetbox.com", "admin123")
+    response = client.post("/api/auth/signup", headers=admin,
+                           json={"email": "ops@example.com", "password": "pw", "role": "admin"})
+    assert response.status_code == 200
+    assert login(client, "ops@example.com", "pw")[0] == "admin"
+    assert client.post("/api/auth/signup", json={"email": "ops@example.com", "password": "x"}).status_code == 400
+
+
+def test_profiler_start_stop(client):
+    _, admin = login(client, "admin@khetbox.com", "admin123")
+    started = client.post("/api/admin/profiler/start?interval_ms=1", headers=admin)
+    assert started.status_code == 200 and started.json()["running"]
+    assert client.post("/api/admin/profiler/start", headers=admin).status_code == 409
+    client.get("/api/busy")
+
+    stopped = client.post("/api/admin/profiler/stop", headers=admin)
+    assert stopped.status_code == 200
+    lines = stopped.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    status = client.get("/api/admin/profiler", headers=admin).json()
+    assert not status["running"] and status["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    assert client.get("/api/admin/loop-blocks", headers=admin).json()["enabled"] is False
@@ -0,0 +1,104 @@
+"""
+Bulk alert acknowledgement, versions and unacknowledged counters, run against mongomock.
+"""
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import alert_state
+
+START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def make_alert(severity, minutes):
+    return {
+        "id": str(uuid.uuid4()),
+        "type": f"test:{severity}:{minutes}",
+        "severity": severity,
+        "message": "test",
+        "device_id": "khetbox-001",
+        "timestamp": START + timedelta(minutes=minutes),
+        "acknowledged": False,
+    }
+
+
+@pytest.fixture
+def db():
+    alert_state.versions = alert_state.AlertVersions()
+    database = mongomock_motor.AsyncMongoMockClient()['khetbox_alert_ack_test']
+    alerts = [make_alert("critical", m) for m in range(0, 30, 10)] + [make_alert("warning", m) for m in range(5, 45, 10)]
+
+    async def seed():
+        update, change = alert_state.stamp_new_alerts("khetbox-001", alerts)
+        await database.alerts.insert_many(alerts)
+        await database.alert_state.update_one({"device_id": "khetbox-001"}, update, upsert=True)
+        alert_state.versions.publish("khetbox-001", change)
+
+    asyncio.run(seed())
+    return database
+
+
+def state(db):
+    return asyncio.run(alert_state.get_state(db, "khetbox-001"))
+
+
+def test_new_alerts_are_counted(db):
+    assert state(db)["unacknowledged"] == {"critical": 3, "warning": 4}
+
+
+def test_ack_by_filter_decrements_counters_once(db):
+    change = asyncio.run(alert_state.acknowledge(
+        db, "khetbox-001", severity="warning", since=START + timedelta(minutes=10)))
+    assert change["count"] == 3
+    assert state(db)["unacknowledged"] == {"critical": 3, "warning": 1}
+
+    # Repeating the same acknowledgement modifies nothing
+    again = asyncio.run(alert_state.acknowledge(
+        db, "khetbox-001", severity="warning", since=START + timedelta(minutes=10)))
+    assert again["count"] == 0
+    assert state(db)["unacknowledged"] == {"critical": 3, "warning": 1}
+
+
+def test_ack_by_ids(db):
+    ids = [a["id"] for a in asyncio.run(db.alerts.find({"severity": "critical"}).to_list(length=None))][:2]
+    change = asyncio.run(alert_state.acknowledge(db, "khetbox-001", ids=ids, acknowledged_by="a@b.c"))
+    assert change["severities"] == {"critical": 2}
+    assert state(db)["unacknowledged"] == {"critical": 1, "warning": 4}
+    acked = asyncio.run(db.alerts.find({"id": {"$in": ids}}).to_list(length=None))
+    assert all(a["acknowledged"] and a["acknowledged_by"] == "a@b.c" for a in acked)
+
+
+def test_changes_since_version(db):
+    before = state(db)["version"]
+    change = asyncio.run(alert_state.acknowledge(db, "khetbox-001", severity="critical"))
+    assert change["version"] > before
+    assert state(db)["version"] == change["version"]
+
+    changed = asyncio.run(db.alerts.find({"version": {"$gt": before}}).to_list(length=None))
+    assert sorted(a["severity"] for a in changed) == ["critical"] * 3
+
+    version, delta = alert_state.versions.changes_since("khetbox-001", before)
+    assert version == change["version"]
+    assert [c["op"] for c in delta] == ["ack"]
+
+
+def test_changes_since_evicted_version_asks_for_refetch():
+    versions = alert_state.AlertVersions(log_size=2)
+    for _ in range(3):
+        v = versions.next_version("d")
+        versions.publish("d", {"version": v, "op": "new"})
+    assert versions.changes_since("d", 0)[1] is None
+    assert len(versions.changes_since("d", v - 1)[1]) == 1
+
+
+def test_rebuild_state_recounts(db):
+    asyncio.run(db.alert_state.delete_many({}))
+    assert state(db)["unacknowledged"] == {"critical": 3, "warning": 4}
@@ -0,0 +1,66 @@
+"""
+Streaming anomaly detector: stuck sensors, level shifts and rapid changes are
+flagged, and a fleet-wide batch update matches per-device updates.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from anomaly import FleetAnomalyDetector
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def feed(detector, temperatures, minutes=10):
+    found = []
+    for i, temp in enumerate(temperatures):
+        ts = START + timedelta(minutes=minutes * i)
+        found += [(i, a["kind"]) for a in detector.observe("dev", ts, {"temperature": temp, "humidity": 60 + i % 3})]
+    return found
+
+
+def test_stuck_sensor_is_flagged():
+    rng = np.random.default_rng(1)
+    temps = list(np.round(4.4 + rng.normal(0, 0.15, 50), 1)) + [4.4] * 40
+    found = feed(FleetAnomalyDetector(), temps)
+    assert (50 + 29, "flatline") in found
+    assert all(kind != "flatline" for i, kind in found if i < 50)
+
+
+def test_level_shift_inside_thresholds_is_flagged():
+    # Compressor losing hold: 3°C becomes 4.5°C, still well under the 6°C warning
+    rng = np.random.default_rng(2)
+    steady = 3.0 + rng.normal(0, 0.15, 100)
+    shifted = 4.5 + rng.normal(0, 0.15, 20)
+    found = feed(FleetAnomalyDetector(), np.round(np.concatenate([steady, shifted]), 1))
+    assert not [f for f in found if f[0] < 100]
+    assert any(kind == "zscore" and i >= 100 for i, kind in found)
+
+
+def test_rapid_change_is_flagged():
+    found = feed(FleetAnomalyDetector(), [4.4, 4.5, 4.3, 9.0])
+    assert found == [(3, "rate")]
+
+
+def test_fleet_batch_matches_single_device_updates():
+    rng = np.random.default_rng(3)
+    devices = [f"dev-{i}" for i in range(40)]
+    readings = 5 + rng.normal(0, 1, (60, len(devices), 3))
+    readings[50, 7, 0] = 40.0
+
+    batch, single = FleetAnomalyDetector(), FleetAnomalyDetector()
+    batch_found, single_found = [], []
+    for step in range(len(readings)):
+        ts = START + timedelta(minutes=step)
+        batch_found += batch.update(devices, [ts] * len(devices), readings[step])
+        for d, device in enumerate(devices):
+            single_found += single.observe(device, ts, dict(zip(single.metric_names, readings[step, d])))
+
+    key = lambda a: (a["device_id"], a["metric"], a["kind"], a["value"])
+    assert sorted(map(key, batch_found)) == sorted(map(key, single_found))
+    assert ("dev-7", "temperature", "zscore", 40.0) in map(key, batch_found)
+    np.testing.assert_allclose(batch.mean[:len(devices)], single.mean[:len(devices)])
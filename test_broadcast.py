@@ -0,0 +1,102 @@
+"""
+Shared sensor frame stream: fan-out, Last-Event-ID replay and slow subscribers.
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from broadcast import FrameBroadcaster
+
+
+def counter():
+    state = {"n": 0}
+
+    async def produce():
+        state["n"] += 1
+        return {"n": state["n"]}
+    return produce
+
+
+def publish(frames):
+    return frames.publish(asyncio.run(frames.produce()))
+
+
+def test_frames_are_serialized_once_and_shared():
+    frames = FrameBroadcaster(counter())
+
+    async def main():
+        a, _ = frames.subscribe()
+        b, _ = frames.subscribe()
+        frames.publish(await frames.produce())
+        return await a.get(), await b.get()
+
+    fa, fb = asyncio.run(main())
+    assert fa is fb
+    assert json.loads(fa.payload) == {"n": 1}
+    assert fa.sse == b"id: %d\nevent: sensors\ndata: {\"n\":1}\n\n" % fa.id
+
+
+def test_resume_from_last_event_id():
+    frames = FrameBroadcaster(counter(), replay_size=4)
+    published = [publish(frames) for _ in range(6)]
+    ids = [f.id for f in published]
+    assert ids == list(range(ids[0], ids[0] + 6))
+
+    # Missed frames still in the buffer are replayed
+    assert [f.id for f in frames.since(ids[3])] == ids[4:]
+    # Up to date: nothing to send
+    assert frames.since(ids[-1]) == []
+    # New client, a gap the buffer doesn't cover, or an id from elsewhere: latest frame only
+    assert [f.id for f in frames.since(None)] == ids[-1:]
+    assert [f.id for f in frames.since(ids[0])] == ids[-1:]
+    assert [f.id for f in frames.since(ids[-1] + 100)] == ids[-1:]
+    # The frame just before the oldest buffered one can still resume fully
+    assert [f.id for f in frames.since(ids[1])] == ids[2:]
+
+
+def test_slow_subscriber_drops_oldest_frames():
+    frames = FrameBroadcaster(counter(), queue_size=2)
+
+    async def main():
+        queue, _ = frames.subscribe()
+        for _ in range(5):
+            frames.publish(await frames.produce())
+        return [json.loads((await queue.get()).payload)["n"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(main()) == [4, 5]
+
+
+def test_unsubscribe():
+    frames = FrameBroadcaster(counter())
+
+    async def main():
+        queue, _ = frames.subscribe()
+        frames.unsubscribe(queue)
+        frames.publish(await frames.produce())
+        return queue.qsize()
+
+    assert asyncio.run(main()) == 0
+
+
+def test_sse_subscribes_only_while_streaming(monkeypatch, tmp_path):
+    monkeypatch.setenv('SPOOL_DIR', str(tmp_path))
+    from routers import sensors
+
+    class Client:
+        async def is_disconnected(self):
+            return False
+
+    async def main():
+        response = await sensors.stream_sensors(Client(), last_event_id=None, resume_from=None)
+        # A client that disconnects before the body starts leaves nothing registered
+        before = len(sensors.frames.subscribers)
+        stream = response.body_iterator
+        first = await stream.__anext__()
+        during = len(sensors.frames.subscribers)
+        await stream.aclose()
+        return before, first, during, len(sensors.frames.subscribers)
+
+    assert asyncio.run(main()) == (0, b"retry: 3000\n\n", 1, 0)
@@ -0,0 +1,129 @@
+"""
+CCTV health monitor against a local fake camera server: statuses, backoff,
+snapshot capture from JPEG and MJPEG endpoints, and LRU eviction.
+"""
+import asyncio
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+from cctv_health import CctvHealthMonitor, SnapshotCache
+
+JPEG = b"\xff\xd8\xff\xe0fake-jpeg-body\xff\xd9"
+
+
+class FakeCamera(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/snapshot.jpg":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.end_headers()
+            self.wfile.write(JPEG)
+        elif self.path == "/mjpeg":
+            # Never-ending MJPEG stream; the probe must stop after the first frame
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+            self.end_headers()
+            try:
+                while True:
+                    self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + JPEG + b"\r\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self.send_response(503)
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def camera_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCamera)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_probe_round_updates_status_and_caches_snapshots(camera_server, tmp_path):
+    db = mongomock_motor.AsyncMongoMockClient()['khetbox_cctv_test']
+    streams = {"cam-jpeg": "/snapshot.jpg", "cam-mjpeg": "/mjpeg", "cam-down": "/down"}
+    monitor = CctvHealthMonitor(SnapshotCache(tmp_path), interval=10, concurrency=2, timeout=2)
+
+    async def scenario():
+        for stream_id, path in streams.items():
+            await db.cctv_streams.insert_one({"device_id": "dev", "id": stream_id, "url": camera_server + path,
+                                              "status": "active", "last_active": None})
+        first = await monitor.run_once(db, "dev")
+        # Nothing is due again until the interval (or the backoff) has passed
+        second = await monitor.run_once(db, "dev")
+        stored = await db.cctv_streams.find({}, {"_id": 0, "id": 1, "status": 1, "last_active": 1}).to_list(None)
+        return first, second, {s["id"]: s for s in stored}
+
+    first, second, stored = asyncio.run(scenario())
+    assert {r["id"]: r["status"] for r in first} == {"cam-jpeg": "active", "cam-mjpeg": "active", "cam-down": "offline"}
+    assert second == []
+    assert stored["cam-down"]["status"] == "offline" and stored["cam-down"]["last_active"] is None
+    assert stored["cam-jpeg"]["last_active"] is not None
+
+    assert monitor.cache.get("cam-jpeg").path.read_bytes() == JPEG
+    assert monitor.cache.get("cam-mjpeg").path.read_bytes() == JPEG
+    assert monitor.cache.get("cam-down") is None
+    assert monitor._backoff("cam-down") == 20
+
+
+def test_snapshot_cache_evicts_least_recently_used(tmp_path):
+    cache = SnapshotCache(tmp_path, max_entries=2)
+    cache.put("a", JPEG)
+    cache.put("b", JPEG)
+    cache.get("a")
+    cache.put("c", JPEG)
+    assert list(cache.entries) == ["a", "c"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.jpg", "c.jpg"]
+
+    reloaded = SnapshotCache(tmp_path, max_entries=2)
+    assert not reloaded.entries
+    reloaded.load()
+    assert set(reloaded.entries) == {"a", "c"}
+
+
+def test_routes_without_a_snapshot_directory(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import database
+    from routers import cctv
+
+    # A path under a regular file can't be created, like a read-only bundle
+    (tmp_path / "file").write_bytes(b"")
+    monkeypatch.setattr(cctv, "SNAPSHOT_DIR", str(tmp_path / "file" / "snapshots"))
+    monkeypatch.setattr(cctv, "_snapshot_cache", None)
+    database.set_client(mongomock_motor.AsyncMongoMockClient())
+    database.set_store(None)
+    database.mongo_breaker.reset()
+    assert asyncio.run(cctv.open_snapshot_cache()) is None
+
+    app = FastAPI()
+    app.include_router(cctv.router)
+    client = TestClient(app)
+    assert client.get("/api/cctv/streams").status_code == 200
+    assert client.get("/api/cctv/streams/cam-inside-01/snapshot").status_code == 404
+
+    monkeypatch.setattr(cctv, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    cache = asyncio.run(cctv.open_snapshot_cache())
+    cache.put("cam-inside-01", JPEG)
+    snapshot = client.get("/api/cctv/streams/cam-inside-01/snapshot")
+    assert snapshot.content == JPEG
+    etag = snapshot.headers["etag"]
+    for header in (etag, f'"other", W/{etag}'):
+        assert client.get("/api/cctv/streams/cam-inside-01/snapshot",
+                          headers={"If-None-Match": header}).status_code == 304
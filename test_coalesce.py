@@ -0,0 +1,110 @@
+"""
+Single-flight coalescing: identical concurrent GETs share one handler run,
+anything that differs in path, query or auth scope doesn't.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import coalesce
+import security
+from coalesce import single_flight
+from security import require_admin
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    async def slow():
+        app.state.calls += 1
+        await asyncio.sleep(0.05)
+
+    @app.get("/data")
+    @single_flight
+    async def data(n: int = Query(1)):
+        await slow()
+        return {"n": n, "call": app.state.calls}
+
+    @app.get("/raw")
+    @single_flight
+    async def raw(request: Request):
+        await slow()
+        return Response(b"raw", media_type="text/plain", headers={"ETag": '"1"'})
+
+    @app.get("/admin")
+    @single_flight
+    async def admin(_: dict = Depends(require_admin)):
+        await slow()
+        return {"secret": True}
+
+    @app.get("/broken")
+    @single_flight
+    async def broken():
+        await slow()
+        raise HTTPException(status_code=503, detail="down")
+
+    return app
+
+
+def gather(app, *requests):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(url, headers=headers or {}) for url, headers in requests))
+    return asyncio.run(run())
+
+
+def test_identical_requests_share_one_run(app):
+    before = coalesce.stats().get("data", {"leaders": 0, "followers": 0})
+    responses = gather(app, *[("/data?n=1", None)] * 20)
+    assert app.state.calls == 1
+    assert {r.content for r in responses} == {b'{"n":1,"call":1}'}
+    assert all(r.headers["content-type"] == "application/json" for r in responses)
+    after = coalesce.stats()["data"]
+    assert after["leaders"] - before["leaders"] == 1
+    assert after["followers"] - before["followers"] == 19
+    assert not coalesce.in_flight
+
+    # Nothing is cached once the run is over
+    gather(app, ("/data?n=1", None))
+    assert app.state.calls == 2
+
+
+def test_different_params_run_separately(app):
+    responses = gather(app, ("/data?n=1", None), ("/data?n=2", None), ("/data?n=1", None))
+    assert app.state.calls == 2
+    assert responses[0].content == responses[2].content != responses[1].content
+
+
+def test_responses_keep_status_and_headers(app):
+    responses = gather(app, *[("/raw", None)] * 5)
+    assert app.state.calls == 1
+    assert all(r.content == b"raw" and r.headers["etag"] == '"1"' for r in responses)
+
+
+def test_auth_runs_per_request_and_scopes_the_key(app):
+    admin = {"Authorization": f"Bearer {security.issue_token('admin@khetbox.com', 'admin')}"}
+    farmer = {"Authorization": f"Bearer {security.issue_token('farmer@khetbox.com', 'farmer')}"}
+    responses = gather(app, ("/admin", admin), ("/admin", farmer), ("/admin", None), ("/admin", admin))
+    assert [r.status_code for r in responses] == [200, 403, 401, 200]
+    assert app.state.calls == 1
+
+    # An admin and an anonymous caller never share a response
+    gather(app, ("/data", admin), ("/data", None), ("/data", farmer))
+    assert app.state.calls == 4
+
+
+def test_errors_reach_every_waiter(app):
+    responses = gather(app, *[("/broken", None)] * 4)
+    assert app.state.calls == 1
+    assert [r.status_code for r in responses] == [503] * 4
+    assert not coalesce.in_flight
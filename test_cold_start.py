@@ -0,0 +1,55 @@
+"""
+Guard the serverless cold start of the API.
+
+Imports the app in a fresh interpreter with ``python -X importtime`` and
+checks that the heavy dependencies (reportlab, bcrypt, Motor) are only
+loaded when a request needs them, that each router imports on its own, and
+that the whole import stays under IMPORT_BUDGET_MS (default 1200 ms, about
+twice the measured import time).
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).parent / 'backend'
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', '1200'))
+
+LAZY_MODULES = ['reportlab', 'bcrypt', 'motor.motor_asyncio']
+ROUTERS = ['alerts', 'auth', 'cctv', 'fleet', 'ops', 'reports', 'sensors', 'storage']
+
+
+def import_times(statement):
+    # An unreachable URL proves nothing at import time tries to connect
+    env = dict(os.environ, MONGO_URL='mongodb://127.0.0.1:1/')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def test_server_import_defers_heavy_modules():
+    times = import_times('import server')
+
+    loaded = [name for name in LAZY_MODULES if name in times]
+    assert not loaded, f"Imported at cold start: {loaded}"
+
+    total_ms = times['server'] / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"import server took {total_ms:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)"
+
+
+@pytest.mark.parametrize('router', ROUTERS)
+def test_router_imports_independently(router):
+    times = import_times(f'import routers.{router}')
+    assert f'routers.{router}' in times
+    assert 'server' not in times
@@ -0,0 +1,91 @@
+"""
+Circuit breaker: trips after consecutive connection failures only, short-
+circuits while open, and the probe closes it again.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from db_health import CircuitBreaker, CircuitOpenError, mongo_client_options
+
+
+class Probe:
+    def __init__(self):
+        self.up = False
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if not self.up:
+            raise AutoReconnect("no primary")
+
+
+async def call(breaker, exc=None):
+    async with breaker:
+        if exc is not None:
+            raise exc
+
+
+def test_trips_after_consecutive_connection_failures():
+    breaker = CircuitBreaker(Probe(), failure_threshold=3)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(AutoReconnect):
+                await call(breaker, AutoReconnect("down"))
+        # A success resets the count; query errors don't count at all
+        await call(breaker)
+        for _ in range(5):
+            with pytest.raises(OperationFailure):
+                await call(breaker, OperationFailure("bad query"))
+        assert breaker.state == "closed"
+        for _ in range(3):
+            with pytest.raises(AutoReconnect):
+                await call(breaker, AutoReconnect("down"))
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await call(breaker)
+
+    asyncio.run(scenario())
+    stats = breaker.stats()
+    assert stats["trips"] == 1 and stats["short_circuited"] == 1 and not stats["ready"]
+
+
+def test_probe_closes_the_breaker_and_sets_ready():
+    probe = Probe()
+    breaker = CircuitBreaker(probe, probe_interval=0.01)
+
+    async def scenario():
+        # Startup check: unreachable database opens the breaker
+        assert not await breaker.check()
+        assert breaker.state == "open" and not breaker.ready
+        loop = asyncio.create_task(breaker.probe_loop())
+        await asyncio.sleep(0.05)
+        assert breaker.state == "open"
+        probe.up = True
+        await asyncio.sleep(0.05)
+        calls = probe.calls
+        await asyncio.sleep(0.05)
+        loop.cancel()
+        # The probe only pings while open
+        return calls, probe.calls
+
+    calls, later = asyncio.run(scenario())
+    assert breaker.state == "closed" and breaker.ready
+    assert breaker.consecutive_failures == 0
+    assert calls == later
+    assert breaker.trips == 1
+
+
+def test_client_options_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "10")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "500")
+    options = mongo_client_options()
+    assert options["maxPoolSize"] == 10
+    assert options["waitQueueTimeoutMS"] == 500
+    assert options["serverSelectionTimeoutMS"] == 5000
@@ -0,0 +1,161 @@
+"""
+Door/power interval index: window totals and counts match a brute-force
+scan, and readings turn into the right intervals.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp())
+
+import database
+from events import EventTracker, IntervalIndex, event_writes, load_history
+from repositories import MongoEvents
+from spool import WriteSpool
+
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def brute_total(intervals, a, b):
+    return sum(max(0.0, min(e, b) - max(s, a)) for s, e in intervals)
+
+
+def test_window_queries_match_brute_force():
+    rng = random.Random(5)
+    index, intervals, t = IntervalIndex(), [], 0.0
+    for _ in range(500):
+        t += rng.uniform(0, 600)
+        end = t + rng.uniform(1, 900)
+        index.add(t, end)
+        intervals.append((t, end))
+        t = end
+    index.open(t + 100)
+
+    for _ in range(300):
+        a = rng.uniform(-1000, t + 2000)
+        b = a + rng.uniform(0, 50000)
+        now = t + 1000
+        expected = brute_total(intervals + [(t + 100, now)], a, b)
+        assert index.total(a, b, now=now) == pytest.approx(expected)
+        overlapping = [iv for iv in intervals + [(t + 100, now)] if iv[0] < b and iv[1] > a]
+        assert index.count(a, b, now=now) == len(overlapping)
+
+    index.prune(t / 2)
+    kept = [iv for iv in intervals if iv[1] > t / 2]
+    assert index.total(t / 2, t) == pytest.approx(brute_total(kept, t / 2, t))
+
+
+def test_readings_become_intervals():
+    tracker = EventTracker()
+    door = [False, True, True, False, False, True, False]
+    transitions = []
+    for minute, is_open in enumerate(door):
+        ts = START + timedelta(minutes=10 * minute)
+        transitions += tracker.observe(ts, {"door_open": is_open, "solar_active": True, "battery": 60})
+
+    assert [(t["start"], t["end"]) for t in transitions] == [
+        (START + timedelta(minutes=10), None),
+        (START + timedelta(minutes=10), START + timedelta(minutes=30)),
+        (START + timedelta(minutes=50), None),
+        (START + timedelta(minutes=50), START + timedelta(minutes=60)),
+    ]
+    summary = tracker.summary(START, START + timedelta(days=1), now=START + timedelta(hours=2))
+    assert summary["door_open_seconds"] == 30 * 60
+    assert summary["door_open_events"] == 2
+    assert summary["on_battery_seconds"] == 0
+
+
+def test_spool_replay_of_open_and_close_leaves_one_interval(tmp_path):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    base = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=2)
+    tracker = EventTracker()
+    spool = WriteSpool(tmp_path)
+    # Door opens and closes, the power drops and is still out, all during one outage
+    for minute, (door, solar) in enumerate([(False, True), (True, True), (True, False), (False, False)]):
+        transitions = tracker.observe(base + timedelta(minutes=10 * minute),
+                                      {"door_open": door, "solar_active": solar, "battery": 60})
+        for op, kwargs in event_writes("khetbox-001", transitions):
+            spool.append("events", op, **kwargs)
+    db = mongomock_motor.AsyncMongoMockClient()["khetbox"]
+
+    async def scenario():
+        await spool.replay(db)
+        restored = EventTracker()
+        loaded = await load_history(MongoEvents(lambda: db), restored, "khetbox-001")
+        return loaded, await db.events.find({}, {"_id": 0}).sort("start", 1).to_list(length=None), restored
+
+    loaded, documents, restored = asyncio.run(scenario())
+    assert loaded == 2
+    assert [(d["kind"], d["end"] is None) for d in documents] == [("door_open", False), ("on_battery", True)]
+    assert documents[0]["duration_seconds"] == 20 * 60
+    assert restored.indexes["door_open"].open_start is None
+    assert restored.indexes["on_battery"].open_start is not None
+
+
+def test_history_load_keeps_readings_observed_meanwhile():
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    database.set_client(mongomock_motor.AsyncMongoMockClient())
+    database.mongo_breaker.reset()
+    db = database.get_db()
+    events = MongoEvents(database.get_db)
+    base = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=3)
+    door = lambda minutes, is_open: (base + timedelta(minutes=minutes),
+                                     {"door_open": is_open, "solar_active": True, "battery": 60})
+
+    async def scenario():
+        # Stored before the restart: a closed door interval, then one left open by the crash
+        await db.events.insert_many([
+            {"device_id": "khetbox-001", "kind": "door_open", "start": base, "end": base + timedelta(minutes=5)},
+            {"device_id": "khetbox-001", "kind": "door_open", "start": base + timedelta(minutes=10), "end": None},
+        ])
+        # Readings arrive before the history load finishes
+        tracker = EventTracker()
+        for minutes, is_open in ((60, False), (70, True), (80, False), (90, True)):
+            transitions = tracker.observe(*door(minutes, is_open))
+            await events.record("khetbox-001", transitions)
+        loaded = await load_history(events, tracker, "khetbox-001")
+        stored = await db.events.find({}, {"_id": 0, "start": 1, "end": 1}).sort("start", 1).to_list(length=None)
+        return tracker, loaded, stored
+
+    tracker, loaded, stored = asyncio.run(scenario())
+    assert loaded == 2
+    index = tracker.indexes["door_open"]
+    minutes = lambda seconds: round((seconds - base.timestamp()) / 60)
+    assert [(minutes(s), minutes(e)) for s, e in zip(index.starts, index.ends)] == [(0, 5), (10, 60), (70, 80)]
+    assert minutes(index.open_start) == 90
+    # The interval left open is closed at the first reading after the restart; only the live one stays open
+    utc = lambda ts: ts and ts.replace(tzinfo=timezone.utc)
+    assert [(utc(d["start"]), utc(d["end"])) for d in stored] == [
+        (base, base + timedelta(minutes=5)),
+        (base + timedelta(minutes=10), base + timedelta(minutes=60)),
+        (base + timedelta(minutes=70), base + timedelta(minutes=80)),
+        (base + timedelta(minutes=90), None),
+    ]
+
+
+def test_daily_limits_reset_at_local_midnight():
+    # 40 minutes of door opening, straddling midnight in India (18:30 UTC)
+    tracker = EventTracker()
+    opened, closed = START + timedelta(hours=18), START + timedelta(hours=18, minutes=40)
+    tracker.observe(opened, {"door_open": True, "solar_active": True, "battery": 60})
+    tracker.observe(closed, {"door_open": False, "solar_active": True, "battery": 60})
+
+    now = START + timedelta(hours=19)
+    assert [a["type"] for a in tracker.alerts(now)] == ["events:door_open:daily"]
+    assert tracker.alerts(now, "Asia/Kolkata") == []
+
+    # Straddling UTC midnight instead: 40 minutes of the local day, 20 of the UTC one
+    tracker = EventTracker()
+    opened = START + timedelta(hours=23, minutes=40)
+    tracker.observe(opened, {"door_open": True, "solar_active": True, "battery": 60})
+    tracker.observe(opened + timedelta(minutes=40), {"door_open": False, "solar_active": True, "battery": 60})
+    now = opened + timedelta(minutes=45)
+    assert tracker.alerts(now) == []
+    assert [a["type"] for a in tracker.alerts(now, "Asia/Kolkata")] == ["events:door_open:daily"]
@@ -0,0 +1,124 @@
+"""
+Fleet summary: per-device metrics from hourly rollups, sharded aggregation
+and the admin endpoint, run against mongomock.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp())
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import database
+import fleet
+import security
+from routers import fleet as fleet_router
+
+NOW = datetime(2024, 6, 2, tzinfo=timezone.utc)
+
+
+def rollup(device_id, hour, temp_max, battery_min, count=4):
+    return {
+        "device_id": device_id, "hour": hour, "count": count,
+        "temperature": {"sum": 5.0 * count, "min": 4.0, "max": temp_max},
+        "humidity": {"sum": 60.0 * count, "min": 60.0, "max": 60.0},
+        "battery": {"sum": (battery_min + 10) * count, "min": battery_min, "max": battery_min + 20},
+    }
+
+
+async def seed(db):
+    devices = [f"khetbox-{i:03d}" for i in range(1, 7)]
+    await db.sensors.insert_many([{"device_id": d, "storage_used": 50 + i} for i, d in enumerate(devices)])
+    rollups = []
+    for i, d in enumerate(devices):
+        for h in range(1, 13):
+            hour = NOW - timedelta(hours=h)
+            # Device i has i excursion hours and a weaker battery the higher i is
+            rollups.append(rollup(d, hour, 9.0 if h <= i else 6.0, 60 - 8 * i))
+    # Outside the 24 h window
+    rollups.append(rollup("khetbox-001", NOW - timedelta(hours=30), 20.0, 5.0))
+    await db.hourly_rollups.insert_many(rollups)
+    await db.alerts.insert_many(
+        [{"device_id": "khetbox-002", "severity": "critical", "timestamp": NOW - timedelta(hours=1)} for _ in range(3)]
+        + [{"device_id": "khetbox-005", "severity": "warning", "timestamp": NOW - timedelta(hours=2)}])
+    await db.inventory_totals.insert_one({"device_id": "khetbox-003", "capacity_kg": 1000, "used_kg": 950})
+
+
+@pytest.fixture
+def db():
+    database_ = mongomock_motor.AsyncMongoMockClient()['khetbox_fleet_test']
+    asyncio.run(seed(database_))
+    return database_
+
+
+def test_device_ranges_cover_every_device_once():
+    ids = [f"d{i:04d}" for i in range(103)]
+    ranges = fleet.device_ranges(ids, 8)
+    assert len(ranges) == 8
+    assert ranges[0][0] == "d0000" and ranges[-1][1] == "d0102"
+    covered = [d for first, last in ranges for d in ids if first <= d <= last]
+    assert sorted(covered) == ids
+    assert fleet.device_ranges(ids[:3], 8) == [("d0000", "d0000"), ("d0001", "d0001"), ("d0002", "d0002")]
+
+
+def test_summary_is_the_same_for_any_shard_count(db):
+    one = asyncio.run(fleet.fleet_summary(db, 24, shards=1, now=NOW))
+    many = asyncio.run(fleet.fleet_summary(db, 24, shards=4, now=NOW))
+    by_device = lambda s: sorted(s["device_metrics"], key=lambda d: d["device_id"])
+    assert by_device(one) == by_device(many)
+    assert one["devices"] == 6
+
+
+def test_rankings(db):
+    summary = asyncio.run(fleet.fleet_summary(db, 24, now=NOW))
+    rankings = fleet.rank(summary["device_metrics"], 3)
+    excursions = rankings["temperature_excursions"]
+    assert [(d["device_id"], d["excursion_hours"]) for d in excursions] == [
+        ("khetbox-006", 5), ("khetbox-005", 4), ("khetbox-004", 3)]
+    assert rankings["battery_health"][0]["device_id"] == "khetbox-006"
+    assert rankings["alert_rate"][0] == {**rankings["alert_rate"][0], "device_id": "khetbox-002",
+                                         "alerts": 3, "critical_alerts": 3, "alerts_per_day": 3.0}
+    # Tracked stock (95%) wins over the sensor's fill estimate
+    assert rankings["capacity_utilization"][0]["device_id"] == "khetbox-003"
+    assert rankings["capacity_utilization"][0]["capacity_utilization"] == 95.0
+    # The rollup 30 hours back is outside the window
+    first = next(d for d in summary["device_metrics"] if d["device_id"] == "khetbox-001")
+    assert first["max_temperature"] == 6.0 and first["hours_reporting"] == 12
+
+
+def test_endpoint_is_admin_only_and_cached(db):
+    client = mongomock_motor.AsyncMongoMockClient()
+    database.set_client(client)
+    asyncio.run(seed(database.get_db()))
+    fleet.cache = fleet.FleetSummaryCache(ttl=60)
+    app = FastAPI()
+    app.include_router(fleet_router.router)
+    http = TestClient(app)
+
+    farmer = security.issue_token("farmer@khetbox.com", "farmer")
+    admin = security.issue_token("admin@khetbox.com", "admin")
+    assert http.get('/api/fleet/summary').status_code == 401
+    assert http.get('/api/fleet/summary', headers={'Authorization': f'Bearer {farmer}'}).status_code == 403
+
+    headers = {'Authorization': f'Bearer {admin}'}
+    first = http.get('/api/fleet/summary?limit=2', headers=headers)
+    assert first.status_code == 200
+    body = first.json()
+    assert body["devices"] == 6
+    assert all(len(r) <= 2 for r in body["rankings"].values())
+    assert "device_metrics" not in body
+
+    # Served from the cache: new alerts don't show until the TTL runs out
+    asyncio.run(database.get_db().alerts.delete_many({}))
+    again = http.get('/api/fleet/summary?limit=2', headers=headers).json()
+    assert again["generated_at"] == body["generated_at"]
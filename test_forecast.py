@@ -0,0 +1,89 @@
+"""
+Battery forecasting: the vectorized fleet fit and the per-reading updates
+agree, and the projected time to critical drives the predictive alert.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from forecast import FleetBatteryForecaster, forecast_alerts
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def history(devices=5, n=400, seed=11):
+    """Readings every 5 minutes; solar for the first 8 hours of each 16, then on battery."""
+    rng = np.random.default_rng(seed)
+    ids, stamps, battery, solar = [], [], [], []
+    for d in range(devices):
+        level = 40.0
+        drain, charge = 2.0 + d, 4.0
+        for i in range(n):
+            sun = (i * 5 // 60) % 16 < 8
+            ids.append(f"dev-{d}")
+            stamps.append(START + timedelta(minutes=5 * i))
+            battery.append(level)
+            solar.append(sun)
+            level = float(np.clip(level + (charge if sun else -drain) / 12 + rng.normal(0, 0.05), 0, 100))
+    return ids, stamps, np.array(battery), np.array(solar)
+
+
+def test_fit_matches_incremental_updates():
+    ids, stamps, battery, solar = history()
+    batch = FleetBatteryForecaster()
+    order = np.random.default_rng(0).permutation(len(ids))
+    batch.fit([ids[i] for i in order], [stamps[i] for i in order], battery[order], solar[order])
+
+    incremental = FleetBatteryForecaster()
+    for i in range(len(ids)):
+        incremental.update([ids[i]], [stamps[i]], [battery[i]], [solar[i]])
+
+    by_device = lambda forecasts: sorted(forecasts, key=lambda f: f["device_id"])
+    assert by_device(batch.forecast()) == by_device(incremental.forecast())
+    rows = [batch.rows[f"dev-{d}"] for d in range(5)]
+    np.testing.assert_allclose(batch.rates(rows), incremental.rates([incremental.rows[f"dev-{d}"] for d in range(5)]), rtol=1e-9)
+
+
+def test_rates_recover_drain_and_charge():
+    ids, stamps, battery, solar = history(devices=3, n=300)
+    forecaster = FleetBatteryForecaster()
+    forecaster.fit(ids, stamps, battery, solar)
+    by_device = {f["device_id"]: f for f in forecaster.forecast()}
+    for d in range(3):
+        f = by_device[f"dev-{d}"]
+        assert f["discharge_rate"] == pytest.approx(-(2.0 + d), abs=0.1)
+        assert f["charge_rate"] == pytest.approx(4.0, abs=0.1)
+        expected = max(f["battery"] - 25, 0) / -f["discharge_rate"]
+        assert f["hours_to_critical_on_battery"] == pytest.approx(expected, abs=0.1)
+
+
+def test_needs_enough_history_before_forecasting():
+    forecaster = FleetBatteryForecaster()
+    f = forecaster.observe("dev", START, {"battery": 50, "solar_active": False})
+    assert f["discharge_rate"] is None and f["hours_to_critical"] is None
+    f = forecaster.observe("dev", START + timedelta(minutes=5), {"battery": 49.5, "solar_active": False})
+    assert f["discharge_rate"] is None  # 5 minutes observed
+
+
+def test_predictive_alert():
+    forecaster = FleetBatteryForecaster()
+    for i in range(13):
+        f = forecaster.observe("dev", START + timedelta(minutes=5 * i), {"battery": 40 - i * 0.5, "solar_active": False})
+    # Draining 6%/hour from 34%: critical in 1.5 hours
+    assert f["discharge_rate"] == pytest.approx(-6.0)
+    assert f["hours_to_critical"] == pytest.approx(1.5)
+    alerts = forecast_alerts(f)
+    assert [(a["type"], a["severity"]) for a in alerts] == [("forecast:battery", "warning")]
+    assert "1.5 hours" in alerts[0]["message"]
+    assert forecast_alerts(f, within_hours=1) == []
+
+    # Once charging there is nothing to predict, but tonight's projection stays
+    f = forecaster.observe("dev", START + timedelta(minutes=65), {"battery": 33.5, "solar_active": True})
+    assert f["hours_to_critical"] is None
+    assert f["hours_to_critical_on_battery"] == pytest.approx(8.5 / 6, abs=0.05)
+    assert forecast_alerts(f) == []
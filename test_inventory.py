@@ -0,0 +1,68 @@
+"""
+Inventory ledger and capacity counters, run against mongomock.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import inventory
+from migrations import migrate
+
+
+@pytest.fixture
+def db():
+    database = mongomock_motor.AsyncMongoMockClient()['khetbox_inventory_test']
+
+    async def seed():
+        await database.create_collection('readings')
+        await migrate(database, throttle=0)
+
+    asyncio.run(seed())
+    return database
+
+
+def totals(db):
+    return asyncio.run(db.inventory_totals.find_one({"device_id": "khetbox-001"}, {"_id": 0}))
+
+
+def test_migration_builds_totals_from_storage(db):
+    view = inventory.capacity_view(totals(db))
+    assert view["total_capacity_kg"] == 2 * inventory.DEFAULT_UNIT_CAPACITY_KG
+    assert view["used_kg"] == 450 + 280 + 180 + 650 + 420 + 220
+    assert [item["name"] for item in view["breakdown"]] == ["Rice", "Tomatoes", "Wheat", "Chillies", "Other"]
+    assert view["breakdown"][-1]["kg"] == 220 + 180
+    assert all(item["kg"] > 0 for item in view["breakdown"])
+
+
+def test_concurrent_stock_out_never_goes_negative(db):
+    async def take(n):
+        results = await asyncio.gather(*(
+            inventory.record_movement(db, "khetbox-001", "Cold Storage Unit A", "Tomatoes", 10, "out")
+            for _ in range(n)
+        ), return_exceptions=True)
+        return [r for r in results if isinstance(r, inventory.InsufficientStock)]
+
+    refused = asyncio.run(take(50))
+    assert len(refused) == 5
+
+    doc = totals(db)
+    assert doc["crops"]["Tomatoes"] == 0
+    assert doc["units"]["Cold Storage Unit A"]["used_kg"] == 280 + 180
+    assert doc == {**asyncio.run(inventory.rebuild_totals(db, "khetbox-001")), "updated_at": doc["updated_at"]}
+
+
+def test_stock_in_respects_unit_capacity(db):
+    asyncio.run(inventory.record_movement(db, "khetbox-001", "Cold Storage Unit A", "Onions", 590, "in", icon="🧅"))
+    with pytest.raises(inventory.CapacityExceeded):
+        asyncio.run(inventory.record_movement(db, "khetbox-001", "Cold Storage Unit A", "Onions", 1, "in"))
+
+    doc = totals(db)
+    assert doc["crops"]["Onions"] == 590
+    assert doc["units"]["Cold Storage Unit A"]["used_kg"] == 1500
+    assert asyncio.run(db.inventory_ledger.count_documents({"crop": "Onions"})) == 1
@@ -0,0 +1,66 @@
+"""
+Metrics: Prometheus text format of each metric type, and the middleware's
+per-route (template, not raw path) latency and status counts.
+"""
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_exposition_format():
+    registry = Registry()
+    requests = registry.register(Counter("t_requests_total", "Requests", ["route"]))
+    depth = registry.register(Gauge("t_depth", "Queue depth", fn=lambda: 7))
+    latency = registry.register(Histogram("t_latency_seconds", "Latency", buckets=(0.1, 1.0)))
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    depth.set(1)  # the callback wins
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    assert registry.render().decode().splitlines() == [
+        "# HELP t_requests_total Requests",
+        "# TYPE t_requests_total counter",
+        't_requests_total{route="/a"} 3',
+        "# HELP t_depth Queue depth",
+        "# TYPE t_depth gauge",
+        "t_depth 7",
+        "# HELP t_latency_seconds Latency",
+        "# TYPE t_latency_seconds histogram",
+        't_latency_seconds_bucket{le="0.1"} 2',
+        't_latency_seconds_bucket{le="1.0"} 3',
+        't_latency_seconds_bucket{le="+Inf"} 4',
+        "t_latency_seconds_sum 3.65",
+        "t_latency_seconds_count 4",
+    ]
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+
+    @app.get("/t-items/{item_id}")
+    async def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(metrics.MetricsMiddleware)
+    client = TestClient(app)
+    for path in ("/t-items/1", "/t-items/2", "/t-items/0", "/t-nowhere/1", "/t-nowhere/2"):
+        client.get(path)
+
+    body = metrics.registry.render().decode()
+    assert 'khetbox_http_responses_total{route="/t-items/{item_id}",method="GET",status="2xx"} 2' in body
+    assert 'khetbox_http_responses_total{route="/t-items/{item_id}",method="GET",status="4xx"} 1' in body
+    assert 'khetbox_http_request_duration_seconds_count{route="/t-items/{item_id}",method="GET"} 3' in body
+    # Unknown paths share one label set instead of adding one per URL
+    assert "/t-nowhere" not in body
+    assert 'route="<unmatched>",method="GET",status="4xx"}' in body
+    assert "khetbox_http_requests_in_flight 0" in body
@@ -0,0 +1,156 @@
+"""
+Notification dispatcher: dedup, digests, priority and retries, using the fake sink.
+"""
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from notifications import FakeSink, NotificationDispatcher, Recipient, RetryQueue, load_recipients
+
+
+def alert(severity, kind="temperature"):
+    return {
+        "id": str(uuid.uuid4()),
+        "type": kind,
+        "severity": severity,
+        "message": f"{kind} {severity}",
+        "timestamp": datetime.now(timezone.utc),
+        "acknowledged": False,
+    }
+
+
+def run(dispatcher, steps):
+    async def main():
+        worker = asyncio.create_task(dispatcher._consume())
+        try:
+            await steps()
+            await dispatcher.drain()
+        finally:
+            worker.cancel()
+    asyncio.run(main())
+
+
+def test_critical_bypasses_digest_and_warnings_are_batched():
+    sink = FakeSink()
+    farmer = Recipient("farmer", "fake", "+910000000000", digest_seconds=600)
+    dispatcher = NotificationDispatcher([farmer], [sink])
+
+    async def steps():
+        dispatcher.submit("khetbox-001", [alert("critical"), alert("warning", "humidity"), alert("warning", "battery")])
+        await dispatcher.drain()
+        assert [m["kind"] for _, m in sink.sent] == ["immediate"]
+        await dispatcher.flush(time.monotonic() + 601)
+
+    run(dispatcher, steps)
+    kinds = [m["kind"] for _, m in sink.sent]
+    assert kinds == ["immediate", "digest"]
+    digest = sink.sent[1][1]
+    assert [a["type"] for a in digest["alerts"]] == ["humidity", "battery"]
+    assert digest["subject"].startswith("[KhetBox] 2 alerts")
+
+
+def test_duplicates_within_window_are_dropped():
+    sink = FakeSink()
+    dispatcher = NotificationDispatcher([Recipient("ops", "fake", "x", digest_seconds=0)], [sink], dedup_seconds=60)
+
+    async def steps():
+        for _ in range(5):
+            dispatcher.submit("khetbox-001", [alert("critical")])
+        dispatcher.submit("khetbox-002", [alert("critical")])
+
+    run(dispatcher, steps)
+    assert sorted(m["alerts"][0]["device_id"] for _, m in sink.sent) == ["khetbox-001", "khetbox-002"]
+
+
+def test_recipient_filters():
+    sink = FakeSink()
+    only_critical = Recipient("owner", "fake", "x", digest_seconds=0, min_severity="critical", devices=("khetbox-002",))
+    dispatcher = NotificationDispatcher([only_critical], [sink])
+
+    async def steps():
+        dispatcher.submit("khetbox-001", [alert("critical")])
+        dispatcher.submit("khetbox-002", [alert("warning"), alert("normal", "door"), alert("critical", "battery")])
+
+    run(dispatcher, steps)
+    assert [m["alerts"][0]["type"] for _, m in sink.sent] == ["battery"]
+
+
+def test_failed_send_is_retried_with_backoff():
+    sink = FakeSink()
+    sink.fail_next = 2
+    dispatcher = NotificationDispatcher([Recipient("ops", "fake", "x", digest_seconds=0)], [sink],
+                                        base_backoff=10, jitter=0, max_attempts=5)
+    assert [dispatcher.backoff(n) for n in (1, 2, 3)] == [10, 20, 40]
+
+    async def steps():
+        dispatcher.submit("khetbox-001", [alert("critical")])
+        await dispatcher.drain()
+        assert sink.sent == []
+        entry, = dispatcher.retries.memory.values()
+        assert entry["attempts"] == 1
+
+        # Not due yet
+        await dispatcher.flush(time.monotonic())
+        await dispatcher.drain()
+        assert dispatcher.retries.memory[entry["id"]]["attempts"] == 1
+
+        for _ in range(2):
+            dispatcher.retries.memory[entry["id"]]["next_attempt"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+            await dispatcher.flush(time.monotonic())
+            await dispatcher.drain()
+
+    run(dispatcher, steps)
+    assert len(sink.sent) == 1
+    assert dispatcher.retries.memory == {}
+
+
+def test_gives_up_after_max_attempts():
+    sink = FakeSink(fail_rate=1.0)
+    dispatcher = NotificationDispatcher([Recipient("ops", "fake", "x", digest_seconds=0)], [sink],
+                                        max_attempts=2, jitter=0)
+
+    async def steps():
+        dispatcher.submit("khetbox-001", [alert("critical")])
+        await dispatcher.drain()
+        entry, = dispatcher.retries.memory.values()
+        entry["next_attempt"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await dispatcher.flush(time.monotonic())
+        await dispatcher.drain()
+
+    run(dispatcher, steps)
+    entry, = dispatcher.retries.memory.values()
+    assert entry["dead"] and entry["attempts"] == 2
+
+
+def test_retries_are_stored_in_mongo():
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    db = mongomock_motor.AsyncMongoMockClient()['khetbox_notify_test']
+    sink = FakeSink()
+    sink.fail_next = 1
+    dispatcher = NotificationDispatcher([Recipient("ops", "fake", "x", digest_seconds=0)], [sink],
+                                        retries=RetryQueue(lambda: db))
+
+    async def steps():
+        dispatcher.submit("khetbox-001", [alert("critical")])
+        await dispatcher.drain()
+        assert dispatcher.retries.memory == {}
+        assert await db.notification_retries.count_documents({"dead": False}) == 1
+        await db.notification_retries.update_many({}, {"$set": {"next_attempt": datetime.now(timezone.utc)}})
+        await dispatcher.flush(time.monotonic())
+
+    run(dispatcher, steps)
+    assert len(sink.sent) == 1
+    assert asyncio.run(db.notification_retries.count_documents({})) == 0
+
+
+def test_load_recipients():
+    recipients = load_recipients('[{"id": "a", "sink": "sms", "address": "+91", "digest_minutes": 5, "devices": ["d1"]}]')
+    assert recipients == [Recipient("a", "sms", "+91", digest_seconds=300, devices=("d1",))]
+    assert load_recipients("") == []
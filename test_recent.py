@@ -0,0 +1,87 @@
+"""
+In-memory recent-readings windows: ring-buffer wraparound, window statistics
+and sustained-condition alerts.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from recent import RecentReadings, RecentWindow, sustained_alerts
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_buffer_wraps_and_keeps_only_the_last_hours():
+    window = RecentWindow(hours=1, resolution=60)
+    assert window.capacity == 60
+    for i in range(150):
+        window.append(START + timedelta(minutes=i), {"temperature": float(i), "humidity": 60, "battery": 80})
+    timestamps, values = window.window(START)
+    assert len(timestamps) == 60
+    assert values[:, 0].tolist() == [float(i) for i in range(90, 150)]
+    assert np.all(np.diff(timestamps.astype(np.int64)) == 60)
+
+
+def test_same_step_keeps_the_newest_reading():
+    window = RecentWindow(hours=1, resolution=60)
+    window.append(START + timedelta(seconds=30), {"temperature": 5.0})
+    window.append(START + timedelta(seconds=10), {"temperature": 9.0})  # late
+    window.append(START + timedelta(seconds=50), {"temperature": 6.0})
+    timestamps, values = window.window(START)
+    assert values[:, 0].tolist() == [6.0]
+    assert np.isnan(values[0, 1])
+
+
+def test_stats_match_numpy():
+    rng = np.random.default_rng(3)
+    temps = np.round(4.4 + rng.normal(0, 0.5, 120), 1)
+    window = RecentWindow(hours=24, resolution=60)
+    for i, t in enumerate(temps):
+        window.append(START + timedelta(minutes=i), {"temperature": t, "humidity": 60.0})
+    stats = window.stats(START + timedelta(minutes=60))
+    expected = temps[60:].astype(np.float32).astype(np.float64)
+    assert stats["count"] == 60
+    assert stats["metrics"]["temperature"]["mean"] == pytest.approx(expected.mean(), abs=0.01)
+    assert stats["metrics"]["temperature"]["max"] == pytest.approx(expected.max(), abs=0.01)
+    assert stats["metrics"]["temperature"]["p95"] == pytest.approx(np.percentile(expected, 95), abs=0.01)
+    assert stats["metrics"]["battery"] is None
+    assert window.stats(START + timedelta(days=2)) is None
+
+
+def test_hourly_points():
+    window = RecentWindow(hours=24, resolution=60)
+    for i in range(90):
+        window.append(START + timedelta(minutes=i), {"temperature": 4.0 if i < 60 else 6.0, "humidity": 60, "battery": 80})
+    points = window.hourly(START, START + timedelta(hours=2))
+    assert [p["hour"] for p in points] == ["00:00", "01:00"]
+    assert [p["temperature"] for p in points] == [4.0, 6.0]
+
+
+def test_sustained_alerts_need_the_whole_period():
+    window = RecentWindow(hours=1, resolution=60)
+    now = START + timedelta(minutes=20)
+    for i in range(5):
+        window.append(now - timedelta(minutes=i), {"temperature": 9.0, "battery": 80})
+    assert sustained_alerts(window, now, minutes=15) == []
+
+    for i in range(15):
+        # One reading back in range doesn't clear it
+        window.append(now - timedelta(minutes=i), {"temperature": 5.0 if i == 7 else 9.0, "battery": 80})
+    alerts = sustained_alerts(window, now, minutes=15)
+    assert [(a["type"], a["severity"]) for a in alerts] == [("sustained:temperature", "critical")]
+
+
+def test_memory_is_preallocated_per_device():
+    fleet = RecentReadings(hours=24, resolution=60)
+    for device in range(10):
+        fleet.append(f"dev-{device}", START, {"temperature": 4.0})
+    per_device = 1440 * (4 + 3 * 4)
+    assert fleet.nbytes == 10 * per_device
+    for i in range(2000):
+        fleet.append("dev-0", START + timedelta(minutes=i), {"temperature": 4.0})
+    assert fleet.nbytes == 10 * per_device
@@ -0,0 +1,147 @@
+"""
+Daily report materialization from hourly rollups, run against mongomock.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import rollups
+import timezones
+from migrations import migrate
+from report_scheduler import ReportScheduler
+
+DAY = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    database = mongomock_motor.AsyncMongoMockClient()['khetbox_reports_test']
+
+    async def seed():
+        await database.create_collection('readings')
+        await migrate(database, throttle=0)
+        await database.reports.delete_many({})
+        await timezones.set_device_timezone(database, "khetbox-001", "UTC")
+        # Two readings every hour from 20:00 the day before until 02:00
+        readings = []
+        for hour in range(-4, 2):
+            for minute, temperature in ((10, 4.0), (40, 6.0)):
+                readings.append({
+                    "device_id": "khetbox-001",
+                    "timestamp": DAY + timedelta(hours=hour, minutes=minute),
+                    "temperature": temperature + (hour == 1),
+                    "humidity": 60.0,
+                    "battery": 80.0,
+                })
+        await database.readings.insert_many(readings)
+
+    asyncio.run(seed())
+    return database
+
+
+def reports(db):
+    return asyncio.run(db.reports.find({}, {"_id": 0}).sort("date", 1).to_list(length=None))
+
+
+def test_rollups_are_idempotent(db):
+    for _ in range(2):
+        asyncio.run(rollups.refresh_hourly(db, "khetbox-001", DAY - timedelta(hours=4), DAY + timedelta(hours=2)))
+    hours = asyncio.run(rollups.load(db, "khetbox-001", DAY - timedelta(days=1), DAY + timedelta(days=1)))
+    assert len(hours) == 6
+    assert all(h["count"] == 2 for h in hours)
+    combined = rollups.combine(hours)
+    assert combined["temperature"]["mean"] == pytest.approx((5.0 * 6 + 1) * 2 / 12)
+    assert combined["temperature"]["max"] == 7.0
+
+
+def test_pass_closes_previous_day_and_refreshes_today(db):
+    scheduler = ReportScheduler()
+    now = DAY + timedelta(hours=1, minutes=50)
+    written = asyncio.run(scheduler.refresh_device(db, "khetbox-001", now))
+    assert written == ["2024-05-31", "2024-06-01"]
+
+    yesterday, today = reports(db)
+    assert yesterday["final"] and not today["final"]
+    assert [p["hour"] for p in yesterday["hourly_data"]] == ["20:00", "21:00", "22:00", "23:00"]
+    assert yesterday["summary"]["avg_temperature"] == 5.0
+    assert today["summary"]["max_temperature"] == 7.0
+    # Both elapsed hours of today have readings
+    assert today["summary"]["uptime_percentage"] == 100.0
+
+
+def test_repeated_passes_upsert_without_duplicates(db):
+    scheduler = ReportScheduler()
+    asyncio.run(scheduler.refresh_device(db, "khetbox-001", DAY + timedelta(minutes=30)))
+    assert scheduler.watermarks["khetbox-001"] == DAY
+
+    later = DAY + timedelta(hours=1, minutes=50)
+    asyncio.run(db.readings.insert_one({
+        "device_id": "khetbox-001", "timestamp": DAY + timedelta(hours=1, minutes=45),
+        "temperature": 10.0, "humidity": 60.0, "battery": 80.0,
+    }))
+    written = asyncio.run(scheduler.refresh_device(db, "khetbox-001", later))
+    assert written == ["2024-06-01"]
+
+    dates = [r["date"] for r in reports(db)]
+    assert dates == ["2024-05-31", "2024-06-01"]
+    assert reports(db)[1]["summary"]["max_temperature"] == 10.0
+
+
+def test_restart_skips_closed_day(db):
+    now = DAY + timedelta(hours=1, minutes=50)
+    asyncio.run(ReportScheduler().refresh_device(db, "khetbox-001", now))
+    # A fresh scheduler (after a restart) only redoes today
+    written = asyncio.run(ReportScheduler().refresh_device(db, "khetbox-001", now))
+    assert written == ["2024-06-01"]
+
+
+def test_run_once_covers_the_fleet(db):
+    asyncio.run(db.sensors.insert_one({"device_id": "khetbox-002"}))
+    refreshed = asyncio.run(ReportScheduler(concurrency=1).run_once(db, DAY + timedelta(hours=1)))
+    assert refreshed == 2
+    assert {r["device_id"] for r in reports(db)} == {"khetbox-001"}
+
+
+def test_local_hours_regroup_quarters_for_half_hour_offsets(db):
+    asyncio.run(rollups.refresh_hourly(db, "khetbox-001", DAY - timedelta(hours=4), DAY + timedelta(hours=2)))
+    stored = asyncio.run(rollups.load(db, "khetbox-001", DAY - timedelta(days=1), DAY + timedelta(days=1)))
+    assert all(len(r["quarters"]) == 4 for r in stored)
+
+    # 20:00 UTC = 01:30 IST: the :10 reading goes to 01:00 IST, the :40 one to 02:00 IST
+    hours = rollups.local_hours(stored, "Asia/Kolkata")
+    assert [h["hour"].strftime("%H:%M") for h in hours] == ["01:00", "02:00", "03:00", "04:00", "05:00", "06:00", "07:00"]
+    assert [h["count"] for h in hours] == [1, 2, 2, 2, 2, 2, 1]
+    assert sum(h["count"] for h in hours) == 12
+    # Whole-hour offsets map hours directly
+    assert [h["count"] for h in rollups.local_hours(stored, "UTC")] == [2] * 6
+
+
+def test_report_for_local_day_matches_raw_readings(db):
+    asyncio.run(timezones.set_device_timezone(db, "khetbox-001", "Asia/Kolkata"))
+    now = DAY + timedelta(hours=1, minutes=50)  # 07:20 IST on June 1st
+    asyncio.run(ReportScheduler().refresh_device(db, "khetbox-001", now))
+    report = asyncio.run(db.reports.find_one({"date": "2024-06-01"}, {"_id": 0}))
+    assert report["timezone"] == "Asia/Kolkata"
+
+    # The IST day began at 18:30 UTC on May 31st, so it holds every seeded reading
+    start, end = timezones.day_bounds(DAY.date(), "Asia/Kolkata")
+    assert start == DAY - timedelta(hours=5, minutes=30)
+    raw = asyncio.run(db.readings.find(
+        {"timestamp": {"$gte": start, "$lt": end}}).to_list(length=None))
+    temps = [r["temperature"] for r in raw]
+    assert report["summary"]["avg_temperature"] == round(sum(temps) / len(temps), 1)
+    assert report["summary"]["max_temperature"] == max(temps)
+    assert report["hourly_data"][0]["hour"] == "01:00"
+    assert report["hourly_data"][0]["timestamp"].endswith("+05:30")
+
+
+def test_day_bounds_across_dst():
+    start, end = timezones.day_bounds(datetime(2024, 3, 10).date(), "America/New_York")
+    assert end - start == timedelta(hours=23)
@@ -0,0 +1,291 @@
+"""
+The same repository behavior on the embedded SQLite store and on MongoDB
+(mongomock).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp())
+
+import alert_state
+import database
+import forecast
+import inventory
+import recent
+import spoilage
+from migrations import SEED_CCTV_STREAMS, SEED_STORAGE_UNITS
+from report_scheduler import ReportScheduler
+from repositories import MongoStore
+from sqlite_store import SQLiteReportScheduler, SQLiteStore
+
+DEVICE = "khetbox-001"
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def store(request, tmp_path):
+    alert_state.versions = alert_state.AlertVersions()
+    if request.param == "sqlite":
+        store = SQLiteStore(tmp_path / "khetbox.db")
+    else:
+        mongomock_motor = pytest.importorskip('mongomock_motor')
+        from migrations import migrate
+
+        database.set_client(mongomock_motor.AsyncMongoMockClient())
+
+        async def seed():
+            await database.get_db().create_collection('readings')
+            await migrate(database.get_db(), throttle=0)
+
+        asyncio.run(seed())
+        store = MongoStore(database.get_db)
+    asyncio.run(store.sensors.set_timezone(DEVICE, "UTC"))
+    yield store
+    asyncio.run(store.close())
+
+
+def make_alert(severity, at):
+    return {"id": str(uuid.uuid4()), "type": f"test:{severity}", "severity": severity, "message": "test",
+            "device_id": DEVICE, "timestamp": at, "acknowledged": False}
+
+
+def test_alerts_newest_first_with_state(store):
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        change = await store.alerts.add(DEVICE, [make_alert("critical", now - timedelta(minutes=2)),
+                                                 make_alert("warning", now - timedelta(minutes=1))])
+        await store.alerts.add(DEVICE, [make_alert("critical", now)])
+        return change, await store.alerts.recent(DEVICE), await store.alerts.state(DEVICE), \
+            await store.alerts.changed_since(DEVICE, change["version"])
+
+    first, recent, state, changed = asyncio.run(scenario())
+    assert first["count"] == 2
+    assert [a["severity"] for a in recent] == ["critical", "warning", "critical"]
+    assert recent[0]["timestamp"] > recent[1]["timestamp"]
+    assert state["unacknowledged"] == {"critical": 2, "warning": 1}
+    assert state["version"] > first["version"]
+    assert len(changed) == 1 and "_id" not in changed[0]
+
+
+def test_acknowledge_counts_each_alert_once(store):
+    now = datetime.now(timezone.utc)
+    alerts = [make_alert("critical", now - timedelta(minutes=m)) for m in range(3)] + [make_alert("warning", now)]
+
+    async def scenario():
+        added = await store.alerts.add(DEVICE, alerts)
+        first = await store.alerts.acknowledge(DEVICE, severity="critical", acknowledged_by="admin@khetbox.com")
+        again = await store.alerts.acknowledge(DEVICE, ids=[a["id"] for a in alerts])
+        return added, first, again, await store.alerts.state(DEVICE), \
+            await store.alerts.changed_since(DEVICE, added["version"])
+
+    added, first, again, state, changed = asyncio.run(scenario())
+    assert first["severities"] == {"critical": 3}
+    # Only the warning was still unacknowledged
+    assert again["severities"] == {"warning": 1}
+    assert state == {"version": again["version"], "unacknowledged": {"critical": 0, "warning": 0}}
+    assert len(changed) == 4 and all(a["acknowledged"] for a in changed)
+    assert [a["acknowledged_by"] for a in changed if a["severity"] == "critical"] == ["admin@khetbox.com"] * 3
+
+
+def test_daily_report_from_readings(store):
+    now = datetime.now(timezone.utc)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    temperatures = [3.0, 5.0, 7.0, 9.0]
+
+    async def scenario():
+        for i, temperature in enumerate(temperatures):
+            await store.readings.insert({
+                "device_id": DEVICE, "timestamp": start + (now - start) * i / len(temperatures),
+                "temperature": temperature, "humidity": 60.0, "battery": 80.0,
+            })
+        await store.alerts.add(DEVICE, [make_alert("warning", now)])
+        if isinstance(store, MongoStore):
+            await ReportScheduler().refresh_device(database.get_db(), DEVICE, now)
+        else:
+            # Reads don't build reports; only the scheduler does
+            assert await store.reports.daily(DEVICE, now.date()) is None
+            await SQLiteReportScheduler().refresh_device(store, DEVICE, now)
+        return await store.reports.daily(DEVICE, now.date()), await store.reports.build(
+            DEVICE, now.date(), now, "UTC")
+
+    daily, built = asyncio.run(scenario())
+    assert daily["date"] == now.date().isoformat() and daily["timezone"] == "UTC"
+    assert daily["summary"]["avg_temperature"] == 6.0
+    assert daily["summary"]["min_temperature"] == 3.0
+    assert daily["summary"]["max_temperature"] == 9.0
+    assert daily["summary"]["alerts_count"] == 1
+    assert daily["hourly_data"]
+    assert built["summary"] == daily["summary"]
+
+
+def test_sqlite_scheduler_closes_yesterday(tmp_path):
+    store = SQLiteStore(tmp_path / "khetbox.db")
+    day = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    scheduler = SQLiteReportScheduler()
+
+    async def scenario():
+        await store.sensors.set_timezone(DEVICE, "UTC")
+        await store.readings.insert({"device_id": DEVICE, "timestamp": day + timedelta(hours=6),
+                                     "temperature": 4.0, "humidity": 60.0, "battery": 80.0})
+        during = await scheduler.refresh_device(store, DEVICE, day + timedelta(hours=12))
+        after = await scheduler.refresh_device(store, DEVICE, day + timedelta(days=1, hours=1))
+        closed = await store.reports.daily(DEVICE, day.date())
+        # A final report isn't rebuilt
+        await store.readings.insert({"device_id": DEVICE, "timestamp": day + timedelta(hours=7),
+                                     "temperature": 8.0, "humidity": 60.0, "battery": 80.0})
+        await scheduler.run_once(store, day + timedelta(days=1, hours=2))
+        return during, after, closed, await store.reports.daily(DEVICE, day.date())
+
+    during, after, closed, later = asyncio.run(scenario())
+    asyncio.run(store.close())
+    assert during == after == ["2026-03-01"]
+    assert closed["final"] and later == closed
+    assert closed["created_at"] == day + timedelta(hours=12)
+
+
+def test_seeded_units_streams_and_users(store):
+    async def scenario():
+        units = await store.storage.units(DEVICE)
+        streams = await store.cctv_streams.streams(DEVICE)
+        await store.cctv_streams.update_status(DEVICE, {streams[0]["id"]: {"status": "offline"}})
+        targets = await store.cctv_streams.probe_targets(DEVICE)
+        await store.users.insert({"email": "farmer@khetbox.com", "password": "hash", "role": "farmer"})
+        with pytest.raises(Exception):
+            await store.users.insert({"email": "farmer@khetbox.com", "password": "other", "role": "admin"})
+        return units, streams, targets, await store.users.find("farmer@khetbox.com"), await store.users.find("x@y.z")
+
+    units, streams, targets, user, missing = asyncio.run(scenario())
+    assert [u["name"] for u in units] == [u["name"] for u in SEED_STORAGE_UNITS]
+    assert all(isinstance(c["stocked_at"], datetime) for u in units for c in u["crops"])
+    assert [s["id"] for s in streams] == [s["id"] for s in SEED_CCTV_STREAMS]
+    assert "created_at" not in streams[0]
+    assert [t["status"] for t in targets] == ["offline", "active"]
+    assert user["role"] == "farmer" and "_id" not in user
+    assert missing is None
+
+
+def test_capacity_follows_inventory_movements(store):
+    async def scenario():
+        before = await store.storage.capacity(DEVICE)
+        await store.storage.record_movement(DEVICE, "Cold Storage Unit A", "Tomatoes", 50, "out")
+        await store.storage.record_movement(DEVICE, "Cold Storage Unit A", "Mangoes", 100, "in", icon="🥭")
+        with pytest.raises(inventory.InsufficientStock):
+            await store.storage.record_movement(DEVICE, "Cold Storage Unit A", "Tomatoes", 5000, "out")
+        with pytest.raises(inventory.CapacityExceeded):
+            await store.storage.record_movement(DEVICE, "Cold Storage Unit A", "Mangoes", 5000, "in")
+        with pytest.raises(inventory.UnknownUnit):
+            await store.storage.record_movement(DEVICE, "Unit Z", "Mangoes", 1, "in")
+        return before, await store.storage.capacity(DEVICE), await store.storage.ledger(DEVICE, 50), \
+            await store.storage.units(DEVICE)
+
+    before, after, ledger, units = asyncio.run(scenario())
+    seeded = sum(c["quantity"] for u in SEED_STORAGE_UNITS for c in u["crops"])
+    assert before["used_kg"] == seeded
+    assert after["used_kg"] == seeded + 50
+    assert after["total_capacity_kg"] == before["total_capacity_kg"]
+    unit_a = {u["name"]: u for u in after["units"]}["Cold Storage Unit A"]
+    assert unit_a["used_kg"] == sum(c["quantity"] for c in SEED_STORAGE_UNITS[0]["crops"]) + 50
+    # Newest first (the two movements may share a millisecond on MongoDB)
+    assert {(e["crop"], e["kind"]) for e in ledger[:2]} == {("Mangoes", "in"), ("Tomatoes", "out")}
+    # Opening balances plus the two movements that went through
+    assert len(ledger) == sum(len(u["crops"]) for u in SEED_STORAGE_UNITS) + 2
+    mangoes = next(c for c in units[0]["crops"] if c["name"] == "Mangoes")
+    assert mangoes["quantity"] == 100 and isinstance(mangoes["stocked_at"], datetime)
+
+
+def test_event_intervals_round_trip(store):
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+
+    async def scenario():
+        await store.events.record(DEVICE, [{"kind": "door_open", "start": start, "end": None}])
+        await store.events.record(DEVICE, [{"kind": "door_open", "start": start, "end": start + timedelta(minutes=5)},
+                                           {"kind": "on_battery", "start": start + timedelta(minutes=10), "end": None}])
+        return await store.events.history(DEVICE, start - timedelta(days=1))
+
+    history = asyncio.run(scenario())
+    # MongoDB hands back naive UTC datetimes
+    utc = lambda ts: ts and ts.replace(tzinfo=timezone.utc)
+    assert [(e["kind"], utc(e["start"]), utc(e["end"])) for e in history] == [
+        ("door_open", start, start + timedelta(minutes=5)), ("on_battery", start + timedelta(minutes=10), None)]
+
+
+def test_startup_histories_load_from_readings(store):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    recent_window, forecaster, tracker = recent.RecentReadings(), forecast.FleetBatteryForecaster(), \
+        spoilage.SpoilageTracker()
+
+    async def scenario():
+        for minutes in (300, 240, 180, 120, 60):
+            await store.readings.insert({
+                "device_id": DEVICE, "timestamp": now - timedelta(minutes=minutes), "temperature": 4.0,
+                "humidity": 90.0, "battery": 100 - minutes / 60, "solar_active": False,
+            })
+        history = await store.readings.history(DEVICE, now - timedelta(minutes=200), ("battery", "solar_active"))
+        return history, await recent.load_history(store.readings, recent_window, DEVICE), \
+            await forecast.load_history(store.readings, forecaster, DEVICE), \
+            await spoilage.load_history(store, tracker, DEVICE)
+
+    history, *loaded = asyncio.run(scenario())
+    assert [(r["battery"], bool(r["solar_active"])) for r in history] == [(97.0, False), (98.0, False), (99.0, False)]
+    assert history[0]["timestamp"].replace(tzinfo=timezone.utc) == now - timedelta(minutes=180)
+    assert loaded == [5, 5, 5]
+    timestamps, _ = recent_window.get(DEVICE).window(now - timedelta(hours=6))
+    assert len(timestamps) == 5
+    assert forecaster.forecast([DEVICE])[0]["battery"] == 99.0
+    assert {lot["unit"] for lot in tracker.lots()} == {u["name"] for u in SEED_STORAGE_UNITS}
+
+
+def test_sqlite_keeps_a_failed_batch(tmp_path):
+    store = SQLiteStore(tmp_path / "khetbox.db", batch_size=1000)
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        for i in range(10):
+            await store.readings.insert({"device_id": DEVICE, "timestamp": now + timedelta(seconds=i),
+                                         "temperature": 4.0, "humidity": 60.0, "battery": 80.0})
+        # A write that can't commit (NOT NULL device_id) in the middle of the batch
+        await store.write("INSERT INTO readings (device_id, ts, doc) VALUES (?, ?, ?)", (None, now.timestamp(), "{}"))
+        for i in range(10, 20):
+            await store.readings.insert({"device_id": DEVICE, "timestamp": now + timedelta(seconds=i),
+                                         "temperature": 4.0, "humidity": 60.0, "battery": 80.0})
+        written = await store.flush()
+        return written, await store.query("SELECT COUNT(*) FROM readings"), \
+            await store.query("SELECT statement, error FROM dead_letters")
+
+    written, count, dead = asyncio.run(scenario())
+    assert written == 20 and count == [(20,)]
+    assert len(dead) == 1 and "NOT NULL" in dead[0][1]
+    assert store.stats()["pending_writes"] == 0 and store.stats()["dead_letters"] == 1
+    asyncio.run(store.close())
+
+
+def test_sqlite_commits_ingest_writes_in_batches(tmp_path):
+    store = SQLiteStore(tmp_path / "khetbox.db", batch_size=10)
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        for i in range(25):
+            await store.readings.insert({"device_id": DEVICE, "timestamp": now + timedelta(seconds=i),
+                                         "temperature": 4.0, "humidity": 60.0, "battery": 80.0})
+        committed = store.stats()
+        # Reads commit whatever is still queued first
+        count = await store.query("SELECT COUNT(*) FROM readings")
+        return committed, count, await store.query("PRAGMA journal_mode")
+
+    committed, count, mode = asyncio.run(scenario())
+    assert committed["commits"] == 2 and committed["pending_writes"] == 5
+    assert count == [(25,)]
+    assert mode == [("wal",)]
+    asyncio.run(store.close())
+
+    reopened = SQLiteStore(tmp_path / "khetbox.db")
+    assert asyncio.run(reopened.query("SELECT COUNT(*) FROM readings")) == [(25,)]
+    asyncio.run(reopened.close())
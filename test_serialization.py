@@ -0,0 +1,67 @@
+"""
+FastJSONResponse / dumps: BSON datetimes and ObjectIds encode the same with
+orjson and with the stdlib fallback, and NO_ID documents serialize as-is.
+"""
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import serialization
+from serialization import NO_ID, FastJSONResponse, dumps
+
+OID = ObjectId("65f1c0ffee0000000000abcd")
+DOC = {
+    "id": OID,
+    "timestamp": datetime(2026, 3, 1, 6, 30, 15, 123456, tzinfo=timezone.utc),
+    "naive": datetime(2026, 3, 1, 6, 30),
+    "date": date(2026, 3, 1),
+    "name": "टमाटर",
+    "counts": {1: 2},
+    "values": [1.5, None, True],
+}
+EXPECTED = {
+    "id": "65f1c0ffee0000000000abcd",
+    "timestamp": "2026-03-01T06:30:15.123456+00:00",
+    "naive": "2026-03-01T06:30:00",
+    "date": "2026-03-01",
+    "name": "टमाटर",
+    "counts": {"1": 2},
+    "values": [1.5, None, True],
+}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_bson_types_encode_the_same_either_way(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(dumps(DOC)) == EXPECTED
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_response_renders_projected_documents():
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    db = mongomock_motor.AsyncMongoMockClient()['khetbox']
+
+    stored = {key: DOC[key] for key in ("id", "naive", "name", "values")}
+
+    async def scenario():
+        await db.alerts.insert_many([dict(stored), dict(stored)])
+        return await db.alerts.find({}, NO_ID).to_list(length=None)
+
+    documents = asyncio.run(scenario())
+    response = FastJSONResponse(documents)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == [{key: EXPECTED[key] for key in stored}] * 2
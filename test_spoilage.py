@@ -0,0 +1,87 @@
+"""
+Shelf-life scoring: the vectorized history pass and the per-reading updates
+must agree.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from spoilage import SpoilageTracker
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def units():
+    return [
+        {"name": "Cold Storage Unit A", "crops": [
+            {"name": "Tomatoes", "quantity": 450, "stocked_at": START},
+            {"name": "Leafy Greens", "quantity": 180, "stocked_at": START + timedelta(hours=30)},
+            {"name": "Mystery Crop", "quantity": 10, "stocked_at": START},
+        ]},
+        {"name": "Dry Storage Unit B", "crops": [
+            {"name": "Rice", "quantity": 650, "stocked_at": START - timedelta(days=2)},
+            {"name": "Wheat", "quantity": 0, "stocked_at": START},
+        ]},
+    ]
+
+
+def readings(n=500):
+    rng = np.random.default_rng(7)
+    timestamps = [START + timedelta(minutes=10 * i) for i in range(n)]
+    temperatures = 6 + np.cumsum(rng.normal(0, 0.3, n))
+    humidities = np.clip(65 + np.cumsum(rng.normal(0, 1.0, n)), 40, 95)
+    return timestamps, temperatures, humidities
+
+
+def test_incremental_matches_vectorized_history():
+    timestamps, temperatures, humidities = readings()
+
+    batch = SpoilageTracker()
+    batch.load(units(), timestamps, temperatures, humidities)
+
+    incremental = SpoilageTracker()
+    incremental.sync(units(), now=START - timedelta(days=2))
+    for ts, temp, rh in zip(timestamps, temperatures, humidities):
+        incremental.observe(ts, temp, rh)
+
+    assert incremental.keys == batch.keys
+    assert [key[1] for key in batch.keys] == ["Tomatoes", "Leafy Greens", "Rice"]
+    np.testing.assert_allclose(incremental.degree_hours, batch.degree_hours)
+    # Lots stocked before the first reading age in sync() rather than observe()
+    np.testing.assert_allclose(incremental.consumed[:2], batch.consumed[:2])
+
+
+def test_excursions_shorten_shelf_life():
+    timestamps = [START + timedelta(hours=h) for h in range(49)]
+    tracker = SpoilageTracker()
+    tracker.load(units()[:1], timestamps, [7.0] * 49, [70.0] * 49)
+    in_band = {lot["crop"]: lot for lot in tracker.lots()}
+    assert in_band["Tomatoes"]["degree_hours"] == 0
+    assert in_band["Tomatoes"]["remaining_days"] == pytest.approx(19.0)
+
+    tracker.load(units()[:1], timestamps, [14.0] * 49, [70.0] * 49)
+    warm = {lot["crop"]: lot for lot in tracker.lots()}
+    assert warm["Tomatoes"]["degree_hours"] == pytest.approx(4 * 48)
+    assert warm["Tomatoes"]["remaining_days"] < in_band["Tomatoes"]["remaining_days"] / 2
+    assert warm["Leafy Greens"]["risk"] == "at_risk"
+    assert any(alert["type"] == "spoilage:Cold Storage Unit A:Leafy Greens" for alert in tracker.alerts())
+
+
+def test_lot_without_stocked_at_keeps_ageing():
+    tracker = SpoilageTracker()
+    unstamped = [{"name": "Cold Storage Unit A", "crops": [{"name": "Tomatoes", "quantity": 450}]}]
+    tracker.sync(unstamped, now=START)
+    for h in range(25):
+        tracker.observe(START + timedelta(hours=h), 30.0, 65.0)
+        # Every read of /api/storage syncs the lots again
+        tracker.sync(unstamped, now=START + timedelta(hours=h))
+
+    assert len(tracker.keys) == 1
+    assert tracker.stocked_at[0] == START.timestamp() / 3600
+    assert tracker.consumed[0] > 24
+    assert tracker.degree_hours[0] > 0
@@ -0,0 +1,119 @@
+"""
+Write spool: lazy directory creation, fsync batching, segment rollover,
+replay order and deletion, and resuming a replay that failed partway.
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import spool as spool_module
+from spool import WriteSpool
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+AT = datetime(2026, 3, 1, 6, 30, tzinfo=timezone.utc)
+
+
+class TimeSeries:
+    """Readings collection without a unique _id index, failing after ``fail_after`` inserts."""
+
+    def __init__(self, fail_after=None):
+        self.documents = []
+        self.fail_after = fail_after
+
+    async def insert_one(self, document):
+        if self.fail_after is not None and len(self.documents) >= self.fail_after:
+            raise AutoReconnect("connection lost")
+        self.documents.append(dict(document))
+
+    async def delete_many(self, filter):
+        ids = set(filter["_id"]["$in"])
+        self.documents = [d for d in self.documents if d["_id"] not in ids]
+
+
+def reading(i):
+    return {"device_id": "khetbox-001", "timestamp": AT, "temperature": float(i)}
+
+
+def test_directory_is_created_on_first_write(tmp_path):
+    directory = tmp_path / "spool"
+    spool = WriteSpool(directory)
+    assert not directory.exists() and spool.pending() == 0
+    spool.append("readings", "insert_one", document=reading(0))
+    spool.close()
+    assert len(list(directory.glob("segment-*.log"))) == 1
+
+
+def test_appends_fsync_in_batches_and_roll_segments(tmp_path, monkeypatch):
+    fsyncs = []
+    monkeypatch.setattr(spool_module.os, "fsync", fsyncs.append)
+    spool = WriteSpool(tmp_path, segment_max_bytes=4096, fsync_batch=4)
+    for i in range(10):
+        spool.append("readings", "insert_one", document=reading(i))
+    assert len(fsyncs) == 2
+    spool.flush()
+    assert len(fsyncs) == 3
+    spool.flush()  # nothing new to sync
+    assert len(fsyncs) == 3
+
+    for i in range(20):
+        spool.append("readings", "insert_one", document=reading(i))
+    spool.close()
+    assert len(list(tmp_path.glob("segment-*.log"))) > 1
+    # A restart picks the pending writes back up
+    assert WriteSpool(tmp_path).pending() == 30
+
+
+def test_replay_applies_in_order_and_deletes_segments(tmp_path):
+    spool = WriteSpool(tmp_path, segment_max_bytes=512)
+    for i in range(5):
+        spool.append("sensors", "update_one", filter={"device_id": "khetbox-001"},
+                     update={"$set": {"temperature": float(i), "last_updated": AT}}, upsert=True)
+        spool.append("alerts", "insert_one", document={"id": str(i), "timestamp": AT})
+    db = mongomock_motor.AsyncMongoMockClient()["khetbox"]
+
+    async def scenario():
+        applied = await spool.replay(db)
+        # Writes spooled after a replay go to a new segment
+        spool.append("alerts", "insert_many", documents=[{"id": "5", "_id": ObjectId()}])
+        applied += await spool.replay(db)
+        return applied, await db.sensors.find_one({}, {"_id": 0}), await db.alerts.count_documents({})
+
+    applied, sensor, alerts = asyncio.run(scenario())
+    assert applied == 11 and spool.pending() == 0
+    assert sensor["temperature"] == 4.0
+    assert sensor["last_updated"].replace(tzinfo=timezone.utc) == AT
+    assert alerts == 6
+    assert list(tmp_path.iterdir()) == []
+
+
+# Fail between records, and halfway through the insert_many (the resumed
+# replay must drop the half it already inserted)
+@pytest.mark.parametrize("fail_after, pending", [(3, 4), (7, 1)])
+def test_partial_replay_resumes_without_duplicating_readings(tmp_path, fail_after, pending):
+    spool = WriteSpool(tmp_path)
+    for i in range(6):
+        spool.append("readings", "insert_one", document=reading(i))
+    spool.append("readings", "insert_many", documents=[reading(6), reading(7)])
+    readings = TimeSeries(fail_after=fail_after)
+    db = {"readings": readings}
+
+    with pytest.raises(AutoReconnect):
+        asyncio.run(spool.replay(db))
+    assert len(readings.documents) == fail_after
+    assert spool.pending() == pending
+    # The checkpoint survives a restart
+    assert WriteSpool(tmp_path).pending() == pending
+
+    readings.fail_after = None
+    assert asyncio.run(spool.replay(db)) == pending
+    assert sorted(d["temperature"] for d in readings.documents) == [float(i) for i in range(8)]
+    assert len({d["_id"] for d in readings.documents}) == 8
+    assert spool.pending() == 0 and list(tmp_path.iterdir()) == []
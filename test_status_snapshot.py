@@ -0,0 +1,69 @@
+"""
+GET /api/status is a read of the snapshot swapped in by the sensor clock.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+os.environ.setdefault('SPOOL_DIR', tempfile.mkdtemp())
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import database
+from routers import sensors
+from simulation import sensor_state
+
+
+@pytest.fixture
+def client():
+    database.set_client(mongomock_motor.AsyncMongoMockClient())
+    app = FastAPI()
+    app.include_router(sensors.router)
+    # No startup events: the clock only ticks when the test says so
+    return TestClient(app)
+
+
+def readings():
+    return asyncio.run(database.get_db().readings.count_documents({}))
+
+
+def test_status_reads_have_no_side_effects(client):
+    asyncio.run(sensors.tick())
+    before = sensor_state.to_dict()
+    stored = readings()
+
+    first = client.get('/api/status')
+    second = client.get('/api/status')
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers['etag'] == second.headers['etag']
+    assert sensor_state.to_dict() == before
+    assert readings() == stored
+
+
+def test_if_none_match_returns_304_until_next_tick(client):
+    asyncio.run(sensors.tick())
+    etag = client.get('/api/status').headers['etag']
+    unchanged = client.get('/api/status', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b''
+    # Tag lists, weak tags added by proxies and * match too
+    for header in (f'"0", {etag}', f'W/{etag}', '*'):
+        assert client.get('/api/status', headers={'If-None-Match': header}).status_code == 304
+    assert client.get('/api/status', headers={'If-None-Match': '"0", W/"1x"'}).status_code == 200
+
+    stored = readings()
+    asyncio.run(sensors.tick())
+    assert readings() == stored + 1
+    changed = client.get('/api/status', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['etag'] != etag
+    assert changed.json() == sensor_state.to_dict()